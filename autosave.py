@@ -0,0 +1,197 @@
+import codecs
+import hashlib
+import json
+import os
+import stat
+import threading
+import time
+from queue import Queue
+
+from perf import recorder
+
+# Сколько строк текстового поля кодируется за один раз при сохранении
+SAVE_CHUNK_LINES = 20000
+
+# Права новых файлов с учетом umask (вычисляется один раз при импорте)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def atomic_write(path, data):
+    """Запись через временный файл, fsync и os.replace: файл либо старый, либо новый целиком.
+
+    data - bytes или список порций bytes"""
+    # tempfile нужен только при записи, а не при запуске редактора
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(path) + ".",
+                                    suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if isinstance(data, (bytes, bytearray)):
+                f.write(data)
+            else:
+                f.writelines(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+
+def encode_text(text_area, encoding, newline="\n", chunk_lines=SAVE_CHUNK_LINES):
+    """Содержимое текстового поля без завершающего перевода строки Tk: (порции bytes, хэш).
+
+    Текст берется диапазонами строк и сразу кодируется, поэтому весь документ
+    никогда не лежит в памяти одной строкой. Переводы строк записываются как newline.
+    При символе, которого нет в кодировке, - UnicodeEncodeError"""
+    encoder = codecs.getincrementalencoder(encoding)()
+    digest = hashlib.blake2b(digest_size=16)
+    chunks = []
+    last_line = int(text_area.index("end-1c").split('.')[0])
+    for first in range(1, last_line + 1, chunk_lines):
+        end = first + chunk_lines
+        text = text_area.get(f"{first}.0", f"{end}.0" if end <= last_line else "end-1c")
+        if newline != "\n":
+            text = text.replace("\n", newline)
+        chunk = encoder.encode(text, final=end > last_line)
+        if chunk:
+            digest.update(chunk)
+            chunks.append(chunk)
+    return chunks, digest.hexdigest()
+
+
+def file_stamp(path):
+    """Размер и время изменения файла (None, если файла нет) - признак внешних изменений"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _fsync_directory(directory):
+    # Переименование надежно только после fsync каталога (на Windows недоступно)
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class BackgroundWriter:
+    def __init__(self):
+        # Все записи на диск выполняются в одном фоновом потоке по очереди
+        self.jobs = Queue()
+        self.results = Queue()
+        # Последняя версия данных для каждого пути: промежуточные версии не пишутся
+        self._latest = {}
+        self._lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, path, text, encoding="utf-8", on_done=None):
+        """Постановка записи в очередь; text - str, bytes или список порций bytes,
+        text=None - удаление файла.
+
+        on_done(error) передается главному потоку через results."""
+        with self._lock:
+            version = self._latest.get(path, 0) + 1
+            self._latest[path] = version
+        self.jobs.put((path, version, text, encoding, on_done))
+
+    def idle(self):
+        return self.jobs.unfinished_tasks == 0
+
+    def wait(self):
+        """Ожидание завершения всех записей (перед выходом из приложения)"""
+        self.jobs.join()
+
+    def _run(self):
+        while True:
+            path, version, text, encoding, on_done = self.jobs.get()
+            error = None
+            try:
+                with self._lock:
+                    superseded = self._latest.get(path) != version
+                if superseded:
+                    pass
+                elif text is None:
+                    if os.path.exists(path):
+                        os.remove(path)
+                else:
+                    with recorder.span("io.write"):
+                        data = text.encode(encoding) if isinstance(text, str) else text
+                        atomic_write(path, data)
+            except Exception as e:
+                error = e
+            finally:
+                self.jobs.task_done()
+            if on_done:
+                self.results.put((on_done, error))
+
+
+class RecoveryJournal:
+    def __init__(self, directory, writer):
+        # Для каждой вкладки: <id>.txt с текстом и <id>.json со сведениями о ней
+        self.directory = directory
+        self.writer = writer
+
+    def record(self, tab_id, text, file_path, encoding, title, newline="\n"):
+        """Сохранение снимка несохраненной вкладки"""
+        meta = {"file": file_path, "encoding": encoding, "newline": newline, "title": title,
+                "time": time.time()}
+        self.writer.write(self._path(tab_id, ".txt"), text, "utf-8")
+        self.writer.write(self._path(tab_id, ".json"), json.dumps(meta, ensure_ascii=False))
+
+    def discard(self, tab_id):
+        """Удаление снимка после сохранения или закрытия вкладки"""
+        # Через очередь записи, чтобы не разойтись с еще не записанным снимком
+        for suffix in (".json", ".txt"):
+            self.writer.write(self._path(tab_id, suffix), None)
+
+    def entries(self):
+        """Снимки, оставшиеся после аварийного завершения: список (id, сведения)"""
+        result = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return result
+        for name in sorted(names):
+            if not name.endswith(".json"):
+                continue
+            tab_id = name[:-len(".json")]
+            if not os.path.exists(self._path(tab_id, ".txt")):
+                continue
+            try:
+                with open(self._path(tab_id, ".json"), "r", encoding="utf-8") as f:
+                    result.append((tab_id, json.load(f)))
+            except (json.JSONDecodeError, IOError):
+                continue
+        return result
+
+    def read(self, tab_id):
+        with open(self._path(tab_id, ".txt"), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def clear(self):
+        for tab_id, _ in self.entries():
+            self.discard(tab_id)
+
+    def _path(self, tab_id, suffix):
+        return os.path.join(self.directory, tab_id + suffix)
@@ -0,0 +1,410 @@
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tkinter as tk
+
+from autosave import atomic_write, encode_text
+from bulk_edit import BulkJob
+from encoding_detector import EncodingDetector
+from file_loader import ChunkedFileLoader, LARGE_FILE_THRESHOLD
+from highlighter import IncrementalHighlighter, HIGHLIGHT_TAGS, highlight_range
+from history import EditHistory
+from languages import PYTHON_KEYWORDS, get_tokenizer
+from search import SearchIndex, compile_pattern
+
+# Размеры синтетических файлов по умолчанию (строк)
+DEFAULT_SIZES = [1000, 100000, 1000000]
+# Сколько строк считается видимым экраном
+SCREEN_LINES = 50
+# Запросы полнотекстового поиска: (текст, регулярное выражение)
+SEARCH_QUERIES = [("value", False), (r"\b(?:func|Model)_?\d+", True)]
+# Массовые операции: (операция, строка поиска, замена)
+BULK_OPERATIONS = [("replace", "value", "VALUE"), ("sort", None, ""), ("unique", None, ""),
+                   ("drop", "value", "")]
+
+
+def generate_python_source(line_count, seed=0):
+    # Синтетический Python-файл с ключевыми словами, строками и комментариями
+    rnd = random.Random(seed)
+    templates = [
+        "def func_{n}(arg, other=None):",
+        "    if arg is None and other: return 'value {n}'",
+        "    for item in range({n}):  # цикл {n}",
+        "        result = \"text {n}\" + str(item)",
+        "    while False: pass",
+        "class Model{n}(object):",
+        '    """Документация класса {n}"""',
+        "    try:",
+        "        import os",
+        "    except Exception as error:",
+        "        continue_value = {n}  # комментарий",
+        "",
+    ]
+    return "\n".join(rnd.choice(templates).format(n=n) for n in range(line_count))
+
+
+def generate_log_source(line_count, seed=0):
+    # Синтетический журнал приложения: время, уровень, модуль и сообщение
+    rnd = random.Random(seed)
+    levels = ["DEBUG", "INFO", "INFO", "INFO", "WARNING", "ERROR"]
+    modules = ["http.server", "db.pool", "auth", "cache", "worker.queue"]
+    messages = [
+        "request {n} completed in {ms} ms",
+        "connection {n} returned to pool",
+        "user id={n} logged in from 10.0.{a}.{b}",
+        "cache miss for key 'item:{n}'",
+        "retrying job {n} after error: timeout",
+        "Traceback (most recent call last): value={n}",
+    ]
+    start = 1700000000
+    lines = []
+    for n in range(line_count):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(start + n // 10))
+        message = rnd.choice(messages).format(
+            n=n, ms=rnd.randint(1, 900), a=rnd.randint(0, 255), b=rnd.randint(0, 255))
+        lines.append(f"{stamp},{n % 1000:03d} {rnd.choice(levels):<7} "
+                     f"[{rnd.choice(modules)}] {message}")
+    return "\n".join(lines)
+
+
+# Типы синтетических файлов; ключи совпадают с именами грамматик languages.GRAMMARS
+GENERATORS = {"python": generate_python_source, "log": generate_log_source}
+
+
+def legacy_highlight(text_area, keywords, top_line, bottom_line):
+    # Прежний алгоритм: отдельный проход на каждое ключевое слово
+    # и отдельный tag_add с относительным индексом на каждое совпадение
+    visible_text = text_area.get(
+        f"{top_line}.0", f"{bottom_line}.0 + 1 lines")
+    for tag in HIGHLIGHT_TAGS:
+        text_area.tag_remove(
+            tag, f"{top_line}.0", f"{bottom_line}.0 + 1 lines")
+    for word in keywords:
+        pattern = r"\b" + word + r"\b"
+        for match in re.finditer(pattern, visible_text):
+            start = f"{top_line}.0 + {match.start()} chars"
+            end = f"{top_line}.0 + {match.end()} chars"
+            text_area.tag_add("keyword", start, end)
+    for match in re.finditer(r'"[^"]*"|\'[^\']*\'', visible_text):
+        start = f"{top_line}.0 + {match.start()} chars"
+        end = f"{top_line}.0 + {match.end()} chars"
+        text_area.tag_add("string", start, end)
+    for match in re.finditer(r"#.*$", visible_text, re.MULTILINE):
+        start = f"{top_line}.0 + {match.start()} chars"
+        end = f"{top_line}.0 + {match.end()} chars"
+        text_area.tag_add("comment", start, end)
+
+
+def measure(func, repeat):
+    # Время выполнения в миллисекундах для каждого повтора
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def percentile(sorted_timings, fraction):
+    # Перцентиль с линейной интерполяцией между соседними замерами
+    position = (len(sorted_timings) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_timings) - 1)
+    return sorted_timings[lower] + (sorted_timings[upper] - sorted_timings[lower]) * (position - lower)
+
+
+def summary(timings):
+    ordered = sorted(timings)
+    return {
+        "count": len(ordered),
+        "min_ms": round(ordered[0], 3),
+        "median_ms": round(statistics.median(ordered), 3),
+        "p90_ms": round(percentile(ordered, 0.90), 3),
+        "p95_ms": round(percentile(ordered, 0.95), 3),
+        "p99_ms": round(percentile(ordered, 0.99), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def bench_highlight(root, line_count, repeat):
+    """Сравнение прежней и пакетной подсветки на полном документе"""
+    source = generate_python_source(line_count)
+    text_area = tk.Text(root)
+    text_area.insert("1.0", source)
+    last_line = int(text_area.index("end-1c").split('.')[0])
+    edit_line = last_line // 2
+    highlighter = IncrementalHighlighter(get_tokenizer("python"))
+
+    def type_char():
+        # Имитация нажатия клавиши в середине документа
+        text_area.insert(f"{edit_line}.0", "x")
+
+    def legacy_keystroke():
+        type_char()
+        legacy_highlight(text_area, PYTHON_KEYWORDS, 1, last_line)
+
+    def batched_keystroke():
+        type_char()
+        highlight_range(text_area, highlighter, 1, last_line)
+
+    results = {
+        "lines": line_count,
+        "legacy_full": summary(measure(
+            lambda: legacy_highlight(text_area, PYTHON_KEYWORDS, 1, last_line), repeat)),
+        "legacy_keystroke": summary(measure(legacy_keystroke, repeat)),
+    }
+    for tag in HIGHLIGHT_TAGS:
+        text_area.tag_remove(tag, "1.0", tk.END)
+
+    def batched_full():
+        highlighter.reset()
+        highlight_range(text_area, highlighter, 1, last_line)
+
+    results["batched_full"] = summary(measure(batched_full, repeat))
+    results["batched_keystroke"] = summary(measure(batched_keystroke, repeat))
+    text_area.destroy()
+    return results
+
+
+def bench_keystroke(root, source, keystrokes, language):
+    """Нажатие клавиши -> подсвеченный экран вокруг курсора (кэш разбора прогрет).
+
+    Как в редакторе: правка проходит через историю, кэш сдвигается по ее изменениям"""
+    text_area = tk.Text(root, undo=False)
+    text_area.insert("1.0", source)
+    history = EditHistory(text_area)
+    changes = history.track()
+    changes.take()
+    last_line = int(text_area.index("end-1c").split('.')[0])
+    edit_line = max(1, last_line // 2)
+    top_line = max(1, edit_line - SCREEN_LINES // 2)
+    bottom_line = min(last_line, top_line + SCREEN_LINES)
+    highlighter = IncrementalHighlighter(get_tokenizer(language))
+    # Первый проход разбирает документ от начала до экрана, он замеряется отдельно
+    cold = measure(lambda: highlight_range(text_area, highlighter, top_line, bottom_line), 1)
+
+    def keystroke():
+        text_area.insert(f"{edit_line}.0", "x")
+        _, change = changes.take()
+        if change:
+            highlighter.apply_edit(*change)
+        highlight_range(text_area, highlighter, top_line, bottom_line)
+        text_area.update_idletasks()
+
+    results = {"cold_screen_ms": round(cold[0], 3),
+               "keystroke": summary(measure(keystroke, keystrokes))}
+    # Отмена последней правки и память истории после серии нажатий
+    start = time.perf_counter()
+    history.undo()
+    results["undo_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    results["undo_memory_bytes"] = history.size
+    text_area.destroy()
+    return results
+
+
+def bench_open(root, file_path, repeat, language):
+    """Открытие файла тем же путем, что и в редакторе, до первого подсвеченного экрана"""
+    size = os.path.getsize(file_path)
+    streamed = size >= LARGE_FILE_THRESHOLD
+    detect_timings = []
+
+    def open_first_paint():
+        # Новый детектор без кэша: определение кодировки входит в замер
+        detector = EncodingDetector()
+        frame = tk.Frame(root)
+        text_area = tk.Text(frame)
+        text_area.pack(expand=True, fill="both")
+        if streamed:
+            start = time.perf_counter()
+            encoding = detector.detect(file_path)
+            detect_timings.append((time.perf_counter() - start) * 1000)
+            loader = ChunkedFileLoader(root, text_area, file_path, encoding)
+            loader.start()
+            # Первая порция вставляется в обработчике idle главного цикла
+            while text_area.compare("end-1c", "==", "1.0") and not loader.cancelled:
+                root.update()
+        else:
+            text, encoding, _ = detector.read_text(file_path)
+            text_area.insert("1.0", text)
+        highlighter = IncrementalHighlighter(get_tokenizer(language))
+        highlight_range(text_area, highlighter, 1, SCREEN_LINES)
+        text_area.update_idletasks()
+        if streamed:
+            loader.cancel()
+        frame.destroy()
+
+    results = {"bytes": size, "streamed": streamed,
+               "first_paint": summary(measure(open_first_paint, repeat))}
+    if detect_timings:
+        results["detect_encoding"] = summary(detect_timings)
+    return results
+
+
+def bench_search(root, source, repeat):
+    """Поиск по всему документу: снимок текста и построение списка совпадений"""
+    text_area = tk.Text(root)
+    text_area.insert("1.0", source)
+    results = {}
+    for query, regex in SEARCH_QUERIES:
+        pattern = compile_pattern(query, regex=regex)
+        match_counts = []
+
+        def search():
+            index = SearchIndex()
+            index.update(pattern, text_area.get("1.0", "end-1c").split("\n"))
+            match_counts.append(len(index.matches))
+
+        entry = summary(measure(search, repeat))
+        entry["matches"] = match_counts[-1]
+        results[("regex:" if regex else "literal:") + query] = entry
+    text_area.destroy()
+    return results
+
+
+def bench_bulk(root, source, repeat):
+    """Массовая правка всего документа: снимок, обработка в потоке, одна замена и ее отмена"""
+    text_area = tk.Text(root, undo=False)
+    text_area.insert("1.0", source)
+    history = EditHistory(text_area)
+    results = {}
+    for operation, query, replacement in BULK_OPERATIONS:
+        pattern = compile_pattern(query) if query else None
+        worker_timings = []
+        undo_timings = []
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            job = BulkJob(operation, text_area.get("1.0", "end-1c"), (1, 0), pattern,
+                          replacement)
+            job.start()
+            job.thread.join()
+            worker_timings.append((time.perf_counter() - start) * 1000)
+            if job.edit:
+                text_area.replace(*job.edit)
+                history.checkpoint()
+                text_area.update_idletasks()
+            timings.append((time.perf_counter() - start) * 1000)
+            # Текст возвращается к исходному для следующего повтора
+            start = time.perf_counter()
+            if job.edit and history.undo():
+                undo_timings.append((time.perf_counter() - start) * 1000)
+        entry = summary(timings)
+        entry["worker_median_ms"] = round(statistics.median(worker_timings), 3)
+        if undo_timings:
+            entry["undo_median_ms"] = round(statistics.median(undo_timings), 3)
+        results[operation] = entry
+    text_area.destroy()
+    return results
+
+
+def bench_save(root, source, directory, repeat):
+    """Сохранение как в редакторе: кодирование порциями строк и атомарная запись порций"""
+    text_area = tk.Text(root)
+    text_area.insert("1.0", source)
+    path = os.path.join(directory, "save_target.txt")
+    written = []
+
+    def save():
+        chunks, _ = encode_text(text_area, "utf-8")
+        atomic_write(path, chunks)
+        written.append(sum(map(len, chunks)))
+
+    timings = measure(save, repeat)
+    text_area.destroy()
+    result = summary(timings)
+    result["bytes"] = written[-1]
+    result["throughput_mb_s"] = round(
+        written[-1] / (1024 * 1024) / (statistics.median(timings) / 1000), 1)
+    return result
+
+
+def environment():
+    # Сведения для сравнения результатов между машинами и коммитами
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "tk": tk.TkVersion,
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def run_suite(root, kinds, sizes, repeat, keystrokes):
+    """Все замеры для каждого типа и размера файла"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="note_bench_") as directory:
+        for kind in kinds:
+            for line_count in sizes:
+                source = GENERATORS[kind](line_count)
+                file_path = os.path.join(directory, f"{kind}_{line_count}.txt")
+                with open(file_path, "w", encoding="utf-8", newline="\n") as f:
+                    f.write(source)
+                results.append({
+                    "kind": kind,
+                    "lines": line_count,
+                    "keystroke_to_highlight": bench_keystroke(root, source, keystrokes, kind),
+                    "open": bench_open(root, file_path, repeat, kind),
+                    "search": bench_search(root, source, repeat),
+                    "bulk": bench_bulk(root, source, repeat),
+                    "save": bench_save(root, source, directory, repeat),
+                })
+                os.remove(file_path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Замер производительности редактора: подсветка, открытие, поиск, "
+                    "массовая правка, сохранение")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="размеры файлов в строках через запятую")
+    parser.add_argument("--kinds", default=",".join(GENERATORS),
+                        help="типы файлов через запятую: " + ", ".join(GENERATORS))
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="повторы для открытия, поиска и сохранения")
+    parser.add_argument("--keystrokes", type=int, default=100,
+                        help="число нажатий клавиш для замера подсветки")
+    parser.add_argument("--legacy-lines", type=int, default=0,
+                        help="дополнительно сравнить с прежней подсветкой на N строках")
+    parser.add_argument("--output", help="файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+    kinds = [kind for kind in args.kinds.split(",") if kind]
+    unknown = [kind for kind in kinds if kind not in GENERATORS]
+    if unknown:
+        parser.error("неизвестный тип файла: " + ", ".join(unknown))
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+
+    # Окно не показывается; для сборочных машин без дисплея - запуск под Xvfb
+    root = tk.Tk()
+    root.withdraw()
+    try:
+        report = {"environment": environment(),
+                  "results": run_suite(root, kinds, sizes, args.repeat, args.keystrokes)}
+        if args.legacy_lines:
+            report["legacy_highlight"] = bench_highlight(root, args.legacy_lines, args.repeat)
+    finally:
+        root.destroy()
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
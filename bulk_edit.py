@@ -0,0 +1,437 @@
+import re
+import threading
+import tkinter as tk
+from tkinter import ttk
+
+from perf import recorder
+from search import compile_pattern
+
+# Через столько строк (совпадений) поток проверяет отмену и обновляет ход работы
+BULK_STEP = 65536
+# Период проверки хода операции главным потоком (мс)
+BULK_POLL_INTERVAL = 50
+# Прежний и новый текст сравниваются блоками: равенство срезов проверяется без цикла Python
+COMPARE_BLOCK = 65536
+
+# Операции панели: (имя, подпись)
+OPERATIONS = [
+    ("replace", "Заменить все"),
+    ("sort", "Сортировать строки"),
+    ("unique", "Удалить повторы строк"),
+    ("keep", "Оставить строки с совпадением"),
+    ("drop", "Удалить строки с совпадением"),
+]
+# Операции, которым нужен шаблон поиска
+PATTERN_OPERATIONS = {"replace", "keep", "drop"}
+
+# Число в начале строки для числовой сортировки
+_LEADING_NUMBER = re.compile(r"\s*([-+]?\d+(?:\.\d+)?)")
+
+
+class Cancelled(Exception):
+    pass
+
+
+def _no_check(done, total):
+    pass
+
+
+def split_lines(text):
+    """Строки текста и признак завершающего перевода строки (он не дает пустой строки)"""
+    lines = text.split("\n")
+    trailing = len(lines) > 1 and lines[-1] == ""
+    if trailing:
+        lines.pop()
+    return lines, trailing
+
+
+def join_lines(lines, trailing):
+    return "\n".join(lines) + ("\n" if trailing and lines else "")
+
+
+def replace_all(text, pattern, template, regex=False, check=_no_check):
+    """Замена всех совпадений; (текст, число замен).
+
+    С regex шаблон замены разбирается как в re.sub (\\1, \\g<name>), иначе вставляется как есть"""
+    literal = not regex or "\\" not in template
+    pieces = []
+    last = 0
+    count = 0
+    for match in pattern.finditer(text):
+        pieces.append(text[last:match.start()])
+        pieces.append(template if literal else match.expand(template))
+        last = match.end()
+        count += 1
+        if not count % BULK_STEP:
+            check(last, len(text))
+    pieces.append(text[last:])
+    return "".join(pieces), count
+
+
+def _numeric_key(line):
+    # Строки с числом в начале - по значению числа, остальные после них по тексту
+    match = _LEADING_NUMBER.match(line)
+    if match:
+        return 0, float(match.group(1)), line
+    return 1, 0.0, line
+
+
+def sort_lines(lines, reverse=False, case=True, numeric=False, check=_no_check):
+    """Устойчивая сортировка строк. Сама сортировка - один вызов: отмена проверяется до и после"""
+    check(0, 1)
+    if numeric:
+        key = _numeric_key
+    else:
+        key = None if case else str.casefold
+    result = sorted(lines, key=key, reverse=reverse)
+    check(1, 1)
+    return result
+
+
+def unique_lines(lines, case=True, check=_no_check):
+    """Строки без повторов; остается первое вхождение, порядок сохраняется"""
+    seen = {}
+    for start in range(0, len(lines), BULK_STEP):
+        check(start, len(lines))
+        chunk = lines[start:start + BULK_STEP]
+        if case:
+            # Словарь сохраняет порядок первых вставок; fromkeys работает без цикла Python
+            seen.update(dict.fromkeys(chunk))
+        else:
+            for line in chunk:
+                seen.setdefault(line.casefold(), line)
+    return list(seen) if case else list(seen.values())
+
+
+def filter_lines(lines, pattern, keep=True, check=_no_check):
+    """Строки, в которых есть совпадение (keep) или в которых его нет"""
+    result = []
+    search = pattern.search
+    for start in range(0, len(lines), BULK_STEP):
+        check(start, len(lines))
+        chunk = lines[start:start + BULK_STEP]
+        if keep:
+            result.extend(filter(search, chunk))
+        else:
+            result.extend(line for line in chunk if search(line) is None)
+    return result
+
+
+def _common_prefix(a, b):
+    # Длина общего начала: сначала целыми блоками, затем делением несовпавшего блока пополам
+    limit = min(len(a), len(b))
+    pos = 0
+    while pos < limit:
+        step = min(COMPARE_BLOCK, limit - pos)
+        if a[pos:pos + step] == b[pos:pos + step]:
+            pos += step
+            continue
+        while step > 1:
+            half = step // 2
+            if a[pos:pos + half] == b[pos:pos + half]:
+                pos += half
+                step -= half
+            else:
+                step = half
+        return pos
+    return pos
+
+
+def _common_suffix(a, b, limit):
+    # Длина общего конца, не больше limit (чтобы не пересечься с общим началом)
+    end_a, end_b = len(a), len(b)
+    pos = 0
+    while pos < limit:
+        step = min(COMPARE_BLOCK, limit - pos)
+        if a[end_a - pos - step:end_a - pos] == b[end_b - pos - step:end_b - pos]:
+            pos += step
+            continue
+        while step > 1:
+            half = step // 2
+            if a[end_a - pos - half:end_a - pos] == b[end_b - pos - half:end_b - pos]:
+                pos += half
+                step -= half
+            else:
+                step = half
+        return pos
+    return pos
+
+
+def changed_span(old, new):
+    """(начало, конец в old, конец в new): наименьший участок, который отличается.
+
+    None, если тексты совпадают"""
+    if old == new:
+        return None
+    prefix = _common_prefix(old, new)
+    suffix = _common_suffix(old, new, min(len(old), len(new)) - prefix)
+    return prefix, len(old) - suffix, len(new) - suffix
+
+
+def _position(base, text, offset):
+    # Позиция Tk (строка, столбец) символа offset текста, начинающегося в позиции base
+    newlines = text.count("\n", 0, offset)
+    if not newlines:
+        return base[0], base[1] + offset
+    return base[0] + newlines, offset - text.rfind("\n", 0, offset) - 1
+
+
+class BulkJob:
+    """Операция над снимком текста в фоновом потоке.
+
+    Главный поток опрашивает done и progress; результат - одна правка edit:
+    (начало, конец, новый текст) в позициях Tk или None, если текст не изменился"""
+    def __init__(self, operation, text, base, pattern=None, template="", regex=False,
+                 reverse=False, case=True, numeric=False):
+        self.operation = operation
+        self.text = text
+        # Позиция Tk начала снимка (строка, столбец)
+        self.base = base
+        self.pattern = pattern
+        self.template = template
+        self.regex = regex
+        self.reverse = reverse
+        self.case = case
+        self.numeric = numeric
+        self.cancelled = threading.Event()
+        self.progress = 0.0
+        self.done = False
+        self.edit = None
+        # Число замен или удаленных строк
+        self.count = 0
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _check(self, done, total):
+        if self.cancelled.is_set():
+            raise Cancelled()
+        self.progress = done / total if total else 1.0
+
+    def _run(self):
+        try:
+            with recorder.span("bulk." + self.operation):
+                text = self._transform()
+                self._check(1, 1)
+                span = changed_span(self.text, text)
+            if span is not None:
+                start, old_end, new_end = span
+                self.edit = ("%d.%d" % _position(self.base, self.text, start),
+                             "%d.%d" % _position(self.base, self.text, old_end),
+                             text[start:new_end])
+        except Cancelled:
+            pass
+        except re.error as e:
+            # Ошибка в шаблоне замены (например, ссылка на несуществующую группу)
+            self.error = str(e)
+        finally:
+            self.text = None
+            self.done = True
+
+    def _transform(self):
+        if self.operation == "replace":
+            text, self.count = replace_all(self.text, self.pattern, self.template, self.regex,
+                                           self._check)
+            return text
+        lines, trailing = split_lines(self.text)
+        if self.operation == "sort":
+            result = sort_lines(lines, self.reverse, self.case, self.numeric, self._check)
+        elif self.operation == "unique":
+            result = unique_lines(lines, self.case, self._check)
+        else:
+            result = filter_lines(lines, self.pattern, self.operation == "keep", self._check)
+        self.count = len(lines) - len(result)
+        return join_lines(result, trailing)
+
+
+class BulkEditPanel:
+    def __init__(self, app):
+        self.app = app
+        self.job = None
+        # Вкладка операции и счетчик правок, по которому видно, что текст изменился
+        self.tab_info = None
+        self.changes = None
+        self._poll_id = None
+
+        self.window = tk.Toplevel(app.root)
+        self.window.title("Массовая правка")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        operations = tk.Frame(self.window)
+        operations.pack(side=tk.TOP, fill=tk.X)
+        self.operation = tk.StringVar(value=OPERATIONS[0][0])
+        for name, label in OPERATIONS:
+            tk.Radiobutton(operations, text=label, value=name,
+                           variable=self.operation).pack(anchor="w", padx=5)
+
+        form = tk.Frame(self.window)
+        form.pack(side=tk.TOP, fill=tk.X)
+        tk.Label(form, text="Найти:").grid(row=0, column=0, sticky="w", padx=5)
+        self.query = tk.StringVar()
+        self.entry = tk.Entry(form, textvariable=self.query)
+        self.entry.grid(row=0, column=1, sticky="we", padx=2, pady=2)
+        tk.Label(form, text="Заменить на:").grid(row=1, column=0, sticky="w", padx=5)
+        self.replacement = tk.StringVar()
+        tk.Entry(form, textvariable=self.replacement).grid(
+            row=1, column=1, sticky="we", padx=2, pady=2)
+        form.columnconfigure(1, weight=1)
+
+        options = tk.Frame(self.window)
+        options.pack(side=tk.TOP, fill=tk.X)
+        self.case_var = tk.BooleanVar()
+        self.word_var = tk.BooleanVar()
+        self.regex_var = tk.BooleanVar()
+        self.reverse_var = tk.BooleanVar()
+        self.numeric_var = tk.BooleanVar()
+        self.selection_var = tk.BooleanVar()
+        # Повторы по умолчанию ищутся точно: "Error" и "error" - разные строки
+        self.fold_var = tk.BooleanVar()
+        for row, items in enumerate(((("Учитывать регистр", self.case_var),
+                                      ("Слово целиком", self.word_var),
+                                      ("Регулярное выражение", self.regex_var)),
+                                     (("По убыванию", self.reverse_var),
+                                      ("Числа", self.numeric_var),
+                                      ("Повторы без учета регистра", self.fold_var),
+                                      ("Только выделение", self.selection_var)))):
+            for column, (text, var) in enumerate(items):
+                tk.Checkbutton(options, text=text, variable=var).grid(
+                    row=row, column=column, sticky="w")
+
+        buttons = tk.Frame(self.window)
+        buttons.pack(side=tk.TOP, fill=tk.X)
+        self.progress = ttk.Progressbar(
+            buttons, orient=tk.HORIZONTAL, mode="determinate", maximum=100)
+        self.progress.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5, pady=2)
+        tk.Button(buttons, text="Выполнить", command=self.start,
+                  bg="gray", fg="lightgray").pack(side=tk.LEFT, padx=2, pady=2)
+        tk.Button(buttons, text="Отмена", command=self.cancel,
+                  bg="gray", fg="lightgray").pack(side=tk.LEFT, padx=2, pady=2)
+
+        self.status_label = tk.Label(self.window, anchor="w")
+        self.status_label.pack(side=tk.BOTTOM, fill=tk.X)
+
+        self.entry.bind("<Return>", lambda event: self.start())
+
+    def show(self):
+        tab_info = self.app.get_current_tab()
+        # С выделением операция по умолчанию применяется только к нему
+        self.selection_var.set(bool(tab_info and not tab_info.viewer
+                                    and tab_info.text.tag_ranges("sel")))
+        self.window.deiconify()
+        self.window.lift()
+        self.entry.focus_set()
+
+    def close(self):
+        self.cancel()
+        self.window.withdraw()
+
+    def start(self):
+        """Снимок текста берется один раз в главном потоке, вся обработка - в фоне"""
+        if self.job is not None:
+            return
+        tab_info = self.app.get_current_tab()
+        if (not tab_info or tab_info.viewer or tab_info.loader or tab_info.follower
+                or tab_info.pending or tab_info.history is None or tab_info.history.paused):
+            self.status_label.config(text="Вкладка недоступна для правки")
+            return
+        operation = self.operation.get()
+        pattern = None
+        if operation in PATTERN_OPERATIONS:
+            if not self.query.get():
+                self.status_label.config(text="Введите строку поиска")
+                return
+            try:
+                # Замена идет по всему тексту сразу: ^ и $ - границы строк, как в поиске
+                pattern = compile_pattern(self.query.get(), self.regex_var.get(),
+                                          self.case_var.get(), self.word_var.get(),
+                                          multiline=True)
+            except re.error as e:
+                self.status_label.config(text=f"Ошибка в выражении: {e}")
+                return
+        text_area = tab_info.text
+        start, end = "1.0", "end-1c"
+        if self.selection_var.get() and text_area.tag_ranges("sel"):
+            start, end = "sel.first", "sel.last"
+            if operation != "replace":
+                # Строковые операции берут выделенные строки целиком
+                start, end = "sel.first linestart", "sel.last lineend"
+                if text_area.compare("sel.last", "==", "sel.last linestart") and \
+                        text_area.compare("sel.last", ">", "sel.first linestart"):
+                    end = "sel.last -1c"
+        case = self.case_var.get() if operation != "unique" else not self.fold_var.get()
+        start = text_area.index(start)
+        text = text_area.get(start, end)
+        base = tuple(map(int, start.split(".")))
+        self.tab_info = tab_info
+        self.changes = tab_info.history.track()
+        self.changes.take()
+        self.job = BulkJob(operation, text, base, pattern, self.replacement.get(),
+                           self.regex_var.get(), self.reverse_var.get(), case,
+                           self.numeric_var.get())
+        self.job.start()
+        self.progress["value"] = 0
+        self.status_label.config(text="Выполняется...")
+        self._poll()
+
+    def cancel(self):
+        if self.job:
+            self.job.cancel()
+
+    def _poll(self):
+        self._poll_id = None
+        job = self.job
+        if job is None:
+            return
+        self.progress["value"] = job.progress * 100
+        if not job.done:
+            self._poll_id = self.window.after(BULK_POLL_INTERVAL, self._poll)
+            return
+        self.job = None
+        tab_info, changes = self.tab_info, self.changes
+        self.tab_info = self.changes = None
+        if tab_info.history is not None:
+            tab_info.history.untrack(changes)
+        if job.cancelled.is_set():
+            self.status_label.config(text="Отменено")
+        elif job.error:
+            self.status_label.config(text=f"Ошибка в шаблоне замены: {job.error}")
+        elif self.app.document_of(tab_info.text) is None:
+            self.status_label.config(text="Вкладка закрыта")
+        elif any(changes.take()):
+            # Результат посчитан по прежнему тексту - применять его нельзя
+            self.status_label.config(text="Текст изменился во время операции, запустите снова")
+        elif job.edit is None:
+            self.progress["value"] = 100
+            self.status_label.config(text="Изменений нет")
+        else:
+            self.progress["value"] = 100
+            self._apply(tab_info, job)
+
+    def _apply(self, tab_info, job):
+        # Весь результат - одна замена участка, который действительно изменился,
+        # и одна группа в истории правок
+        start, end, text = job.edit
+        text_area = tab_info.text
+        history = tab_info.history
+        history.checkpoint()
+        with recorder.span("bulk.apply"):
+            text_area.replace(start, end, text)
+        history.checkpoint()
+        text_area.tag_remove("sel", "1.0", "end")
+        text_area.mark_set(tk.INSERT, start)
+        text_area.see(tk.INSERT)
+        if job.operation == "sort":
+            status = "Готово"
+        elif job.operation == "replace":
+            status = f"Готово. Замен: {job.count}"
+        else:
+            status = f"Готово. Удалено строк: {job.count}"
+        if not history.can_undo():
+            status += " (отменить нельзя: превышен лимит памяти истории правок)"
+        self.status_label.config(text=status)
+        self.app.queue_highlight()
@@ -24,6 +24,12 @@ class ConfigManager:
                 pass
         return default_config
 
+    def cache_dir(self, name):
+        """Каталог для кэшей рядом с файлом настроек"""
+        path = os.path.join(os.path.dirname(os.path.abspath(self.config_file)), ".note_cache", name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
     def save_config(self, config):
         """Сохранение настроек в файл"""
         try:
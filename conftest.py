@@ -0,0 +1 @@
+# Модули редактора лежат в корне репозитория: pytest добавляет этот каталог в sys.path
@@ -0,0 +1,53 @@
+import uuid
+
+
+class TabDocument:
+    """Состояние одной вкладки: виджеты, файл, кодировка, флаги правок и кэши"""
+    # Экземпляров столько же, сколько вкладок, и обращение к ним идет на каждую правку
+    __slots__ = ("id", "frame", "text", "file", "encoding", "newline", "dirty", "journal_dirty",
+                 "saved_hash", "disk_stamp", "highlighter", "language", "view", "viewer",
+                 "loader", "follower", "pending", "prefetch", "search_index", "history",
+                 "highlight_changes")
+
+    def __init__(self, frame, text, highlighter=None, language=None, file=None, encoding=None,
+                 viewer=None):
+        # Постоянный идентификатор для журнала восстановления
+        self.id = uuid.uuid4().hex
+        self.frame = frame
+        self.text = text
+        self.file = file
+        self.encoding = encoding
+        # Перевод строки файла: в виджете всегда "\n", при записи восстанавливается исходный
+        self.newline = "\n"
+        # Есть несохраненные правки / правки, еще не попавшие в журнал
+        self.dirty = False
+        self.journal_dirty = False
+        # Хэш записанного содержимого и (размер, время) файла после открытия или записи:
+        # по ним повторное сохранение без изменений пропускается
+        self.saved_hash = None
+        self.disk_stamp = None
+        self.highlighter = highlighter
+        # Имя грамматики подсветки (см. languages.GRAMMARS)
+        self.language = language
+        # Последнее положение прокрутки: подсветка запускается только при его изменении
+        self.view = None
+        # Вкладка просмотра очень большого файла (только чтение)
+        self.viewer = viewer
+        # Идущая порционная загрузка
+        self.loader = None
+        # Слежение за дописываемым файлом
+        self.follower = None
+        # Незагруженная вкладка сессии и ее фоновое чтение
+        self.pending = None
+        self.prefetch = None
+        # Совпадения панели поиска (создается при первом поиске)
+        self.search_index = None
+        # История правок (history.EditHistory) и измененные строки для подсветки;
+        # у вкладки просмотра их нет
+        self.history = None
+        self.highlight_changes = None
+
+    @property
+    def key(self):
+        """Имя виджета вкладки в Notebook - ключ словаря вкладок"""
+        return str(self.frame)
@@ -0,0 +1,199 @@
+import codecs
+import json
+import mmap
+import os
+import threading
+
+# Маркеры порядка байтов; UTF-32 проверяется раньше UTF-16, у них общий префикс
+BOMS = [
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+# Порция, которой байты подаются детектору
+DETECT_CHUNK_SIZE = 64 * 1024
+# Больше этого объема детектору не подается (начало, середина и конец файла)
+DETECT_SAMPLE_SIZE = 1024 * 1024
+# Кодировка, если ни UTF-8, ни детектор не дали уверенного ответа
+FALLBACK_ENCODING = "windows-1251"
+MIN_CONFIDENCE = 0.5
+# Сколько файлов помнит кэш кодировок
+CACHE_LIMIT = 1000
+
+
+def detect_newline(text):
+    """Вид первого перевода строки в тексте ("\n", "\r\n" или "\r"); None, если переводов нет"""
+    end = text.find("\n")
+    cr = text.find("\r", 0, end if end >= 0 else len(text))
+    if cr < 0:
+        return "\n" if end >= 0 else None
+    return "\r\n" if cr + 1 == end else "\r"
+
+
+def translate_newlines(text):
+    """Переводы строк приводятся к "\n", как их хранит Tk: (текст, вид перевода строки или None)"""
+    newline = detect_newline(text)
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text, newline
+
+
+class EncodingDetector:
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self._cache = None
+        # Детектор используется и из фоновых потоков (поиск в файлах)
+        self._lock = threading.Lock()
+
+    def detect(self, file_path):
+        """Кодировка файла по ограниченной выборке (для больших файлов)"""
+        key, stamp = self._cache_key(file_path)
+        encoding = self._cached(key, stamp)
+        if encoding:
+            return encoding
+        with open(file_path, "rb") as file:
+            if stamp[0] == 0:
+                encoding = "utf-8"
+            else:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    encoding = self.detect_data(data)
+        self._remember(key, stamp, encoding)
+        return encoding
+
+    def detect_data(self, data):
+        """Кодировка байтов (bytes или mmap) без обращения к кэшу"""
+        return self._detect(data, self._sample_regions(len(data)))
+
+    def read_text(self, file_path):
+        """Чтение файла за одно открытие и один проход декодирования:
+        (текст с переводами строк "\n", кодировка, перевод строки файла)"""
+        text, encoding = self._read_decoded(file_path)
+        text, newline = translate_newlines(text)
+        return text, encoding, newline or "\n"
+
+    def _read_decoded(self, file_path):
+        key, stamp = self._cache_key(file_path)
+        with open(file_path, "rb") as file:
+            data = file.read()
+        encoding = self._cached(key, stamp)
+        if encoding:
+            try:
+                return data.decode(encoding), encoding
+            except (UnicodeDecodeError, LookupError):
+                pass
+        bom_encoding = self._bom_encoding(data)
+        if bom_encoding:
+            encoding = bom_encoding
+        else:
+            try:
+                # Быстрый путь: строгий UTF-8 сразу дает и проверку, и текст
+                text = data.decode("utf-8")
+                self._remember(key, stamp, "utf-8")
+                return text, "utf-8"
+            except UnicodeDecodeError:
+                encoding = self._detect_with_chardet(data, self._sample_regions(len(data)))
+        try:
+            text = data.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            encoding = FALLBACK_ENCODING
+            text = data.decode(encoding, errors="replace")
+        self._remember(key, stamp, encoding)
+        return text, encoding
+
+    def _sample_regions(self, size):
+        # Выборка из начала, середины и конца файла
+        if size <= DETECT_SAMPLE_SIZE:
+            return [(0, size)]
+        part = DETECT_SAMPLE_SIZE // 3
+        middle = size // 2
+        return [(0, part), (middle, middle + part), (size - part, size)]
+
+    def _detect(self, data, regions):
+        encoding = self._bom_encoding(data[:4])
+        if encoding:
+            return encoding
+        if self._is_utf8(data, regions):
+            return "utf-8"
+        return self._detect_with_chardet(data, regions)
+
+    def _bom_encoding(self, data):
+        for bom, encoding in BOMS:
+            if data[:len(bom)] == bom:
+                return encoding
+        return None
+
+    def _is_utf8(self, data, regions):
+        for start, end in regions:
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            # Начало области могло попасть в середину многобайтового символа
+            while start < end and start > 0 and 0x80 <= data[start] < 0xC0:
+                start += 1
+            for pos in range(start, end, DETECT_CHUNK_SIZE):
+                try:
+                    decoder.decode(data[pos:min(pos + DETECT_CHUNK_SIZE, end)])
+                except UnicodeDecodeError:
+                    return False
+        return True
+
+    def _detect_with_chardet(self, data, regions):
+        # chardet загружается только здесь: BOM и UTF-8 определяются без него,
+        # а импорт стоит заметного времени при запуске
+        from chardet.universaldetector import UniversalDetector
+        # Детектор получает данные порциями и останавливается, как только уверен
+        detector = UniversalDetector()
+        for start, end in regions:
+            for pos in range(start, end, DETECT_CHUNK_SIZE):
+                detector.feed(data[pos:min(pos + DETECT_CHUNK_SIZE, end)])
+                if detector.done:
+                    break
+            if detector.done:
+                break
+        result = detector.close()
+        encoding = result["encoding"]
+        if encoding is None or result["confidence"] < MIN_CONFIDENCE:
+            return FALLBACK_ENCODING
+        return encoding
+
+    def _cache_key(self, file_path):
+        stat = os.stat(file_path)
+        return os.path.abspath(file_path), (stat.st_size, stat.st_mtime_ns)
+
+    def _load_cache(self):
+        with self._lock:
+            return self._load_cache_locked()
+
+    def _load_cache_locked(self):
+        if self._cache is not None:
+            return self._cache
+        self._cache = {}
+        if self.cache_file and os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, "r", encoding="utf-8") as f:
+                    self._cache = json.load(f)
+            except (json.JSONDecodeError, IOError):
+                pass
+        return self._cache
+
+    def _cached(self, key, stamp):
+        entry = self._load_cache().get(key)
+        if entry and tuple(entry[:2]) == stamp:
+            return entry[2]
+        return None
+
+    def _remember(self, key, stamp, encoding):
+        with self._lock:
+            cache = self._load_cache_locked()
+            cache.pop(key, None)
+            cache[key] = [stamp[0], stamp[1], encoding]
+            # Самые старые записи вытесняются
+            while len(cache) > CACHE_LIMIT:
+                cache.pop(next(iter(cache)))
+            if not self.cache_file:
+                return
+            try:
+                with open(self.cache_file, "w", encoding="utf-8") as f:
+                    json.dump(cache, f)
+            except IOError:
+                pass
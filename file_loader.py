@@ -0,0 +1,124 @@
+import codecs
+import mmap
+import time
+import tkinter as tk
+from tkinter import ttk
+
+from encoding_detector import translate_newlines
+
+# Файлы больше этого размера открываются потоково, порциями
+LARGE_FILE_THRESHOLD = 4 * 1024 * 1024
+# Первая порция маленькая, чтобы первый экран появился сразу
+FIRST_CHUNK_SIZE = 64 * 1024
+CHUNK_SIZE = 1024 * 1024
+# Сколько времени одна порция может занимать главный поток (секунды)
+CHUNK_TIME_BUDGET = 0.03
+
+
+class ChunkedFileLoader:
+    def __init__(self, root, text_area, file_path, encoding, on_done=None):
+        self.root = root
+        self.text_area = text_area
+        self.file_path = file_path
+        self.encoding = encoding
+        self.on_done = on_done
+        self.cancelled = False
+        self._file = None
+        self._map = None
+        self._decoder = None
+        self._offset = 0
+        # "\r" в конце порции может оказаться началом "\r\n" следующей
+        self._carry = ""
+        # Перевод строки файла (по первому встреченному); в виджет текст попадает с "\n"
+        self.newline = None
+        self._after_id = None
+
+        # Строка состояния загрузки внутри вкладки
+        self.status_frame = tk.Frame(text_area.master)
+        self.progress = ttk.Progressbar(
+            self.status_frame, orient=tk.HORIZONTAL, mode="determinate", maximum=100)
+        self.progress.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5, pady=2)
+        self.status_label = tk.Label(self.status_frame, text="Загрузка...")
+        self.status_label.pack(side=tk.LEFT, padx=5)
+        tk.Button(self.status_frame, text="Отмена", command=self.cancel,
+                  bg="gray", fg="lightgray").pack(side=tk.LEFT, padx=2, pady=2)
+
+    def start(self):
+        """Открытие файла через mmap и запуск порционной вставки"""
+        self._file = open(self.file_path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._restart(self.encoding)
+        self.status_frame.pack(side=tk.BOTTOM, fill=tk.X, before=self.text_area)
+        self._after_id = self.root.after_idle(self._step)
+
+    def cancel(self):
+        """Остановка загрузки: уже вставленный текст остается во вкладке"""
+        if self._map is None:
+            return
+        self.cancelled = True
+        self._finish(completed=False)
+
+    def _restart(self, encoding, errors="strict"):
+        self.encoding = encoding
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors)
+        self._offset = 0
+        self._carry = ""
+        self.newline = None
+        self.text_area.config(state="normal")
+        self.text_area.delete("1.0", tk.END)
+
+    def _insert(self, text):
+        # Пользователь не может печатать, пока файл дописывается в конец
+        self.text_area.config(state="normal")
+        self.text_area.insert("end-1c", text)
+        self.text_area.config(state="disabled")
+
+    def _step(self):
+        self._after_id = None
+        if self._map is None:
+            return
+        size = len(self._map)
+        first = self._offset == 0
+        chunk_size = FIRST_CHUNK_SIZE if first else CHUNK_SIZE
+        deadline = time.perf_counter() + CHUNK_TIME_BUDGET
+        try:
+            while self._offset < size:
+                data = self._map[self._offset:self._offset + chunk_size]
+                self._offset += len(data)
+                final = self._offset >= size
+                text = self._carry + self._decoder.decode(data, final=final)
+                self._carry = ""
+                if text.endswith("\r") and not final:
+                    text, self._carry = text[:-1], "\r"
+                text, newline = translate_newlines(text)
+                if self.newline is None:
+                    self.newline = newline
+                self._insert(text)
+                # После первой порции сразу отдаем управление, чтобы экран отрисовался
+                if first or time.perf_counter() > deadline:
+                    break
+        except UnicodeDecodeError:
+            # Как и при обычном открытии - повтор в windows-1251
+            self._restart("windows-1251", errors="replace")
+        percent = self._offset * 100 / size if size else 100
+        self.progress["value"] = percent
+        self.status_label.config(text=f"Загрузка... {percent:.0f}%")
+        if self._offset >= size:
+            self._finish(completed=True)
+        else:
+            self._after_id = self.root.after(1, self._step)
+
+    def _finish(self, completed):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self._map.close()
+        self._file.close()
+        self._map = None
+        self._file = None
+        if self.text_area.winfo_exists():
+            self.text_area.config(state="normal")
+            self.text_area.edit_modified(False)
+            self.status_frame.destroy()
+        if self.on_done:
+            self.on_done(completed)
@@ -0,0 +1,376 @@
+import fnmatch
+import mmap
+import os
+import re
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from queue import Queue, Empty
+from tkinter import filedialog
+
+from encoding_detector import translate_newlines
+from search import compile_pattern
+
+# Не больше этого числа результатов за один поиск
+MAX_RESULTS = 5000
+# Не больше этого числа совпадений из одного файла
+MAX_RESULTS_PER_FILE = 1000
+# Файлы больше этого размера пропускаются (их удобнее смотреть во вкладке просмотра)
+MAX_FILE_SIZE = 64 * 1024 * 1024
+# По наличию нулевого байта в начале файла он считается двоичным
+BINARY_SAMPLE_SIZE = 8192
+# Результаты отдаются главному потоку пачками
+RESULT_BATCH_SIZE = 200
+SEARCH_THREADS = min(8, (os.cpu_count() or 1) + 4)
+# Каталоги, которые не обходятся
+SKIP_DIRS = {"__pycache__", "node_modules"}
+
+
+class SearchHit:
+    __slots__ = ("source", "path", "line_no", "col", "line")
+
+    def __init__(self, source, path, line_no, col, line):
+        # source - текстовое поле открытой вкладки или None для файла на диске
+        self.source = source
+        self.path = path
+        self.line_no = line_no
+        self.col = col
+        self.line = line
+
+
+def find_hits(text, pattern, source=None, path=None, limit=MAX_RESULTS_PER_FILE):
+    """Совпадения в тексте с номерами строк; строки считаются по ходу, без разбиения текста"""
+    hits = []
+    line_no = 1
+    line_start = 0
+    last = 0
+    for match in pattern.finditer(text):
+        if match.end() == match.start():
+            continue
+        start = match.start()
+        newlines = text.count("\n", last, start)
+        if newlines:
+            line_no += newlines
+            line_start = text.rfind("\n", 0, start) + 1
+        last = start
+        line_end = text.find("\n", start)
+        line = text[line_start:line_end if line_end >= 0 else len(text)]
+        hits.append(SearchHit(source, path, line_no, start - line_start, line.strip()[:200]))
+        if len(hits) >= limit:
+            break
+    return hits
+
+
+class FileSearchEngine:
+    def __init__(self, detector, pattern, tab_snapshots, directory=None, mask="*",
+                 literal=True, max_results=MAX_RESULTS):
+        self.detector = detector
+        self.pattern = pattern
+        # Список (текстовое поле, путь, текст) открытых вкладок; текст None -
+        # вкладка без текста в памяти, файл читается с диска
+        self.tab_snapshots = tab_snapshots
+        self.directory = directory
+        self.masks = [m.strip() for m in mask.split(";") if m.strip()] or ["*"]
+        self.max_results = max_results
+        self.results = Queue()
+        self.cancelled = threading.Event()
+        self.done = False
+        self.files_scanned = 0
+        self.result_count = 0
+        self._lock = threading.Lock()
+        self._bytes_pattern = self._compile_prefilter(pattern) if literal else None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _compile_prefilter(self, pattern):
+        # Для ASCII-строки поиска файл сначала проверяется по байтам, без декодирования.
+        # Для регулярных выражений не применяется: \w и подобные классы в байтах уже, чем в str
+        if not pattern.pattern.isascii():
+            return None
+        try:
+            return re.compile(pattern.pattern.encode("ascii"),
+                              pattern.flags & (re.IGNORECASE | re.MULTILINE))
+        except re.error:
+            return None
+
+    def _publish(self, hits):
+        with self._lock:
+            hits = hits[:self.max_results - self.result_count]
+            self.result_count += len(hits)
+            if self.result_count >= self.max_results:
+                self.cancelled.set()
+        for pos in range(0, len(hits), RESULT_BATCH_SIZE):
+            self.results.put(hits[pos:pos + RESULT_BATCH_SIZE])
+
+    def _run(self):
+        try:
+            open_paths = set()
+            for source, path, text in self.tab_snapshots:
+                if self.cancelled.is_set():
+                    return
+                if path:
+                    open_paths.add(os.path.abspath(path))
+                if text is None:
+                    # Вкладка просмотра или незагруженная вкладка сессии;
+                    # слишком большой для декодирования файл ищется по байтам
+                    try:
+                        large = os.path.getsize(path) > MAX_FILE_SIZE
+                    except OSError:
+                        continue
+                    hits = self._search_large(path) if large else self._search_file(path)
+                else:
+                    hits = find_hits(text, self.pattern, source, path)
+                if hits:
+                    self._publish(hits)
+            if self.directory:
+                self._scan_directory(open_paths)
+        finally:
+            self.done = True
+
+    def _iter_files(self, skip):
+        for root, dirs, files in os.walk(self.directory):
+            if self.cancelled.is_set():
+                return
+            dirs[:] = [d for d in dirs if not d.startswith(".") and d not in SKIP_DIRS]
+            for name in files:
+                if any(fnmatch.fnmatch(name, mask) for mask in self.masks):
+                    path = os.path.abspath(os.path.join(root, name))
+                    if path not in skip:
+                        yield path
+
+    def _scan_directory(self, skip):
+        # Ограниченное число задач в работе, чтобы отмена срабатывала сразу
+        with ThreadPoolExecutor(max_workers=SEARCH_THREADS) as pool:
+            pending = set()
+            for path in self._iter_files(skip):
+                if self.cancelled.is_set():
+                    break
+                pending.add(pool.submit(self._search_file, path))
+                if len(pending) >= SEARCH_THREADS * 4:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._collect(finished)
+            while pending and not self.cancelled.is_set():
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                self._collect(finished)
+            for future in pending:
+                future.cancel()
+
+    def _collect(self, futures):
+        for future in futures:
+            hits = future.result()
+            if hits and not self.cancelled.is_set():
+                self._publish(hits)
+
+    def _search_file(self, path):
+        if self.cancelled.is_set():
+            return None
+        try:
+            with open(path, "rb") as file:
+                size = os.fstat(file.fileno()).st_size
+                if size == 0 or size > MAX_FILE_SIZE:
+                    return None
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    encoding = self.detector.detect_data(data)
+                    if self._is_binary(data, encoding):
+                        return None
+                    if (self._bytes_pattern is not None and self._ascii_compatible(encoding)
+                            and self._bytes_pattern.search(data) is None):
+                        return None
+                    text = data[:].decode(encoding, errors="replace")
+            # Как при открытии файла: $ совпадает и перед "\r\n", столбцы совпадают с вкладкой
+            text, _ = translate_newlines(text)
+        except (OSError, ValueError, LookupError):
+            return None
+        finally:
+            with self._lock:
+                self.files_scanned += 1
+        return find_hits(text, self.pattern, None, path)
+
+    def _search_large(self, path):
+        # Файл вкладки просмотра не декодируется целиком: поиск идет по байтам mmap
+        if self._bytes_pattern is None:
+            return None
+        hits = []
+        try:
+            with open(path, "rb") as file, \
+                    mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                encoding = self.detector.detect(path)
+                if not self._ascii_compatible(encoding):
+                    return None
+                line_no = 1
+                last = 0
+                for match in self._bytes_pattern.finditer(data):
+                    if self.cancelled.is_set() or len(hits) >= MAX_RESULTS_PER_FILE:
+                        break
+                    start = match.start()
+                    line_no += data[last:start].count(b"\n")
+                    last = start
+                    line_start = data.rfind(b"\n", 0, start) + 1
+                    line_end = data.find(b"\n", start)
+                    line = data[line_start:line_end if line_end >= 0 else len(data)]
+                    hits.append(SearchHit(None, path, line_no, start - line_start,
+                                          line.decode(encoding, errors="replace").strip()[:200]))
+        except (OSError, ValueError, LookupError):
+            return None
+        return hits
+
+    def _is_binary(self, data, encoding):
+        if encoding.startswith(("utf-16", "utf-32")):
+            return False
+        return data.find(b"\0", 0, BINARY_SAMPLE_SIZE) >= 0
+
+    def _ascii_compatible(self, encoding):
+        return not encoding.startswith(("utf-16", "utf-32"))
+
+
+class FindInFilesPanel:
+    def __init__(self, app):
+        self.app = app
+        self.engine = None
+        self.hits = []
+        self._poll_id = None
+
+        self.window = tk.Toplevel(app.root)
+        self.window.title("Найти в файлах")
+        self.window.geometry("700x400")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        form = tk.Frame(self.window)
+        form.pack(side=tk.TOP, fill=tk.X)
+        tk.Label(form, text="Найти:").grid(row=0, column=0, sticky="w", padx=5)
+        self.query = tk.StringVar()
+        self.entry = tk.Entry(form, textvariable=self.query)
+        self.entry.grid(row=0, column=1, columnspan=3, sticky="we", padx=2, pady=2)
+        tk.Label(form, text="Каталог:").grid(row=1, column=0, sticky="w", padx=5)
+        self.directory = tk.StringVar()
+        tk.Entry(form, textvariable=self.directory).grid(
+            row=1, column=1, sticky="we", padx=2, pady=2)
+        tk.Button(form, text="Обзор...", command=self.choose_directory,
+                  bg="gray", fg="lightgray").grid(row=1, column=2, padx=2)
+        tk.Label(form, text="Маска:").grid(row=2, column=0, sticky="w", padx=5)
+        self.mask = tk.StringVar(value="*")
+        tk.Entry(form, textvariable=self.mask).grid(
+            row=2, column=1, sticky="we", padx=2, pady=2)
+        form.columnconfigure(1, weight=1)
+
+        options = tk.Frame(self.window)
+        options.pack(side=tk.TOP, fill=tk.X)
+        self.case_var = tk.BooleanVar()
+        self.word_var = tk.BooleanVar()
+        self.regex_var = tk.BooleanVar()
+        for text, var in (("Учитывать регистр", self.case_var), ("Слово целиком", self.word_var),
+                          ("Регулярное выражение", self.regex_var)):
+            tk.Checkbutton(options, text=text, variable=var).pack(side=tk.LEFT)
+        tk.Button(options, text="Искать", command=self.start,
+                  bg="gray", fg="lightgray").pack(side=tk.LEFT, padx=2, pady=2)
+        tk.Button(options, text="Отмена", command=self.cancel,
+                  bg="gray", fg="lightgray").pack(side=tk.LEFT, padx=2, pady=2)
+
+        self.status_label = tk.Label(self.window, anchor="w")
+        self.status_label.pack(side=tk.BOTTOM, fill=tk.X)
+        scrollbar = tk.Scrollbar(self.window)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox = tk.Listbox(self.window, font=("Courier", 10),
+                                  yscrollcommand=scrollbar.set)
+        self.listbox.pack(expand=True, fill="both")
+        scrollbar.config(command=self.listbox.yview)
+
+        self.entry.bind("<Return>", lambda event: self.start())
+        self.listbox.bind("<Double-Button-1>", self.open_selected)
+        self.listbox.bind("<Return>", self.open_selected)
+
+    def show(self):
+        self.window.deiconify()
+        self.window.lift()
+        self.entry.focus_set()
+
+    def close(self):
+        self.cancel()
+        self.window.withdraw()
+
+    def choose_directory(self):
+        directory = filedialog.askdirectory(parent=self.window)
+        if directory:
+            self.directory.set(directory)
+
+    def start(self):
+        """Запуск поиска: снимки открытых вкладок берутся в главном потоке"""
+        self.cancel()
+        try:
+            # Файлы ищутся целиком: ^ и $ - границы строк
+            pattern = compile_pattern(self.query.get(), self.regex_var.get(),
+                                      self.case_var.get(), self.word_var.get(), multiline=True)
+        except re.error as e:
+            self.status_label.config(text=f"Ошибка в выражении: {e}")
+            return
+        if not self.query.get():
+            return
+        snapshots = []
+        for tab_info in self.app.tabs.values():
+            if tab_info.viewer:
+                # Содержимое вкладки просмотра ищется в самом файле
+                snapshots.append((None, tab_info.file, None))
+            elif tab_info.pending:
+                # Вкладка сессии еще не загружена: ее текст пуст, файл читается с диска
+                snapshots.append((None, tab_info.pending["file"], None))
+            else:
+                text_area = tab_info.text
+                snapshots.append((text_area, tab_info.file, text_area.get("1.0", "end-1c")))
+        directory = self.directory.get().strip() or None
+        if directory and not os.path.isdir(directory):
+            self.status_label.config(text="Каталог не найден")
+            return
+        self.listbox.delete(0, tk.END)
+        self.hits = []
+        self.engine = FileSearchEngine(self.app.encoding_detector, pattern, snapshots,
+                                       directory, self.mask.get(),
+                                       literal=not self.regex_var.get())
+        self.engine.start()
+        self._poll()
+
+    def cancel(self):
+        if self.engine:
+            self.engine.cancel()
+
+    def _poll(self):
+        # Забираем пачки результатов, не блокируя главный поток
+        self._poll_id = None
+        engine = self.engine
+        if engine is None:
+            return
+        deadline_batches = 20
+        while deadline_batches:
+            try:
+                batch = engine.results.get_nowait()
+            except Empty:
+                break
+            deadline_batches -= 1
+            lines = []
+            for hit in batch:
+                name = os.path.basename(hit.path) if hit.path else self.app.tab_title(hit.source)
+                lines.append(f"{name}:{hit.line_no}: {hit.line}")
+            self.hits.extend(batch)
+            self.listbox.insert(tk.END, *lines)
+        finished = engine.done and engine.results.empty()
+        status = f"Найдено: {len(self.hits)}, файлов просмотрено: {engine.files_scanned}"
+        if len(self.hits) >= engine.max_results:
+            status += " (достигнут предел результатов)"
+        elif engine.cancelled.is_set():
+            status += " (отменено)"
+        elif not finished:
+            status += "..."
+        self.status_label.config(text=status)
+        if not finished:
+            self._poll_id = self.window.after(50, self._poll)
+
+    def open_selected(self, event=None):
+        selection = self.listbox.curselection()
+        if not selection:
+            return
+        hit = self.hits[selection[0]]
+        self.app.open_location(hit.source, hit.path, hit.line_no, hit.col)
@@ -0,0 +1,250 @@
+import codecs
+import ctypes
+import io
+import os
+import select
+import sys
+import threading
+import tkinter as tk
+from queue import Queue, Full
+
+# Период опроса os.stat, если inotify недоступен (секунды)
+FOLLOW_POLL_INTERVAL = 0.5
+# Даже с inotify файл проверяется не реже этого (сетевые ФС не присылают событий)
+FOLLOW_CHECK_INTERVAL = 2.0
+# Сколько байтов читается за один раз
+FOLLOW_READ_CHUNK = 1024 * 1024
+# Как часто главный поток забирает прочитанный текст (мс)
+FOLLOW_APPLY_INTERVAL = 200
+# Сколько прочитанных порций может ждать главный поток: дальше чтение приостанавливается
+FOLLOW_QUEUE_CHUNKS = 16
+# Сколько строк остается во вкладке; старые строки удаляются с начала
+FOLLOW_MAX_LINES = 200000
+# Удаление идет пачками: буфер может вырасти на столько строк сверх лимита
+FOLLOW_TRIM_SLACK = 10000
+
+# Маска событий inotify для каталога файла: запись, замена и удаление
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO
+               | _IN_CREATE | _IN_DELETE)
+
+
+def _inotify_watch(directory):
+    """Дескриптор inotify, следящий за каталогом, или None (не Linux, нет libc и т. п.)"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    # Следим за каталогом, а не за файлом: так видны и ротация, и новый файл на старом месте
+    if libc.inotify_add_watch(fd, os.fsencode(directory), _WATCH_MASK) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+class FileFollower:
+    def __init__(self, root, text_area, file_path, encoding, offset, on_trim=None,
+                 on_stop=None, max_lines=FOLLOW_MAX_LINES):
+        self.root = root
+        self.text_area = text_area
+        self.file_path = file_path
+        self.encoding = encoding or "utf-8"
+        # Байт файла, до которого текст уже во вкладке
+        self.offset = offset
+        # on_trim(count) - с начала вкладки удалено count строк
+        self.on_trim = on_trim
+        # on_stop() - пользователь нажал "Остановить"
+        self.on_stop = on_stop
+        self.max_lines = max_lines
+        self.queue = Queue(maxsize=FOLLOW_QUEUE_CHUNKS)
+        self._stop = threading.Event()
+        self._after_id = None
+        self._thread = None
+        self._inotify_fd = None
+
+        # Строка состояния слежения внутри вкладки
+        self.status_frame = tk.Frame(text_area.master)
+        self.status_label = tk.Label(self.status_frame, anchor="w")
+        self.status_label.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.auto_scroll = tk.BooleanVar(value=True)
+        tk.Checkbutton(self.status_frame, text="Автопрокрутка",
+                       variable=self.auto_scroll).pack(side=tk.LEFT, padx=2)
+        tk.Button(self.status_frame, text="Остановить", command=self.on_stop or self.stop,
+                  bg="gray", fg="lightgray").pack(side=tk.LEFT, padx=2, pady=2)
+
+    def start(self):
+        """Запуск слежения: текст вкладки только дополняется, правка отключена"""
+        self._inotify_fd = _inotify_watch(os.path.dirname(os.path.abspath(self.file_path)))
+        mode = "inotify" if self._inotify_fd is not None else "опрос"
+        self.status_label.config(text=f"Слежение за файлом ({mode})")
+        self.status_frame.pack(side=tk.BOTTOM, fill=tk.X, before=self.text_area)
+        # Правка на время слежения отключена; история отмены приостанавливается вызывающим
+        self.text_area.config(state="disabled")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._after_id = self.root.after(FOLLOW_APPLY_INTERVAL, self._apply)
+
+    def stop(self):
+        """Остановка слежения; уже прочитанный текст остается во вкладке"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        if self.text_area.winfo_exists():
+            self.text_area.config(state="normal")
+            self.text_area.edit_modified(False)
+            self.status_frame.destroy()
+
+    # Фоновый поток: ожидание изменений и чтение дописанных байтов
+
+    def _run(self):
+        file = None
+        decoder = None
+        try:
+            while not self._stop.is_set():
+                try:
+                    file, decoder = self._check(file, decoder)
+                except OSError as e:
+                    self._put(("status", f"Ошибка чтения: {e}"))
+                if self._stop.is_set():
+                    break
+                self._wait()
+        finally:
+            if file is not None:
+                file.close()
+            if self._inotify_fd is not None:
+                os.close(self._inotify_fd)
+
+    def _wait(self):
+        if self._inotify_fd is None:
+            self._stop.wait(FOLLOW_POLL_INTERVAL)
+            return
+        ready, _, _ = select.select([self._inotify_fd], [], [], FOLLOW_CHECK_INTERVAL)
+        if ready:
+            # Содержимое событий не нужно: любое событие в каталоге - повод проверить файл
+            try:
+                while os.read(self._inotify_fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def _check(self, file, decoder):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            if file is not None:
+                # Файл переименован или удален: дочитываем то, что успели дописать в старый
+                self._read_available(file, decoder)
+                file.close()
+                # Новый файл на этом месте будет прочитан с начала
+                self.offset = 0
+                self._put(("status", "Файл удален или переименован, ожидание нового"))
+            return None, None
+        if file is None:
+            file = open(self.file_path, "rb")
+            decoder = self._new_decoder()
+            if self.offset > stat.st_size:
+                self.offset = 0
+        elif os.fstat(file.fileno()).st_ino != stat.st_ino:
+            # Ротация: на прежнем месте новый файл, он читается с начала
+            self._read_available(file, decoder)
+            file.close()
+            file = open(self.file_path, "rb")
+            decoder = self._new_decoder()
+            self.offset = 0
+            self._put(("status", "Файл заменен (ротация), чтение нового файла"))
+        elif stat.st_size < self.offset:
+            # Усечение: файл начат заново на том же месте
+            decoder.reset()
+            self.offset = 0
+            self._put(("status", "Файл усечен, чтение с начала"))
+        self._read_available(file, decoder)
+        return file, decoder
+
+    def _new_decoder(self):
+        # Переводы строк приводятся к "\n", как при открытии файла;
+        # "\r" в конце порции ждет следующей, чтобы не разорвать "\r\n"
+        return io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(self.encoding)(errors="replace"), translate=True)
+
+    def _read_available(self, file, decoder):
+        file.seek(self.offset)
+        while not self._stop.is_set():
+            data = file.read(FOLLOW_READ_CHUNK)
+            if not data:
+                break
+            self.offset += len(data)
+            text = decoder.decode(data)
+            if text:
+                self._put(("text", text))
+
+    def _put(self, item):
+        # Очередь ограничена: пока главный поток не заберет прочитанное, чтение ждет
+        while not self._stop.is_set():
+            try:
+                self.queue.put(item, timeout=FOLLOW_POLL_INTERVAL)
+                return
+            except Full:
+                pass
+
+    # Главный поток: вставка накопленного текста одной порцией
+
+    def _apply(self):
+        self._after_id = None
+        if not self.text_area.winfo_exists():
+            return
+        chunks = []
+        status = None
+        # Только то, что уже в очереди: поток чтения тем временем добавляет новое
+        for _ in range(self.queue.qsize()):
+            kind, value = self.queue.get_nowait()
+            if kind == "text":
+                chunks.append(value)
+            else:
+                status = value
+        if chunks:
+            text = "".join(chunks)
+            self.text_area.config(state="normal")
+            drop = text.count("\n") - (self.max_lines - 1)
+            if drop > 0:
+                # Во вкладке останутся только последние max_lines строк порции:
+                # прежний текст и начало порции не вставляются вовсе
+                text = text.split("\n", drop)[-1]
+                self._clear()
+            self.text_area.insert("end-1c", text)
+            self._trim()
+            self.text_area.config(state="disabled")
+            if self.auto_scroll.get():
+                self.text_area.see("end-1c")
+        if status:
+            self.status_label.config(text=status)
+        self._after_id = self.root.after(FOLLOW_APPLY_INTERVAL, self._apply)
+
+    def _clear(self):
+        lines = int(self.text_area.index("end-1c").split('.')[0])
+        self.text_area.delete("1.0", "end-1c")
+        if self.on_trim and lines > 1:
+            self.on_trim(lines - 1)
+
+    def _trim(self):
+        # Лимит строк: удаляется сразу пачка, чтобы не сдвигать текст на каждой порции
+        lines = int(self.text_area.index("end-1c").split('.')[0])
+        if lines <= self.max_lines + FOLLOW_TRIM_SLACK:
+            return
+        count = lines - self.max_lines
+        self.text_area.delete("1.0", f"{count + 1}.0")
+        if self.on_trim:
+            self.on_trim(count)
@@ -0,0 +1,446 @@
+import re
+import threading
+from queue import Queue
+
+from perf import recorder
+
+# Состояние лексера в начале строки: None - обычный текст,
+# иначе номер многострочной конструкции, внутри которой строка начинается
+NORMAL = None
+
+# Классы токенов всех грамматик; цвет каждого класса задается темой
+HIGHLIGHT_TAGS = ["keyword", "string", "comment", "number", "constant", "key",
+                  "section", "variable", "timestamp", "error", "warning"]
+
+
+class SyntaxTokenizer:
+    def __init__(self, rules, multiline=()):
+        """rules - список (класс токена, регулярное выражение) в порядке приоритета;
+        multiline - список (открывающий, закрывающий разделитель, класс токена)
+        для конструкций, которые могут продолжаться на следующих строках"""
+        self.rules = list(rules)
+        self.multiline = list(multiline)
+        # Все правила собраны в одно регулярное выражение: строка сканируется один раз
+        parts = ["(?P<m%d>%s)" % (i, re.escape(opening))
+                 for i, (opening, _, _) in enumerate(self.multiline)]
+        parts += ["(?P<t%d>%s)" % (i, regex) for i, (_, regex) in enumerate(self.rules)]
+        self.pattern = re.compile("|".join(parts)) if parts else None
+        self.tags = {"t%d" % i: tag for i, (tag, _) in enumerate(self.rules)}
+        # Открывающие разделители для scan_states (собираются при первом вызове)
+        self._openings = None
+
+    def tokenize_line(self, line, state=NORMAL):
+        """Разбор одной строки: возвращает список (тег, начало, конец) и состояние в конце строки"""
+        spans = []
+        pos = 0
+        if state is not NORMAL:
+            _, closing, tag = self.multiline[state]
+            close = line.find(closing)
+            if close < 0:
+                if line:
+                    spans.append((tag, 0, len(line)))
+                return spans, state
+            pos = close + len(closing)
+            spans.append((tag, 0, pos))
+            state = NORMAL
+        if self.pattern is None:
+            return spans, state
+
+        while True:
+            match = self.pattern.search(line, pos)
+            if match is None:
+                break
+            kind = match.lastgroup
+            start, end = match.span()
+            if end == start:
+                # Правило совпало с пустой строкой - идем дальше, чтобы не зациклиться
+                pos = end + 1
+                if pos > len(line):
+                    break
+                continue
+            if kind[0] == "m":
+                index = int(kind[1:])
+                _, closing, tag = self.multiline[index]
+                close = line.find(closing, end)
+                if close < 0:
+                    spans.append((tag, start, len(line)))
+                    return spans, index
+                spans.append((tag, start, close + len(closing)))
+                pos = close + len(closing)
+                continue
+            spans.append((self.tags[kind], start, end))
+            pos = end
+        return spans, state
+
+    def scan_states(self, lines, state=NORMAL):
+        """Состояния в конце каждой строки, как у tokenize_line, но без токенов
+        (для строк выше экрана, теги которых не нужны).
+
+        Разделители ищутся сразу по всему тексту: строки между ними получают
+        состояние предыдущей и регулярным выражением не сканируются"""
+        if not self.multiline:
+            return [state] * len(lines)
+        if self._openings is None:
+            self._openings = re.compile("|".join(
+                re.escape(opening) for opening, _, _ in self.multiline))
+        text = "\n".join(lines)
+        states = []
+        line_no = 0
+        line_start = 0
+        while line_no < len(lines):
+            # Ближайшая строка, на которой состояние может измениться
+            if state is NORMAL:
+                match = self._openings.search(text, line_start)
+                found = match.start() if match else -1
+            else:
+                found = text.find(self.multiline[state][1], line_start)
+            if found < 0:
+                break
+            target = line_no + text.count("\n", line_start, found)
+            states.extend([state] * (target - line_no))
+            line_start = text.rfind("\n", 0, found) + 1
+            line = lines[target]
+            state = self.tokenize_line(line, state)[1]
+            states.append(state)
+            line_no = target + 1
+            line_start += len(line) + 1
+        states.extend([state] * (len(lines) - line_no))
+        return states
+
+
+class IncrementalHighlighter:
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.reset()
+
+    def reset(self):
+        """Сброс кэша строк (например, после полной замены текста)"""
+        self._text = []
+        self._state_in = []
+        self._state_out = []
+        self._spans = []
+        self._total_lines = 0
+        # Индекс первой строки, измененной apply_edit и еще не разобранной (или None):
+        # состояния строк ниже нее не проверены
+        self._stale = None
+
+    def scan_start(self, top_line):
+        """Номер строки, с которой нужно передать текст, чтобы было известно состояние для top_line"""
+        if not self.tokenizer.multiline:
+            # Без многострочных конструкций строки не зависят друг от друга
+            return top_line
+        if self._stale is not None:
+            return min(top_line, self._stale + 1)
+        return min(top_line, len(self._text) + 1)
+
+    def spans_for(self, line_no):
+        """Закэшированные токены строки (нумерация с 1) или None"""
+        idx = line_no - 1
+        if 0 <= idx < len(self._spans):
+            return self._spans[idx]
+        return None
+
+    def invalidate_from(self, line_no):
+        """Забыть строки начиная с line_no (правка в известном месте, например вставка)"""
+        self._truncate(max(line_no - 1, 0))
+
+    def drop_head(self, count):
+        """Из начала текста удалено count строк: кэш сдвигается вместе с текстом"""
+        del self._text[:count]
+        del self._state_in[:count]
+        del self._state_out[:count]
+        del self._spans[:count]
+        self._total_lines = max(self._total_lines - count, 0)
+        if self._stale is not None:
+            self._stale = self._find_stale(0)
+
+    def apply_edit(self, first_line, removed, added):
+        """Известная правка: строки first_line..first_line+removed-1 заменены added строками.
+
+        Кэш сдвигается точно, измененные строки будут разобраны заново"""
+        idx = first_line - 1
+        if idx < len(self._text):
+            end = min(idx + removed, len(self._text))
+            self._replace(idx, end, added)
+        if self._total_lines:
+            self._total_lines += added - removed
+
+    def update(self, first_line, lines, total_lines, top_line=None):
+        """Обновление кэша для строк, начиная с first_line.
+
+        Строки выше top_line (по умолчанию - first_line) нужны только для состояния:
+        они не токенизируются и не возвращаются. Возвращает список
+        (номер строки, токены, прежние токены) только для строк от top_line,
+        которые пришлось разобрать заново. Прежние токены равны None,
+        если текст строки изменился и уже наложенные теги неизвестны."""
+        if first_line > len(self._text) + 1:
+            if self.tokenizer.multiline:
+                raise ValueError("first_line должна быть не дальше scan_start()")
+            # Строки выше экрана не разбирались: на их месте заглушки
+            missing = first_line - 1 - len(self._text)
+            for store in (self._text, self._state_in, self._state_out, self._spans):
+                store.extend([None] * missing)
+        if top_line is None:
+            top_line = first_line
+
+        delta = total_lines - self._total_lines
+        if self._total_lines and delta:
+            self._realign(first_line, lines, delta)
+        self._total_lines = total_lines
+
+        state = self._state_out[first_line - 2] if first_line > 1 else NORMAL
+        # Строки выше экрана: только текст и состояние, токены None - теги на них не наложены
+        prefix = min(max(top_line - first_line, 0), len(lines))
+        state_changed = False
+        if prefix:
+            state, state_changed = self._store_states(first_line - 1, lines[:prefix], state)
+        changed = []
+        for offset in range(prefix, len(lines)):
+            text = lines[offset]
+            idx = first_line - 1 + offset
+            if (idx < len(self._text) and self._text[idx] == text
+                    and self._state_in[idx] == state and self._spans[idx] is not None):
+                state = self._state_out[idx]
+                state_changed = False
+                continue
+            spans, out = self.tokenizer.tokenize_line(text, state)
+            previous = None
+            if idx < len(self._text):
+                if self._text[idx] == text:
+                    previous = self._spans[idx]
+                state_changed = self._text[idx] is not None and self._state_out[idx] != out
+                self._text[idx] = text
+                self._state_in[idx] = state
+                self._state_out[idx] = out
+                self._spans[idx] = spans
+            else:
+                state_changed = False
+                self._text.append(text)
+                self._state_in.append(state)
+                self._state_out.append(out)
+                self._spans.append(spans)
+            changed.append((idx + 1, spans, previous))
+            state = out
+
+        # Строки ниже окна сверяются заново, когда станут видимыми,
+        # но как источник состояния для следующих строк они больше не годятся
+        end = first_line - 1 + len(lines)
+        if (state_changed or end >= total_lines
+                or end < len(self._text) and self._text[end] is not None
+                and self._state_in[end] != state):
+            self._truncate(end)
+        if self._stale is not None and self._stale < end:
+            # Измененные строки окна разобраны: следующая непроверенная - ниже окна
+            self._stale = self._find_stale(end)
+        return changed
+
+    def _store_states(self, idx, lines, state):
+        # Строки целиком заменяются в кэше срезами; возвращает состояние после них
+        # и признак того, что состояние последней строки изменилось
+        states = self.tokenizer.scan_states(lines, state)
+        end = idx + len(lines)
+        if end > len(self._text):
+            for store in (self._text, self._state_in, self._state_out, self._spans):
+                store.extend([None] * (end - len(store)))
+        out = self._state_out[end - 1]
+        known = self._text[end - 1] is not None
+        self._text[idx:end] = lines
+        self._state_in[idx:end] = [state] + states[:-1]
+        self._state_out[idx:end] = states
+        self._spans[idx:end] = [None] * len(lines)
+        return states[-1], known and out != states[-1]
+
+    def _realign(self, first_line, lines, delta):
+        # Сдвиг кэша после вставки/удаления строк: правка считается
+        # произошедшей на первой несовпавшей строке окна
+        for offset, text in enumerate(lines):
+            idx = first_line - 1 + offset
+            if idx >= len(self._text):
+                return
+            if self._text[idx] != text:
+                break
+        else:
+            # Правка вне окна: положение неизвестно, кэш ниже окна ненадежен
+            self._truncate(first_line - 1 + len(lines))
+            return
+        cut = idx + 1
+        if cut >= first_line - 1 + len(lines):
+            self._truncate(cut)
+            return
+        if delta > 0:
+            self._replace(cut, cut, delta)
+        else:
+            self._replace(cut, cut - delta, 0)
+
+    def _replace(self, idx, end, added):
+        # Строки кэша idx..end-1 заменяются added заглушками, которые будут разобраны заново
+        for store in (self._text, self._state_in, self._state_out, self._spans):
+            store[idx:end] = [None] * added
+        if self._stale is not None and self._stale >= end:
+            self._stale += added - (end - idx)
+        elif self._stale is not None and self._stale >= idx and not added:
+            self._stale = self._find_stale(idx)
+        if added and (self._stale is None or idx < self._stale):
+            self._stale = idx
+
+    def _truncate(self, length):
+        del self._text[length:]
+        del self._state_in[length:]
+        del self._state_out[length:]
+        del self._spans[length:]
+        if self._stale is not None and self._stale >= length:
+            self._stale = None
+
+    def _find_stale(self, start):
+        for idx in range(start, len(self._text)):
+            if self._text[idx] is None:
+                return idx
+        return None
+
+
+class TagBatch:
+    def __init__(self, tags):
+        # Для каждого тега копим все диапазоны, чтобы передать их в Tk одним вызовом
+        self.tags = list(tags)
+        self.to_remove = {tag: [] for tag in self.tags}
+        self.to_add = {tag: [] for tag in self.tags}
+
+    def line_changed(self, line_no, spans, previous=None):
+        """Учет разницы между наложенными и нужными токенами строки"""
+        if previous is None:
+            # Текст строки изменился: снимаем все теги строки целиком
+            for tag in self.tags:
+                self.to_remove[tag] += (f"{line_no}.0", f"{line_no}.end")
+            old = set()
+        else:
+            old = set(previous)
+        new = set(spans)
+        if previous is not None:
+            for tag, start, end in old - new:
+                self.to_remove[tag] += (f"{line_no}.{start}", f"{line_no}.{end}")
+        for tag, start, end in new - old:
+            self.to_add[tag] += (f"{line_no}.{start}", f"{line_no}.{end}")
+
+    def apply(self, text_area):
+        """Один вызов tag remove и один tag add на тег с абсолютными индексами"""
+        for tag, indices in self.to_remove.items():
+            if indices:
+                text_area.tk.call(text_area._w, "tag", "remove", tag, *indices)
+        for tag, indices in self.to_add.items():
+            if indices:
+                text_area.tk.call(text_area._w, "tag", "add", tag, *indices)
+
+
+def highlight_range(text_area, highlighter, top_line, bottom_line):
+    """Подсветка строк top_line..bottom_line: разбор изменившихся строк и пакетное наложение тегов"""
+    total_lines = int(text_area.index("end-1c").split('.')[0])
+    first_line = highlighter.scan_start(top_line)
+    lines = text_area.get(
+        f"{first_line}.0", f"{bottom_line}.end").split("\n")
+    batch = TagBatch(HIGHLIGHT_TAGS)
+    for line_no, spans, previous in highlighter.update(first_line, lines, total_lines,
+                                                       top_line):
+        batch.line_changed(line_no, spans, previous)
+    batch.apply(text_area)
+
+
+class HighlightWorker:
+    def __init__(self):
+        # Единственный долгоживущий поток разбора; с Tk он не работает,
+        # получает снимки текста и возвращает списки токенов
+        self.jobs = Queue()
+        self.results = Queue()
+        self.generation = 0
+        # Последнее поколение запроса для каждого текстового поля (пишет главный поток)
+        self.latest = {}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, target, highlighter, first_line, lines, total_lines, top_line=None):
+        """Постановка снимка текста в очередь; возвращает номер поколения.
+
+        Строки выше top_line нужны только для состояния и не подсвечиваются"""
+        self.generation += 1
+        self.latest[target] = self.generation
+        self.jobs.put(("update", target, highlighter, self.generation,
+                       first_line, lines, total_lines, top_line))
+        return self.generation
+
+    def is_current(self, target, generation):
+        return self.latest.get(target) == generation
+
+    def invalidate(self, highlighter, line_no):
+        """Забыть кэш начиная со строки (выполняется в потоке разбора)"""
+        self.jobs.put(("invalidate", highlighter, line_no))
+
+    def reset(self, highlighter):
+        self.jobs.put(("reset", highlighter))
+
+    def edit(self, highlighter, first_line, removed, added):
+        """Сдвиг кэша по известной правке (в потоке разбора, до следующего снимка)"""
+        self.jobs.put(("edit", highlighter, first_line, removed, added))
+
+    def drop_head(self, highlighter, count):
+        """Сдвиг кэша после удаления строк из начала текста (в потоке разбора)"""
+        self.jobs.put(("drop_head", highlighter, count))
+
+    def discard(self, target):
+        # Вкладка закрыта: все ее результаты становятся устаревшими
+        self.latest.pop(target, None)
+
+    def focus(self, target):
+        """Отбросить запросы всех полей, кроме target: видимая вкладка разбирается первой"""
+        for other in list(self.latest):
+            if other is not target:
+                self.latest.pop(other, None)
+
+    def pending(self):
+        """Есть задания в работе или неразобранные результаты"""
+        return self.jobs.unfinished_tasks > 0 or not self.results.empty()
+
+    def wait(self):
+        """Дождаться разбора всех поставленных заданий: после этого кэши вкладок
+        можно читать и менять из главного потока"""
+        self.jobs.join()
+
+    def stop(self):
+        """Завершение потока после уже поставленных заданий"""
+        self.jobs.put(None)
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                # Иначе wait() после stop() не вернулся бы
+                self.jobs.task_done()
+                return
+            try:
+                self._handle(job)
+            finally:
+                # Результат уже в очереди, поэтому pending() не пропустит его
+                self.jobs.task_done()
+
+    def _handle(self, job):
+        if job[0] == "invalidate":
+            job[1].invalidate_from(job[2])
+            return
+        if job[0] == "reset":
+            job[1].reset()
+            return
+        if job[0] == "drop_head":
+            job[1].drop_head(job[2])
+            return
+        if job[0] == "edit":
+            job[1].apply_edit(*job[2:])
+            return
+        _, target, highlighter, generation, first_line, lines, total_lines, top_line = job
+        if not self.is_current(target, generation):
+            # Снимок уже заменен более свежим - не тратим на него время
+            return
+        if first_line > highlighter.scan_start(first_line):
+            # Кэш укоротился после снятия снимка: главный поток повторит запрос
+            self.results.put((target, highlighter, generation, None))
+            return
+        with recorder.span("highlight.tokenize"):
+            changed = highlighter.update(first_line, lines, total_lines, top_line)
+        self.results.put((target, highlighter, generation, changed))
@@ -0,0 +1,343 @@
+import time
+from collections import deque
+
+from tkinter import TclError
+
+# Бюджет памяти истории правок одной вкладки: символы сохраненного текста
+# плюс условная стоимость каждой операции (настройка undo_memory_mb)
+HISTORY_MEMORY_BUDGET = 64 * 1024 * 1024
+# Условная стоимость одной операции: кортеж, позиции, место в списке
+OP_OVERHEAD = 100
+# Символы, набранные подряд с паузами меньше этой (секунды), отменяются одним шагом
+COALESCE_INTERVAL = 1.0
+
+
+def _index(position):
+    return "%d.%d" % position
+
+
+def _parse(index):
+    line, col = str(index).split(".")
+    return int(line), int(col)
+
+
+def _end_of(start, text):
+    # Позиция конца текста text, вставленного в позицию start
+    newlines = text.count("\n")
+    if not newlines:
+        return start[0], start[1] + len(text)
+    return start[0] + newlines, len(text) - text.rfind("\n") - 1
+
+
+def _cost(op):
+    return OP_OVERHEAD + len(op[3] or "")
+
+
+class ChangeTracker:
+    """Измененные строки с последнего take(), объединенные в один диапазон.
+
+    Диапазон (first, removed, added): строки first..first+removed-1 прежнего текста
+    заменены added строками текущего. full - изменения неизвестны (загрузка файла,
+    слежение), потребителю нужен весь текст"""
+    def __init__(self):
+        self.change = None
+        self.full = True
+
+    def add(self, first, removed, added):
+        if self.full:
+            return
+        if self.change is None:
+            self.change = (first, removed, added)
+            return
+        # Объединение двух последовательных правок в координатах промежуточного текста
+        first_old, removed_old, added_old = self.change
+        low = min(first_old, first)
+        high = max(first_old + added_old, first + removed)
+        self.change = (low, high - low - (added_old - removed_old),
+                       high - low + (added - removed))
+
+    def invalidate(self):
+        self.full = True
+        self.change = None
+
+    def take(self):
+        """(full, change) с прошлого обращения; после вызова изменений нет"""
+        result = (self.full, self.change)
+        self.full = False
+        self.change = None
+        return result
+
+
+class EditHistory:
+    """История правок текстового поля вкладки.
+
+    Вставки и удаления перехватываются в Tcl до выполнения - набор с клавиатуры,
+    вставка из буфера и программные правки проходят одним путем. Операции хранятся
+    компактно: для отмены вставки нужен только диапазон, текст хранят лишь удаления
+    и отмененные вставки (для повтора). Собственная история Tk должна быть выключена"""
+    def __init__(self, text_area, budget=HISTORY_MEMORY_BUDGET):
+        self.text_area = text_area
+        self.budget = budget
+        # Группы операций (одна группа - одна отмена), старые слева
+        self.undo_stack = deque()
+        self.redo_stack = deque()
+        # Память обоих стеков в единицах бюджета
+        self.size = 0
+        self.trackers = []
+        self.paused = False
+        self._replaying = False
+        self._group_open = False
+        # Последняя набранная операция (время, вид, начало, конец) для объединения набора
+        self._typed = None
+
+        # Команда виджета переименовывается, на ее место ставится процедура,
+        # которая сообщает о правках и передает вызов дальше (ошибки Tk не меняются)
+        self._orig = text_area._w + "_orig"
+        callback = text_area._register(self._on_edit)
+        text_area.tk.call("rename", text_area._w, self._orig)
+        text_area.tk.eval(
+            "proc %s {op args} {\n"
+            "    if {$op in {insert delete replace}} {%s $op {*}$args}\n"
+            "    %s $op {*}$args\n"
+            "}" % (text_area._w, callback, self._orig))
+        text_area.tk.call("bind", text_area._w, "<Destroy>",
+                          "+catch {rename %s {}}" % text_area._w)
+
+    def track(self):
+        """Новый счетчик измененных строк (для подсветки, поиска и т. п.)"""
+        tracker = ChangeTracker()
+        self.trackers.append(tracker)
+        return tracker
+
+    def untrack(self, tracker):
+        if tracker in self.trackers:
+            self.trackers.remove(tracker)
+
+    def checkpoint(self):
+        """Следующая правка начнет новую группу и не сольется с набором"""
+        self._group_open = False
+        self._typed = None
+
+    def reset(self):
+        """Забыть историю: текст заменен целиком (открытие файла, восстановление)"""
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.size = 0
+        self._typed = None
+        for tracker in self.trackers:
+            tracker.invalidate()
+
+    def pause(self):
+        """Правки не записываются (порционная загрузка, слежение за файлом)"""
+        self.paused = True
+        self.reset()
+
+    def resume(self):
+        self.paused = False
+        self.reset()
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def undo(self):
+        """Отмена последней группы правок; False, если отменять нечего"""
+        self._close_group()
+        if not self.undo_stack:
+            return False
+        group = self.undo_stack.pop()
+        redo = []
+        cursor = None
+        self._replaying = True
+        try:
+            for kind, start, end, text in reversed(group):
+                if kind == "insert":
+                    text = self.text_area.get(_index(start), _index(end))
+                    self.text_area.delete(_index(start), _index(end))
+                    redo.append(("insert", start, end, text))
+                    cursor = start
+                else:
+                    self.text_area.insert(_index(start), text)
+                    redo.append(("delete", start, end, None))
+                    cursor = end
+        finally:
+            self._replaying = False
+        self._move(group, redo, self.redo_stack)
+        self._show(cursor)
+        return True
+
+    def redo(self):
+        """Повтор последней отмененной группы; False, если повторять нечего"""
+        self._close_group()
+        if not self.redo_stack:
+            return False
+        group = self.redo_stack.pop()
+        undo = []
+        cursor = None
+        self._replaying = True
+        try:
+            for kind, start, end, text in reversed(group):
+                if kind == "insert":
+                    self.text_area.insert(_index(start), text)
+                    undo.append(("insert", start, end, None))
+                    cursor = end
+                else:
+                    text = self.text_area.get(_index(start), _index(end))
+                    self.text_area.delete(_index(start), _index(end))
+                    undo.append(("delete", start, end, text))
+                    cursor = start
+        finally:
+            self._replaying = False
+        self._move(group, undo, self.undo_stack)
+        self._show(cursor)
+        return True
+
+    # Перехват правок (вызывается из Tcl до того, как Tk изменит текст)
+
+    def _on_edit(self, operation, *args):
+        if self.paused:
+            # Правка не записывается, но и строки ее не известны:
+            # потребители перечитывают весь текст
+            for tracker in self.trackers:
+                tracker.invalidate()
+            return
+        call = self.text_area.tk.call
+        try:
+            if call(self._orig, "cget", "-state") == "disabled":
+                # Tk молча пропускает правки выключенного поля
+                return
+            if operation == "insert":
+                self._record_insert(args[0], "".join(args[1::2]))
+            elif operation == "delete":
+                self._record_delete(args)
+            else:
+                start = self._record_delete(args[:2])
+                self._record_insert(_index(start) if start else args[0], "".join(args[2::2]))
+        except TclError:
+            # Неверный индекс: Tk сам сообщит об ошибке, а текст не изменится
+            pass
+
+    def _record_insert(self, index, text):
+        if not text:
+            return
+        call = self.text_area.tk.call
+        start = _parse(call(self._orig, "index", index))
+        last = _parse(call(self._orig, "index", "end-1c"))
+        # Вставка в "end" попадает перед последним переводом строки
+        start = min(start, last)
+        end = _end_of(start, text)
+        self._changed(start[0], 1, text.count("\n") + 1)
+        if self._replaying:
+            return
+        now = time.monotonic()
+        typed = self._typed
+        if (len(text) == 1 and text != "\n" and typed and typed[1] == "insert"
+                and typed[3] == start and now - typed[0] < COALESCE_INTERVAL):
+            # Продолжение набора: конец последней вставки сдвигается
+            group = self.undo_stack[-1]
+            group[-1] = ("insert", typed[2], end, None)
+            self._typed = (now, "insert", typed[2], end)
+            return
+        self._push(("insert", start, end, None))
+        # При нулевом бюджете группа сразу вытесняется - продолжать набор не во что
+        if len(text) == 1 and text != "\n" and self.undo_stack:
+            self._typed = (now, "insert", start, end)
+
+    def _record_delete(self, args):
+        if len(args) > 2:
+            # Несколько диапазонов за вызов: Tk объединяет их по своим правилам, не воспроизводим
+            self.reset()
+            return None
+        call = self.text_area.tk.call
+        start = _parse(call(self._orig, "index", args[0]))
+        if len(args) == 2:
+            end = _parse(call(self._orig, "index", args[1]))
+        else:
+            end = _parse(call(self._orig, "index", _index(start) + "+1c"))
+        if end <= start:
+            return None
+        last = _parse(call(self._orig, "index", "end-1c"))
+        if end > last:
+            # Как в Tk: последний перевод строки не удаляется, а удаление целых строк
+            # до конца текста забирает перевод строки перед ними
+            end = last
+            if start[1] == 0 and start[0] > 1:
+                start = _parse(call(self._orig, "index", _index(start) + "-1c"))
+            if end <= start:
+                return None
+        text = str(call(self._orig, "get", _index(start), _index(end)))
+        self._changed(start[0], end[0] - start[0] + 1, 1)
+        if self._replaying:
+            return start
+        now = time.monotonic()
+        typed = self._typed
+        if (len(text) == 1 and text != "\n" and typed and typed[1] == "delete"
+                and now - typed[0] < COALESCE_INTERVAL and end == typed[2]):
+            # BackSpace подряд: удаленный символ добавляется в начало
+            group = self.undo_stack[-1]
+            merged = text + group[-1][3]
+            group[-1] = ("delete", start, typed[3], merged)
+            self.size += len(text)
+            self._typed = (now, "delete", start, typed[3])
+            self._trim()
+            return start
+        if (len(text) == 1 and text != "\n" and typed and typed[1] == "delete"
+                and now - typed[0] < COALESCE_INTERVAL and start == typed[2]):
+            # Delete подряд: удаленный символ добавляется в конец
+            group = self.undo_stack[-1]
+            merged = group[-1][3] + text
+            end = _end_of(start, merged)
+            group[-1] = ("delete", start, end, merged)
+            self.size += len(text)
+            self._typed = (now, "delete", start, end)
+            self._trim()
+            return start
+        self._push(("delete", start, end, text))
+        if len(text) == 1 and text != "\n" and self.undo_stack:
+            self._typed = (now, "delete", start, end)
+        return start
+
+    def _changed(self, first, removed, added):
+        for tracker in self.trackers:
+            tracker.add(first, removed, added)
+
+    def _push(self, op):
+        # Все правки одного события (например, замена выделения при вставке) - одна группа
+        if not self._group_open or not self.undo_stack:
+            self.undo_stack.append([])
+            self._group_open = True
+            self.text_area.after_idle(self._close_group)
+        self.undo_stack[-1].append(op)
+        self.size += _cost(op)
+        self._typed = None
+        if self.redo_stack:
+            self.size -= sum(_cost(op) for group in self.redo_stack for op in group)
+            self.redo_stack.clear()
+        self._trim()
+
+    def _close_group(self):
+        self._group_open = False
+
+    def _move(self, group, replacement, stack):
+        # Группа переходит в другой стек: у вставок и удалений меняется хранимый текст
+        self.size += sum(map(_cost, replacement)) - sum(map(_cost, group))
+        stack.append(replacement)
+        self._typed = None
+        self._trim()
+
+    def _trim(self):
+        # Сверх бюджета вытесняются самые старые отмены, затем самые дальние повторы
+        while self.size > self.budget and self.undo_stack:
+            self.size -= sum(map(_cost, self.undo_stack.popleft()))
+            if not self.undo_stack:
+                self._group_open = False
+                self._typed = None
+        while self.size > self.budget and self.redo_stack:
+            self.size -= sum(map(_cost, self.redo_stack.popleft()))
+
+    def _show(self, position):
+        if position is not None:
+            self.text_area.mark_set("insert", _index(position))
+            self.text_area.see("insert")
@@ -0,0 +1,201 @@
+import keyword
+import os
+import re
+import threading
+
+from highlighter import SyntaxTokenizer
+
+# Язык новых безымянных вкладок
+DEFAULT_LANGUAGE = "python"
+# Язык файлов, для которых грамматика не найдена
+PLAIN_TEXT = "text"
+# Сколько байтов читается для проверки строки #!
+SHEBANG_SAMPLE_SIZE = 256
+
+
+def _words(words):
+    # Слова целиком, длинные раньше коротких
+    return r"\b(?:" + "|".join(map(re.escape, sorted(words, key=len, reverse=True))) + r")\b"
+
+
+_DOUBLE_QUOTED = r'"(?:[^"\\\n]|\\.)*"'
+_SINGLE_QUOTED = r"'(?:[^'\\\n]|\\.)*'"
+_NUMBER = r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b"
+# Комментарий с начала строки или после пробела (в середине слова # не комментарий)
+_HASH_COMMENT = r"(?:^|(?<=\s))#[^\n]*"
+
+PYTHON_KEYWORDS = [word for word in keyword.kwlist if word not in ("True", "False", "None")]
+
+# Описания грамматик: правила (класс токена, выражение) в порядке приоритета.
+# Выражения компилируются только при первом открытии файла на этом языке
+GRAMMARS = {
+    "python": {
+        "name": "Python",
+        "extensions": [".py", ".pyw", ".pyi"],
+        "shebangs": ["python"],
+        "multiline": [('"""', '"""', "string"), ("'''", "'''", "string")],
+        "rules": [
+            ("comment", r"#[^\n]*"),
+            ("string", _DOUBLE_QUOTED + "|" + _SINGLE_QUOTED),
+            ("keyword", _words(PYTHON_KEYWORDS)),
+            ("constant", _words(["True", "False", "None"])),
+            ("number", _NUMBER),
+        ],
+    },
+    "json": {
+        "name": "JSON",
+        "extensions": [".json", ".jsonl", ".geojson", ".ipynb"],
+        "rules": [
+            ("key", _DOUBLE_QUOTED + r"(?=\s*:)"),
+            ("string", _DOUBLE_QUOTED),
+            ("constant", _words(["true", "false", "null"])),
+            ("number", _NUMBER),
+        ],
+    },
+    "yaml": {
+        "name": "YAML",
+        "extensions": [".yaml", ".yml"],
+        "rules": [
+            ("comment", _HASH_COMMENT),
+            ("section", r"^(?:---|\.\.\.)(?=\s|$)"),
+            ("key", r"^\s*(?:-\s+)?[^\s:#'\"\[{][^:#\n]*?(?=:(?:\s|$))"),
+            ("string", _DOUBLE_QUOTED + "|" + r"'(?:[^'\n]|'')*'"),
+            ("variable", r"[&*][\w.-]+|![\w!/.-]*"),
+            ("constant", _words(["true", "false", "yes", "no", "on", "off", "null"]) + "|~"),
+            ("number", _NUMBER),
+        ],
+    },
+    "ini": {
+        "name": "INI",
+        "extensions": [".ini", ".cfg", ".conf", ".toml", ".properties", ".desktop"],
+        "rules": [
+            ("comment", r"^\s*[;#][^\n]*"),
+            ("section", r"^\s*\[[^\]\n]*\]"),
+            ("key", r"^\s*[^\s=:;#\[][^=:\n]*?(?=\s*[=:])"),
+            ("string", _DOUBLE_QUOTED + "|" + _SINGLE_QUOTED),
+            ("constant", _words(["true", "false", "yes", "no", "on", "off"])),
+            ("number", _NUMBER),
+        ],
+    },
+    "shell": {
+        "name": "Shell",
+        "extensions": [".sh", ".bash", ".zsh", ".ksh"],
+        "filenames": [".bashrc", ".bash_profile", ".profile", ".zshrc", "PKGBUILD"],
+        "shebangs": ["sh", "bash", "zsh", "ksh", "dash"],
+        "rules": [
+            ("comment", _HASH_COMMENT),
+            ("string", _DOUBLE_QUOTED + "|" + r"'[^'\n]*'"),
+            ("variable", r"\$(?:\{[^}\n]*\}|\w+|[@*#?$!0-9-])"),
+            ("keyword", _words(["if", "then", "else", "elif", "fi", "for", "while", "until",
+                                "do", "done", "case", "esac", "function", "in", "return",
+                                "local", "export", "select", "break", "continue", "readonly",
+                                "declare", "source", "exit"])),
+            ("number", _NUMBER),
+        ],
+    },
+    "log": {
+        "name": "Журнал",
+        "extensions": [".log", ".out"],
+        "rules": [
+            ("timestamp", r"^\[?\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?"
+                          r"(?:Z|[+-]\d{2}:?\d{2})?\]?"
+                          r"|^[A-Z][a-z]{2} [ \d]\d \d{2}:\d{2}:\d{2}"),
+            ("error", _words(["ERROR", "FATAL", "CRITICAL", "SEVERE", "EMERG", "ALERT",
+                              "Traceback", "Exception"])),
+            ("warning", _words(["WARN", "WARNING"])),
+            ("keyword", _words(["INFO", "NOTICE"])),
+            ("comment", _words(["DEBUG", "TRACE"])),
+            ("string", _DOUBLE_QUOTED + "|" + _SINGLE_QUOTED),
+            ("number", _NUMBER),
+        ],
+    },
+    PLAIN_TEXT: {
+        "name": "Текст",
+        "extensions": [".txt"],
+        "rules": [],
+    },
+}
+
+# Ротация журналов: app.log.1, app.log.2 и т. п.
+_ROTATED_LOG = re.compile(r"\.log(?:\.\d+)+$")
+_SHEBANG = re.compile(r"^#!\s*(?:\S*/)?([\w.-]+)(?:\s+(?:-\S+\s+)*([\w.-]+))?")
+
+# Скомпилированные токенизаторы по имени языка
+_tokenizers = {}
+_lock = threading.Lock()
+# Индексы по расширению, имени файла и интерпретатору (строятся при первом обращении)
+_by_extension = None
+_by_filename = None
+_by_shebang = None
+
+
+def _build_indexes():
+    global _by_extension, _by_filename, _by_shebang
+    if _by_extension is not None:
+        return
+    by_extension, by_filename, by_shebang = {}, {}, {}
+    for name, grammar in GRAMMARS.items():
+        for extension in grammar.get("extensions", ()):
+            by_extension[extension] = name
+        for filename in grammar.get("filenames", ()):
+            by_filename[filename] = name
+        for interpreter in grammar.get("shebangs", ()):
+            by_shebang[interpreter] = name
+    _by_filename, _by_shebang = by_filename, by_shebang
+    # Последним: по нему другие потоки судят, что индексы готовы
+    _by_extension = by_extension
+
+
+def get_tokenizer(name):
+    """Токенизатор языка; грамматика компилируется при первом обращении и кэшируется"""
+    tokenizer = _tokenizers.get(name)
+    if tokenizer is None:
+        with _lock:
+            tokenizer = _tokenizers.get(name)
+            if tokenizer is None:
+                grammar = GRAMMARS.get(name) or GRAMMARS[PLAIN_TEXT]
+                tokenizer = SyntaxTokenizer(grammar["rules"], grammar.get("multiline", ()))
+                _tokenizers[name] = tokenizer
+    return tokenizer
+
+
+def language_from_shebang(first_line):
+    """Язык по строке #! (например, #!/usr/bin/env python3) или None"""
+    _build_indexes()
+    match = _SHEBANG.match(first_line or "")
+    if not match:
+        return None
+    interpreter = match.group(1)
+    if interpreter == "env" and match.group(2):
+        interpreter = match.group(2)
+    # python3.11 -> python, bash5 -> bash
+    return _by_shebang.get(re.sub(r"[\d.]+$", "", interpreter))
+
+
+def detect_language(file_path, first_line=None):
+    """Язык файла: по расширению или имени, затем по строке #!.
+
+    Если first_line не передана, а по имени язык не определен, читается начало файла."""
+    _build_indexes()
+    if not file_path:
+        return language_from_shebang(first_line) or DEFAULT_LANGUAGE
+    base_name = os.path.basename(file_path)
+    if base_name in _by_filename:
+        return _by_filename[base_name]
+    extension = os.path.splitext(base_name)[1].lower()
+    if extension in _by_extension and extension != ".txt":
+        return _by_extension[extension]
+    if _ROTATED_LOG.search(base_name.lower()):
+        return "log"
+    if first_line is None:
+        first_line = _read_first_line(file_path)
+    return language_from_shebang(first_line) or _by_extension.get(extension, PLAIN_TEXT)
+
+
+def _read_first_line(file_path):
+    try:
+        with open(file_path, "rb") as f:
+            sample = f.read(SHEBANG_SAMPLE_SIZE)
+    except OSError:
+        return ""
+    return sample.split(b"\n", 1)[0].decode("latin-1")
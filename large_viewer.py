@@ -0,0 +1,327 @@
+import codecs
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import tkinter as tk
+import tkinter.font as tkfont
+from array import array
+from bisect import bisect_right
+from tkinter import ttk
+
+from highlighter import TagBatch, HIGHLIGHT_TAGS
+
+# Файлы больше этого размера открываются в виртуальном просмотрщике (только чтение)
+VIEWER_THRESHOLD = 256 * 1024 * 1024
+# Индекс хранит смещение каждой N-й строки: память в N раз меньше полного индекса
+INDEX_STRIDE = 64
+# Как часто публикуется прогресс построения индекса (в строках)
+INDEX_PUBLISH_LINES = 65536
+
+_CACHE_HEADER = struct.Struct("<8sQqIQ")
+_CACHE_MAGIC = b"NOTEIDX1"
+
+# Кодировки с маркером порядка байтов: строки декодируются кодеком без BOM,
+# выбранным по маркеру в начале файла
+_BOM_CODECS = {
+    "utf-8-sig": [(codecs.BOM_UTF8, "utf-8")],
+    "utf-16": [(codecs.BOM_UTF16_LE, "utf-16-le"), (codecs.BOM_UTF16_BE, "utf-16-be")],
+    "utf-32": [(codecs.BOM_UTF32_LE, "utf-32-le"), (codecs.BOM_UTF32_BE, "utf-32-be")],
+}
+
+
+class LineIndex:
+    def __init__(self, file_path, encoding="utf-8", cache_dir=None, stride=INDEX_STRIDE):
+        self.file_path = file_path
+        self.stride = stride
+        self._file = open(file_path, "rb")
+        stat = os.fstat(self._file.fileno())
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        # Кодек строк (без BOM) и смещение начала текста после BOM
+        self.codec, self.origin = self._resolve_codec(encoding)
+        # Перевод строки в байтах кодировки; в UTF-16/32 он не один байт,
+        # и совпадение засчитывается только с начала символа
+        self.newline = "\n".encode(self.codec)
+        self.carriage_return = "\r".encode(self.codec)
+        self.unit = len(self.newline)
+        # Смещения начала строк 0, N, 2N, ...
+        self.checkpoints = array("Q", [self.origin])
+        self.line_count = 0
+        self.complete = self.size == 0
+        self._stop = False
+        self._thread = None
+        self.cache_file = None
+        if cache_dir:
+            key = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+            self.cache_file = os.path.join(cache_dir, key + ".idx")
+
+    def _resolve_codec(self, encoding):
+        name = codecs.lookup(encoding).name
+        if name not in _BOM_CODECS:
+            return encoding, 0
+        for bom, codec in _BOM_CODECS[name]:
+            if self._map is not None and self._map[:len(bom)] == bom:
+                return codec, len(bom)
+        # Маркера нет (файл заменен после определения кодировки): порядок байтов по умолчанию
+        return _BOM_CODECS[name][0][1], 0
+
+    def build(self):
+        """Построение индекса в фоновом потоке"""
+        if self.complete or self._thread:
+            return
+        self._thread = threading.Thread(target=self._build, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop = True
+        if self._thread:
+            self._thread.join(timeout=1)
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def _build(self):
+        if self._load_cache():
+            return
+        find = self._map.find
+        stride = self.stride
+        newline_bytes, unit, origin = self.newline, self.unit, self.origin
+        pos = origin
+        lines = 0
+        try:
+            while not self._stop:
+                newline = find(newline_bytes, pos)
+                if newline < 0:
+                    break
+                if (newline - origin) % unit:
+                    # Байты перевода строки на стыке двух символов UTF-16/32
+                    pos = newline + 1
+                    continue
+                pos = newline + unit
+                lines += 1
+                if lines % stride == 0:
+                    self.checkpoints.append(pos)
+                if lines % INDEX_PUBLISH_LINES == 0:
+                    self.line_count = lines
+        except ValueError:
+            # mmap закрыт вместе с вкладкой
+            return
+        if self._stop:
+            return
+        if pos < self.size:
+            # Последняя строка без перевода строки
+            lines += 1
+        self.line_count = lines
+        self.complete = True
+        self._save_cache()
+
+    def _load_cache(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return False
+        try:
+            with open(self.cache_file, "rb") as f:
+                magic, size, mtime_ns, stride, line_count = _CACHE_HEADER.unpack(
+                    f.read(_CACHE_HEADER.size))
+                if (magic, size, mtime_ns, stride) != (_CACHE_MAGIC, self.size, self.mtime_ns, self.stride):
+                    return False
+                checkpoints = array("Q")
+                checkpoints.frombytes(f.read())
+        except (OSError, struct.error, ValueError):
+            return False
+        self.checkpoints = checkpoints
+        self.line_count = line_count
+        self.complete = True
+        return True
+
+    def _save_cache(self):
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file, "wb") as f:
+                f.write(_CACHE_HEADER.pack(_CACHE_MAGIC, self.size, self.mtime_ns,
+                                           self.stride, self.line_count))
+                f.write(self.checkpoints.tobytes())
+        except OSError:
+            pass
+
+    def line_start(self, line):
+        """Смещение начала строки (нумерация с 0)"""
+        checkpoint = line // self.stride
+        pos = self.checkpoints[checkpoint]
+        for _ in range(line - checkpoint * self.stride):
+            pos = self._next_newline(pos) + self.unit
+        return pos
+
+    def get_lines(self, first, count):
+        """Байты строк first..first+count-1 без переводов строк"""
+        count = min(count, self.line_count - first)
+        if count <= 0:
+            return []
+        pos = self.line_start(first)
+        lines = []
+        for _ in range(count):
+            newline = self._next_newline(pos)
+            end = newline if newline >= 0 else self.size
+            line = self._map[pos:end]
+            if line.endswith(self.carriage_return):
+                line = line[:-self.unit]
+            lines.append(line)
+            pos = end + self.unit
+        return lines
+
+    def line_of_offset(self, offset):
+        """Номер строки (с 0), содержащей байт с данным смещением"""
+        checkpoint = bisect_right(self.checkpoints, offset) - 1
+        start = self.checkpoints[checkpoint]
+        if self.unit == 1:
+            return checkpoint * self.stride + self._map[start:offset].count(b"\n")
+        line = checkpoint * self.stride
+        while True:
+            start = self._next_newline(start)
+            if start < 0 or start >= offset:
+                return line
+            start += self.unit
+            line += 1
+
+    def find(self, needle, start=0):
+        """Смещение следующего вхождения байтов needle с начала символа или -1"""
+        if self._map is None:
+            return -1
+        return self._aligned_find(needle, start)
+
+    def _next_newline(self, pos):
+        return self._aligned_find(self.newline, pos)
+
+    def _aligned_find(self, needle, pos):
+        # В UTF-16/32 байты могут совпасть и на стыке двух символов - такие вхождения пропускаются
+        while True:
+            found = self._map.find(needle, pos)
+            if found < 0 or (found - self.origin) % self.unit == 0:
+                return found
+            pos = found + 1
+
+
+class LargeFileViewer:
+    def __init__(self, parent, file_path, encoding, tokenizer, cache_dir=None, font=None):
+        self.encoding = encoding
+        self.tokenizer = tokenizer
+        self.index = LineIndex(file_path, encoding, cache_dir=cache_dir)
+        self.top = 0
+        self.search_term = None
+        self._last_match = -1
+        self._poll_id = None
+
+        self.frame = tk.Frame(parent)
+        self.status_label = tk.Label(self.frame, anchor="w")
+        self.status_label.pack(side=tk.BOTTOM, fill=tk.X)
+        self.scrollbar = ttk.Scrollbar(self.frame, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text = tk.Text(self.frame, wrap="none", undo=False, font=font)
+        self.text.pack(expand=True, fill="both")
+        self.text.tag_configure("search", background="yellow", foreground="black")
+
+        # Прокрутка целиком наша: виджет содержит только видимые строки
+        self.text.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.text.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.text.bind("<Button-5>", lambda e: self.scroll(3))
+        self.text.bind("<Up>", lambda e: self.scroll(-1))
+        self.text.bind("<Down>", lambda e: self.scroll(1))
+        self.text.bind("<Prior>", lambda e: self.scroll(-self.rows()))
+        self.text.bind("<Next>", lambda e: self.scroll(self.rows()))
+        self.text.bind("<Control-Home>", lambda e: self.goto_line(1))
+        self.text.bind("<Control-End>", lambda e: self.goto_line(self.index.line_count))
+        self.text.bind("<Configure>", lambda e: self.render())
+
+        self.index.build()
+        self._poll_index()
+
+    def rows(self):
+        """Сколько строк помещается в окне"""
+        linespace = tkfont.Font(font=self.text["font"]).metrics("linespace")
+        return max(1, self.text.winfo_height() // max(1, linespace))
+
+    def scroll(self, delta):
+        self.top = self.top + delta
+        self.render()
+        return "break"
+
+    def goto_line(self, line_no):
+        """Переход к строке (нумерация с 1)"""
+        self.top = line_no - 1
+        self.render()
+        return "break"
+
+    def on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * self.index.line_count)
+        elif args[0] == "scroll":
+            step = self.rows() if args[2] == "pages" else 1
+            self.top += int(args[1]) * step
+        self.render()
+
+    def find(self, pattern):
+        """Поиск следующего вхождения от текущей позиции с переходом в начало файла"""
+        # Кодек индекса не добавляет BOM, который есть только в начале файла
+        needle = pattern.encode(self.index.codec, errors="replace")
+        start = self._last_match + 1 if self._last_match >= 0 else self.index.line_start(self.top)
+        offset = self.index.find(needle, start)
+        if offset < 0 and start > 0:
+            offset = self.index.find(needle, 0)
+        self._last_match = offset
+        if offset < 0:
+            return False
+        self.search_term = pattern
+        line = self.index.line_of_offset(offset)
+        self.top = line - self.rows() // 3
+        self.render()
+        return True
+
+    def render(self):
+        """Вывод только видимых строк"""
+        rows = self.rows()
+        total = self.index.line_count
+        self.top = max(0, min(self.top, total - rows))
+        lines = [line.decode(self.index.codec, errors="replace")
+                 for line in self.index.get_lines(self.top, rows)]
+
+        self.text.config(state="normal")
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", "\n".join(lines))
+        batch = TagBatch(HIGHLIGHT_TAGS)
+        for line_no, line in enumerate(lines, start=1):
+            spans, _ = self.tokenizer.tokenize_line(line)
+            batch.line_changed(line_no, spans)
+        batch.apply(self.text)
+        if self.search_term:
+            start = "1.0"
+            while True:
+                pos = self.text.search(self.search_term, start, stopindex=tk.END)
+                if not pos:
+                    break
+                start = f"{pos}+{len(self.search_term)}c"
+                self.text.tag_add("search", pos, start)
+        self.text.config(state="disabled")
+
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + rows) / total))
+        status = f"Строки {self.top + 1}-{self.top + len(lines)} из {total}"
+        if not self.index.complete:
+            status += " (индексация...)"
+        self.status_label.config(text=status)
+
+    def _poll_index(self):
+        # Пока индекс строится, обновляем полосу прокрутки и строку состояния
+        self._poll_id = None
+        self.render()
+        if not self.index.complete:
+            self._poll_id = self.frame.after(250, self._poll_index)
+
+    def close(self):
+        if self._poll_id is not None:
+            self.frame.after_cancel(self._poll_id)
+            self._poll_id = None
+        self.index.close()
@@ -1,21 +1,77 @@
+# Первым: с импорта perf начинается отсчет времени запуска (--profile-startup)
+from perf import recorder, profile_call, startup
 import tkinter as tk
-from tkinter import filedialog, messagebox, simpledialog, ttk
+from tkinter import messagebox, ttk
 from tkinter.ttk import Notebook
-import re
-import threading
-from queue import Queue
+from queue import Empty
+from autosave import BackgroundWriter, RecoveryJournal, encode_text, file_stamp
 from config_manager import ConfigManager
-import chardet
+from document import TabDocument
+from encoding_detector import EncodingDetector
+from file_loader import ChunkedFileLoader, LARGE_FILE_THRESHOLD
+from large_viewer import LargeFileViewer, VIEWER_THRESHOLD
+from search import FindBar
+from history import EditHistory, HISTORY_MEMORY_BUDGET
+from highlighter import (IncrementalHighlighter, HighlightWorker, TagBatch,
+                         HIGHLIGHT_TAGS, highlight_range)
+from languages import DEFAULT_LANGUAGE, detect_language, get_tokenizer
 import os
+import sys
+import time
+
+# Диалоги, поиск в файлах, массовая правка, слежение, пул потоков и chardet импортируются
+# при первом использовании: на запуск они не нужны
+startup.mark("импорт модулей")
+
+# Бюджет одного кадра на наложение тегов подсветки (секунды)
+HIGHLIGHT_FRAME_BUDGET = 0.008
+# Сколько строк подсветки накладывается за один вызов Tk
+HIGHLIGHT_CHUNK_LINES = 20
+# Период проверки результатов разбора, пока поток разбора занят (мс)
+HIGHLIGHT_POLL_INTERVAL = 5
+# Через сколько миллисекунд после последней правки (паузы в наборе) снимок вкладки
+# попадает в журнал восстановления
+AUTOSAVE_DELAY = 3000
+# Сколько соседних вкладок сессии читается заранее в фоне (с каждой стороны)
+PREFETCH_NEIGHBORS = 1
+# Сколько файлов читается и декодируется одновременно
+READ_WORKERS = 4
+# Период проверки файлов, читаемых в фоне для открываемых вкладок (мс)
+LOAD_POLL_INTERVAL = 20
+# Период обновления панели производительности (мс)
+PERF_OVERLAY_INTERVAL = 500
+# Замеры, которые показывает панель производительности
+PERF_OVERLAY_SPANS = ["highlight.cycle", "highlight.tokenize", "highlight.apply",
+                      "search.update", "io.write"]
 
 
 class Notepad:
-    def __init__(self, root):
+    def __init__(self, root, files=None):
         self.root = root
         self.root.title("Note")
 
-        # Очередь для асинхронной подсветки
-        self.highlight_queue = Queue()
+        # Поток разбора: получает снимки текста, возвращает токены
+        self.highlight_worker = HighlightWorker()
+        # Подсветка запускается событиями; пока снимок в работе, новые запросы
+        # только отмечаются и объединяются в один следующий снимок
+        self.highlight_requested = False
+        self.highlight_after_id = None
+        self.highlight_in_flight = False
+        self.highlight_poll_id = None
+        # Поток записи на диск: сохранения и журнал восстановления
+        self.file_writer = BackgroundWriter()
+        self.autosave_after_id = None
+        self.write_poll_id = None
+        # Пул для фонового чтения файлов вкладок (создается при первой необходимости)
+        self.prefetch_pool = None
+        # Вкладки, которые заполняются, как только их файл прочитан в пуле
+        self.loading_tabs = []
+        self.load_poll_id = None
+        # Момент первого запроса подсветки, еще не доведенного до экрана (для замеров)
+        self.highlight_requested_at = None
+        self.perf_after_id = None
+        # Бюджет истории отмены каждой вкладки (настройка undo_memory_mb)
+        self.undo_budget = HISTORY_MEMORY_BUDGET
 
         # Панель инструментов
         self.toolbar = tk.Frame(self.root)
@@ -54,6 +110,14 @@ class Notepad:
                 "keyword": "#00FFFF",
                 "string": "#00FF00",
                 "comment": "#AAAAAA",
+                "number": "#FFB86C",
+                "constant": "#FF79C6",
+                "key": "#87CEFA",
+                "section": "#FFD700",
+                "variable": "#DDA0DD",
+                "timestamp": "#8FBC8F",
+                "error": "#FF5555",
+                "warning": "#FFA500",
                 "select_bg": "#555555",  # Цвет фона выделения для темной темы
                 "select_fg": "white"     # Цвет текста выделения для темной темы
             },
@@ -64,6 +128,14 @@ class Notepad:
                 "keyword": "blue",
                 "string": "green",
                 "comment": "gray",
+                "number": "#AA5500",
+                "constant": "#8B008B",
+                "key": "#00008B",
+                "section": "#B8860B",
+                "variable": "#800080",
+                "timestamp": "#2E8B57",
+                "error": "red",
+                "warning": "#CC7700",
                 "select_bg": "#ADD8E6",  # Цвет фона выделения для светлой темы
                 "select_fg": "black"     # Цвет текста выделения для светлой темы
             }
@@ -75,16 +147,20 @@ class Notepad:
         self.notebook.pack(expand=True, fill="both")
         self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         self.notebook.bind("<Button-3>", self.on_tab_right_click)
+
+        # Строка замеров производительности (включается в меню "Сервис")
+        self.perf_var = tk.BooleanVar(value=False)
+        self.perf_label = None
+
+        # Панель поиска (показывается по Ctrl+F)
+        self.find_bar = FindBar(self)
+        # Окна поиска в файлах и массовой правки создаются при первом обращении
+        self.find_in_files_panel = None
+        self.bulk_edit_panel = None
+        # Документы вкладок по имени виджета вкладки в Notebook
         self.tabs = {}
         self.add_tab()
 
-        # Список ключевых слов Python
-        self.keywords = [
-            "def", "class", "if", "else", "elif", "for", "while", "try",
-            "except", "import", "from", "as", "with", "return", "break",
-            "continue", "pass", "True", "False", "None"
-        ]
-
         # Создаем меню
         self.menu_bar = tk.Menu(self.root)
         self.root.config(menu=self.menu_bar)
@@ -100,9 +176,23 @@ class Notepad:
             label="Сохранить (Ctrl+S)", command=self.save_file)
         self.file_menu.add_command(
             label="Сохранить как", command=self.save_as_file)
+        self.file_menu.add_command(
+            label="Следить за файлом (Ctrl+T)", command=self.toggle_follow)
         self.file_menu.add_separator()
         self.file_menu.add_command(label="Выход", command=self.exit_app)
 
+        # Меню "Правка"
+        self.edit_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.menu_bar.add_cascade(label="Правка", menu=self.edit_menu)
+        self.edit_menu.add_command(
+            label="Найти (Ctrl+F)", command=self.find_text)
+        self.edit_menu.add_command(
+            label="Найти в файлах (Ctrl+Shift+F)", command=self.find_in_files)
+        self.edit_menu.add_command(
+            label="Массовая правка (Ctrl+Shift+H)", command=self.bulk_edit)
+        self.edit_menu.add_command(
+            label="Перейти к строке (Ctrl+G)", command=self.goto_line)
+
         # Меню "Тема"
         self.theme_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(label="Тема", menu=self.theme_menu)
@@ -111,22 +201,41 @@ class Notepad:
         self.theme_menu.add_command(
             label="Светлая", command=lambda: self.set_theme("light"))
 
-        # Загрузка настроек через ConfigManager
+        # Меню "Сервис"
+        self.tools_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.menu_bar.add_cascade(label="Сервис", menu=self.tools_menu)
+        self.tools_menu.add_checkbutton(
+            label="Панель производительности", variable=self.perf_var,
+            command=self.toggle_perf_overlay)
+        self.tools_menu.add_command(
+            label="Сохранить замеры...", command=self.dump_perf)
+        self.tools_menu.add_command(
+            label="Профилировать цикл подсветки", command=self.profile_highlight)
+
+        # Загрузка настроек через ConfigManager: оформление и размер окна применяются
+        # до первого показа, чтобы окно не перерисовывалось и не меняло размер
         self.config_manager = ConfigManager()
+        self.encoding_detector = EncodingDetector(os.path.join(
+            self.config_manager.cache_dir("encoding"), "encodings.json"))
+        self.recovery = RecoveryJournal(
+            self.config_manager.cache_dir("recovery"), self.file_writer)
         config = self.config_manager.load_config(default_config={
             "theme": "dark",
             "font_size": 14,
             "geometry": "700x500",
-            "opacity": 0.87
+            "opacity": 0.87,
+            "undo_memory_mb": HISTORY_MEMORY_BUDGET // (1024 * 1024)
         })
         self.current_theme = config["theme"]
         self.font_size = config["font_size"]
+        self.undo_budget = int(config["undo_memory_mb"] * 1024 * 1024)
         self.root.geometry(config["geometry"])
         self.opacity_scale.set(config["opacity"])
         self.set_opacity(config["opacity"])
         self.apply_theme()
         for tab_info in self.tabs.values():
-            tab_info["text"].config(font=("Courier", self.font_size))
+            tab_info.text.config(font=("Courier", self.font_size))
+            tab_info.history.budget = self.undo_budget
 
         # Настройка подсветки синтаксиса и событий для текущей вкладки
         self.setup_syntax_highlighting()
@@ -134,9 +243,30 @@ class Notepad:
 
         # Привязка горячих клавиш
         self.setup_hotkeys()
+        startup.mark("интерфейс")
+
+        # Сессия и восстановление после сбоя - уже после показа окна
+        self.root.after_idle(lambda: self.finish_startup(config.get("session"), files))
 
-        # Запуск асинхронного обработчика подсветки
-        self.root.after(100, self.process_highlight_queue)
+    def finish_startup(self, session, files=None):
+        # Вторая часть запуска: окно уже на экране, дальше чтение файлов сессии
+        self.root.update_idletasks()
+        startup.mark("показ окна")
+        # Вкладки прошлой сессии: создаются заглушки, файлы читаются при выборе
+        self.restore_session(session)
+        if files:
+            # Файлы из командной строки открываются поверх сессии
+            initial = list(self.tabs.values())
+            if self.open_files(files):
+                self.remove_blank_tabs(initial)
+        # До этого момента закрытие окна не должно перезаписать сессию пустой
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_app)
+        startup.mark("сессия")
+        if startup.enabled:
+            print(startup.report(), file=sys.stderr)
+
+        # Предложение восстановить вкладки после аварийного завершения
+        self.root.after_idle(self.offer_recovery)
 
     def on_scale_click(self, event):
         # Обработка клика на ползунок для установки прозрачности по позиции клика
@@ -165,11 +295,19 @@ class Notepad:
         self.root.bind(
             "<Control-n>", lambda event: self.new_file())
         self.root.bind(
-            "<Control-z>", lambda event: self.text_area.edit_undo())
+            "<Control-z>", lambda event: self.undo())
         self.root.bind(
-            "<Control-y>", lambda event: self.text_area.edit_redo())
+            "<Control-y>", lambda event: self.redo())
         self.root.bind(
             "<Control-f>", lambda event: self.find_text())
+        self.root.bind(
+            "<Control-g>", lambda event: self.goto_line())
+        self.root.bind(
+            "<Control-Shift-F>", lambda event: self.find_in_files())
+        self.root.bind(
+            "<Control-Shift-H>", lambda event: self.bulk_edit())
+        self.root.bind(
+            "<Control-t>", lambda event: self.toggle_follow())
         self.root.bind(
             "<Control-a>", self.select_all_without_highlight)
 
@@ -178,7 +316,7 @@ class Notepad:
         tab_info = self.get_current_tab()
         if not tab_info:
             return "break"
-        text_area = tab_info["text"]
+        text_area = tab_info.text
         if text_area.tag_ranges("sel"):
             selected_text = text_area.get("sel.first", "sel.last")
             self.root.clipboard_clear()
@@ -190,7 +328,7 @@ class Notepad:
         tab_info = self.get_current_tab()
         if not tab_info:
             return "break"
-        text_area = tab_info["text"]
+        text_area = tab_info.text
 
         try:
             # Получаем текст из буфера обмена
@@ -208,6 +346,7 @@ class Notepad:
             text_area.delete(sel_start, sel_end)
 
         # Вставляем текст в текущую позицию курсора
+        # (измененные строки подсветка и поиск узнают из истории правок)
         current_pos = text_area.index(tk.INSERT)
         text_area.insert(current_pos, clipboard_text)
 
@@ -220,12 +359,26 @@ class Notepad:
 
         return "break"
 
+    def undo(self, tab_info=None):
+        # Отмена последней группы правок вкладки (история ограничена бюджетом памяти)
+        tab_info = tab_info or self.get_current_tab()
+        if tab_info and tab_info.history:
+            tab_info.history.undo()
+        return "break"
+
+    def redo(self, tab_info=None):
+        # Повтор отмененной группы правок
+        tab_info = tab_info or self.get_current_tab()
+        if tab_info and tab_info.history:
+            tab_info.history.redo()
+        return "break"
+
     def select_all_without_highlight(self, event):
         # Выделение всего текста с использованием стандартного тега 'sel'
         tab_info = self.get_current_tab()
         if not tab_info:
             return "break"
-        text_area = tab_info["text"]
+        text_area = tab_info.text
         # Удаляем предыдущее выделение
         text_area.tag_remove("sel", "1.0", "end")
         # Добавляем стандартное выделение
@@ -238,24 +391,63 @@ class Notepad:
     def add_tab(self):
         # Добавление новой вкладки
         frame = tk.Frame(self.notebook)
-        text_area = tk.Text(frame, wrap="word", undo=True,
+        # Собственная история Tk не ограничена по памяти - отмену ведет EditHistory
+        text_area = tk.Text(frame, wrap="word", undo=False,
                             font=("Courier", self.font_size))
         text_area.pack(expand=True, fill="both")
         self.notebook.add(frame, text="Новый файл")
-        self.tabs[text_area] = {"file": None, "text": text_area}
+        # Грамматики компилируются при первом использовании языка
+        document = TabDocument(frame, text_area,
+                               IncrementalHighlighter(get_tokenizer(DEFAULT_LANGUAGE)),
+                               DEFAULT_LANGUAGE)
+        document.history = EditHistory(text_area, self.undo_budget)
+        document.highlight_changes = document.history.track()
+        self.tabs[document.key] = document
         self.text_area = text_area
         # Привязываем <Control-v> к paste_text для этого текстового поля
         text_area.bind("<Control-v>", self.paste_text)
         # Привязываем <Control-c> к copy_text для этого текстового поля
         text_area.bind("<Control-c>", self.copy_text)
-        self.apply_theme()
+        # Стандартные <<Undo>>/<<Redo>> виджета идут в историю вкладки
+        text_area.bind("<<Undo>>", lambda event: self.undo(document))
+        text_area.bind("<<Redo>>", lambda event: self.redo(document))
+        # У класса Text Ctrl+T переставляет два символа; привязка на самом поле
+        # срабатывает раньше и прерывает обработку
+        text_area.bind("<Control-t>", self.on_follow_key)
+        # Отслеживание несохраненных правок для автосохранения
+        text_area.bind("<<Modified>>", lambda event: self.on_text_modified(document))
+        self.apply_theme(text_area)
         self.setup_syntax_highlighting()
         self.notebook.select(frame)
 
+    def add_viewer_tab(self, file_path, encoding):
+        # Вкладка просмотра очень большого файла: в виджете только видимые строки
+        viewer = LargeFileViewer(
+            self.notebook, file_path, encoding, get_tokenizer(detect_language(file_path)),
+            cache_dir=self.config_manager.cache_dir("line_index"),
+            font=("Courier", self.font_size))
+        self.notebook.add(viewer.frame, text=os.path.basename(
+            file_path) + " [только чтение]")
+        document = TabDocument(viewer.frame, viewer.text, file=file_path, encoding=encoding,
+                               viewer=viewer)
+        self.tabs[document.key] = document
+        self.text_area = viewer.text
+        viewer.text.bind("<Control-c>", self.copy_text)
+        self.apply_theme(viewer.text)
+        self.notebook.select(viewer.frame)
+
     def on_tab_changed(self, event):
-        # Обновление текущей вкладки при переключении
-        self.get_current_tab()
+        # Обновление текущей вкладки при переключении; отложенная загрузка файла сессии
+        tab_info = self.get_current_tab()
+        if tab_info and tab_info.pending:
+            if tab_info.prefetch and not tab_info.prefetch.done():
+                # Файл еще читается в пуле: вкладка заполнится, как только он будет готов
+                self.wait_for_load(tab_info)
+            else:
+                self.load_pending_tab(tab_info)
+            self.prefetch_neighbors()
         self.queue_highlight()
+        self.find_bar.schedule()
 
     def on_tab_right_click(self, event):
         # Обработка правого клика по вкладке для закрытия
@@ -268,16 +460,28 @@ class Notepad:
         # Закрытие вкладки с проверкой несохраненных изменений
         if len(self.notebook.tabs()) <= 1:
             return
-        frame = self.notebook.tabs()[tab_index]
-        for text_area, info in list(self.tabs.items()):
-            if str(text_area.master) == str(frame):
-                if text_area.get("1.0", tk.END).strip():
-                    self.text_area = text_area
-                    if messagebox.askyesno("Сохранить?", "Хотите сохранить перед закрытием?"):
-                        self.save_file()
-                self.notebook.forget(tab_index)
-                del self.tabs[text_area]
-                break
+        frame = self.notebook.tabs()[self.notebook.index(tab_index)]
+        tab_info = self.tabs.get(str(frame))
+        if tab_info is None:
+            return
+        text_area = tab_info.text
+        if tab_info.loader:
+            tab_info.loader.cancel()
+        if tab_info.follower:
+            # Вкладка слежения - копия журнала, сохранять ее поверх файла не нужно
+            self.stop_follow(tab_info)
+        elif tab_info.viewer:
+            tab_info.viewer.close()
+        elif text_area.get("1.0", tk.END).strip():
+            if messagebox.askyesno("Сохранить?", "Хотите сохранить перед закрытием?"):
+                if not self.save_and_wait(tab_info):
+                    # Запись не удалась: вкладка и ее снимок в журнале остаются
+                    return
+        self.notebook.forget(frame)
+        self.recovery.discard(tab_info.id)
+        self.highlight_worker.discard(text_area)
+        self.find_bar.worker.discard(text_area)
+        del self.tabs[tab_info.key]
         self.get_current_tab()
 
     def get_current_tab(self):
@@ -285,27 +489,36 @@ class Notepad:
         current_tab = self.notebook.select()
         if not current_tab:  # Проверяем, есть ли активная вкладка
             return None
-        for text_area, info in self.tabs.items():
-            if str(self.notebook.tabs()[self.notebook.index(current_tab)]) == str(text_area.master):
-                self.text_area = text_area
-                return info
-        return None
+        tab_info = self.tabs.get(str(current_tab))
+        if tab_info is not None:
+            self.text_area = tab_info.text
+        return tab_info
+
+    def document_of(self, text_area):
+        # Документ вкладки по ее текстовому полю (None, если вкладка закрыта)
+        tab_info = self.tabs.get(str(text_area.master))
+        if tab_info is None or tab_info.text is not text_area:
+            return None
+        return tab_info
 
-    def apply_theme(self):
-        # Применение текущей темы ко всем вкладкам
+    def apply_theme(self, only=None):
+        # Применение текущей темы ко всем вкладкам (или только к новой вкладке only)
         theme = self.themes[self.current_theme]
-        for tab_info in self.tabs.values():
-            text_area = tab_info["text"]
-            text_area.config(bg=theme["bg"], fg=theme["fg"],
-                             insertbackground=theme["insertbg"])
-            text_area.tag_configure("keyword", foreground=theme["keyword"])
-            text_area.tag_configure("string", foreground=theme["string"])
-            text_area.tag_configure("comment", foreground=theme["comment"])
-            # Настраиваем тег 'sel' для визуального выделения текста
-            text_area.tag_configure(
-                "sel", background=theme["select_bg"], foreground=theme["select_fg"])
-            # Устанавливаем приоритет тега 'sel' выше других тегов
-            text_area.tag_raise("sel")
+        text_areas = [only] if only is not None else [info.text for info in self.tabs.values()]
+        with recorder.span("theme.apply"):
+            for text_area in text_areas:
+                text_area.config(bg=theme["bg"], fg=theme["fg"],
+                                 insertbackground=theme["insertbg"])
+                # Цвета классов токенов общие для всех грамматик
+                for tag in HIGHLIGHT_TAGS:
+                    text_area.tag_configure(tag, foreground=theme[tag])
+                text_area.tag_configure(
+                    "search", background="yellow", foreground="black")
+                # Настраиваем тег 'sel' для визуального выделения текста
+                text_area.tag_configure(
+                    "sel", background=theme["select_bg"], foreground=theme["select_fg"])
+                # Устанавливаем приоритет тега 'sel' выше других тегов
+                text_area.tag_raise("sel")
         self.queue_highlight()
 
     def set_theme(self, theme_name):
@@ -314,59 +527,124 @@ class Notepad:
         self.apply_theme()
 
     def setup_syntax_highlighting(self):
-        # Настройка подсветки синтаксиса для текущей вкладки
-        self.text_area.bind("<KeyRelease>", self.queue_highlight)
-        self.text_area.bind("<Expose>", self.queue_highlight)
+        # Подсветка по событиям: правки приходят через <<Modified>>,
+        # прокрутка любым способом - через yscrollcommand, размер окна - через <Configure>
+        tab_info = self.document_of(self.text_area)
         self.text_area.bind("<Configure>", self.queue_highlight)
+        self.text_area.config(
+            yscrollcommand=lambda first, last: self.on_text_scrolled(tab_info, first, last))
         self.queue_highlight()
 
+    def on_text_scrolled(self, tab_info, first, last):
+        # Tk сообщает положение и после перерисовки - подсветка нужна, только если оно изменилось
+        if tab_info is None or tab_info.view == (first, last):
+            return
+        tab_info.view = (first, last)
+        if tab_info is self.tabs.get(self.notebook.select()):
+            self.queue_highlight()
+
     def queue_highlight(self, event=None):
-        # Добавление задачи подсветки в очередь с задержкой
-        if hasattr(self, "highlight_after_id"):
-            self.root.after_cancel(self.highlight_after_id)
-        self.highlight_after_id = self.root.after(
-            200, lambda: self.highlight_queue.put(True))
-
-    def process_highlight_queue(self):
-        # Обработка очереди подсветки в фоновом потоке
-        if not self.highlight_queue.empty():
-            self.highlight_queue.get()
-            threading.Thread(
-                target=self.highlight_visible_syntax, daemon=True).start()
-        self.root.after(100, self.process_highlight_queue)
+        # Запрос подсветки: выполняется сразу, как только главный цикл освободится;
+        # серия событий до этого момента или во время разбора дает один снимок
+        if recorder.enabled and self.highlight_requested_at is None:
+            self.highlight_requested_at = time.perf_counter()
+        self.highlight_requested = True
+        if self.highlight_after_id is None and not self.highlight_in_flight:
+            self.highlight_after_id = self.root.after_idle(self.run_highlight)
+
+    def run_highlight(self):
+        # Снимок видимого текста уходит в поток разбора; пока он там,
+        # результаты проверяются короткими интервалами, в простое - ни одного таймера
+        self.highlight_after_id = None
+        self.highlight_requested = False
+        if not self.highlight_visible_syntax():
+            return
+        self.highlight_in_flight = True
+        if self.highlight_poll_id is None:
+            self.highlight_poll_id = self.root.after(
+                HIGHLIGHT_POLL_INTERVAL, self.poll_highlight_results)
+
+    def poll_highlight_results(self):
+        # Готовые результаты накладываются в главном потоке
+        self.highlight_poll_id = None
+        while True:
+            try:
+                result = self.highlight_worker.results.get_nowait()
+            except Empty:
+                break
+            self.apply_highlight_result(*result)
+        if self.highlight_worker.pending():
+            self.highlight_poll_id = self.root.after(
+                HIGHLIGHT_POLL_INTERVAL, self.poll_highlight_results)
+            return
+        self.highlight_in_flight = False
+        if self.highlight_requested:
+            # Пока шел разбор, текст или положение изменились - один новый снимок на всю серию
+            self.highlight_after_id = self.root.after_idle(self.run_highlight)
 
     def highlight_visible_syntax(self):
-        # Подсветка синтаксиса только для видимой части текста
+        # Снимок видимой части текста для подсветки в фоновом потоке;
+        # возвращает True, если снимок отправлен
         tab_info = self.get_current_tab()
-        if not tab_info:
+        if not tab_info or tab_info.viewer:
+            # Просмотрщик подсвечивает выводимые строки сам
+            return False
+        text_area = tab_info.text
+        highlighter = tab_info.highlighter
+        with recorder.span("highlight.snapshot"):
+            top_line = int(text_area.index("@0,0").split('.')[0])
+            bottom_line = int(text_area.index("@0,%d" %
+                              text_area.winfo_height()).split('.')[0])
+            total_lines = int(text_area.index("end-1c").split('.')[0])
+            first_line = highlighter.scan_start(top_line)
+            # Известная правка сдвигает кэш точно; если от нее зависит состояние
+            # лексера на экране, снимок начинается не ниже нее
+            if tab_info.highlight_changes:
+                full, change = tab_info.highlight_changes.take()
+                if change and not full:
+                    self.highlight_worker.edit(highlighter, *change)
+                    if highlighter.tokenizer.multiline:
+                        first_line = min(first_line, change[0])
+            lines = text_area.get(
+                f"{first_line}.0", f"{bottom_line}.end").split("\n")
+        # Запросы фоновых вкладок отбрасываются: первой разбирается видимая вкладка
+        self.highlight_worker.focus(text_area)
+        # Строки выше экрана разбираются только ради состояния и не подсвечиваются
+        self.highlight_worker.submit(
+            text_area, highlighter, first_line, lines, total_lines, top_line)
+        if self.find_bar.visible:
+            self.find_bar.tag_visible()
+        return True
+
+    def apply_highlight_result(self, text_area, highlighter, generation, changed, start=0):
+        # Наложение тегов порциями, чтобы не выходить за бюджет кадра
+        if not self.highlight_worker.is_current(text_area, generation):
+            # Результат устарел: неналоженные строки разбираются заново
+            if changed and start < len(changed):
+                self.highlight_worker.invalidate(highlighter, changed[start][0])
+                self.queue_highlight()
+            return
+        if changed is None:
+            # Кэш изменился после снятия снимка - нужен новый снимок
+            self.queue_highlight()
             return
-        text_area = tab_info["text"]
-        top_line = int(text_area.index("@0,0").split('.')[0])
-        bottom_line = int(text_area.index("@0,%d" %
-                          text_area.winfo_height()).split('.')[0])
-        visible_text = text_area.get(
-            f"{top_line}.0", f"{bottom_line}.0 + 1 lines")
-
-        for tag in ["keyword", "string", "comment"]:
-            text_area.tag_remove(
-                tag, f"{top_line}.0", f"{bottom_line}.0 + 1 lines")
-
-        for word in self.keywords:
-            pattern = r"\b" + word + r"\b"
-            for match in re.finditer(pattern, visible_text):
-                start = f"{top_line}.0 + {match.start()} chars"
-                end = f"{top_line}.0 + {match.end()} chars"
-                text_area.tag_add("keyword", start, end)
-
-        for match in re.finditer(r'"[^"]*"|\'[^\']*\'', visible_text):
-            start = f"{top_line}.0 + {match.start()} chars"
-            end = f"{top_line}.0 + {match.end()} chars"
-            text_area.tag_add("string", start, end)
-
-        for match in re.finditer(r"#.*$", visible_text, re.MULTILINE):
-            start = f"{top_line}.0 + {match.start()} chars"
-            end = f"{top_line}.0 + {match.end()} chars"
-            text_area.tag_add("comment", start, end)
+        deadline = time.perf_counter() + HIGHLIGHT_FRAME_BUDGET
+        with recorder.span("highlight.apply"):
+            while start < len(changed):
+                batch = TagBatch(HIGHLIGHT_TAGS)
+                for line_no, spans, previous in changed[start:start + HIGHLIGHT_CHUNK_LINES]:
+                    batch.line_changed(line_no, spans, previous)
+                batch.apply(text_area)
+                start += HIGHLIGHT_CHUNK_LINES
+                if time.perf_counter() > deadline:
+                    break
+        if start < len(changed):
+            self.root.after(1, self.apply_highlight_result,
+                            text_area, highlighter, generation, changed, start)
+        elif self.highlight_requested_at is not None:
+            # Полный путь: от правки или прокрутки до наложенных тегов, включая задержки
+            recorder.record("highlight.cycle", self.highlight_requested_at, time.perf_counter())
+            self.highlight_requested_at = None
 
     def setup_font_resize(self):
         # Настройка изменения размера шрифта
@@ -379,126 +657,716 @@ class Notepad:
         elif event.delta < 0 and self.font_size > 1:
             self.font_size -= 1
         for tab_info in self.tabs.values():
-            tab_info["text"].config(font=("Courier", self.font_size))
+            tab_info.text.config(font=("Courier", self.font_size))
         self.queue_highlight()
 
     def find_text(self):
-        # Поиск текста в текущей вкладке
+        # Панель поиска с поиском по мере ввода
+        self.find_bar.show()
+
+    def goto_line(self):
+        # Переход к строке по номеру
         tab_info = self.get_current_tab()
         if not tab_info:
             return
-        text_area = tab_info["text"]
-        search = simpledialog.askstring("Найти", "Введите текст для поиска:")
-        if search:
-            text_area.tag_remove("search", "1.0", tk.END)
-            start_pos = "1.0"
-            while True:
-                pos = text_area.search(search, start_pos, stopindex=tk.END)
-                if not pos:
-                    break
-                end_pos = f"{pos}+{len(search)}c"
-                text_area.tag_add("search", pos, end_pos)
-                start_pos = end_pos
-            text_area.tag_config(
-                "search", background="yellow", foreground="black")
+        from tkinter import simpledialog
+        line_no = simpledialog.askinteger(
+            "Перейти к строке", "Номер строки:", minvalue=1)
+        if not line_no:
+            return
+        if tab_info.viewer:
+            tab_info.viewer.goto_line(line_no)
+        else:
+            text_area = tab_info.text
+            text_area.mark_set(tk.INSERT, f"{line_no}.0")
+            text_area.see(tk.INSERT)
+            text_area.focus_set()
+            self.queue_highlight()
+
+    def find_in_files(self):
+        # Поиск по всем вкладкам и, при необходимости, по каталогу
+        if self.find_in_files_panel is None:
+            from find_in_files import FindInFilesPanel
+            self.find_in_files_panel = FindInFilesPanel(self)
+        self.find_in_files_panel.show()
+
+    def bulk_edit(self):
+        # Замена всех совпадений, сортировка, удаление повторов и фильтр строк текущей вкладки
+        if self.bulk_edit_panel is None:
+            from bulk_edit import BulkEditPanel
+            self.bulk_edit_panel = BulkEditPanel(self)
+        self.bulk_edit_panel.show()
+
+    def tab_title(self, text_area):
+        # Заголовок вкладки по ее текстовому полю
+        tab_info = self.document_of(text_area)
+        if tab_info is None:
+            return "?"
+        return self.notebook.tab(tab_info.frame, "text")
+
+    def find_tab_by_path(self, file_path):
+        # Вкладка, в которой открыт файл (в том числе еще не загруженная вкладка сессии)
+        file_path = os.path.abspath(file_path)
+        for tab_info in self.tabs.values():
+            path = tab_info.file or (tab_info.pending or {}).get("file")
+            if path and os.path.abspath(path) == file_path:
+                return tab_info
+        return None
+
+    def open_location(self, text_area, file_path, line_no, col=0):
+        # Переход к месту в открытой вкладке или в файле, который открывается заново
+        tab_info = self.document_of(text_area) if text_area is not None else None
+        if tab_info is None and file_path:
+            tab_info = self.find_tab_by_path(file_path) or self.open_file(file_path)
+        if tab_info is None:
+            return
+        self.notebook.select(tab_info.frame)
+        if tab_info.pending:
+            # Смена вкладки обрабатывается позже, из цикла событий: файл вкладки сессии
+            # загружается сразу, иначе переход применится к пустому тексту
+            self.load_pending_tab(tab_info)
+            # Очень большой файл мог открыться вкладкой просмотра на месте заглушки
+            tab_info = self.get_current_tab()
+        if tab_info.viewer:
+            tab_info.viewer.goto_line(line_no)
+            return
+        text_area = tab_info.text
+        text_area.mark_set(tk.INSERT, f"{line_no}.{col}")
+        text_area.see(tk.INSERT)
+        text_area.focus_set()
+        self.queue_highlight()
 
     def new_file(self):
         # Создать новый файл (новая вкладка)
         self.add_tab()
 
     def detect_encoding(self, file_path):
-        # Определение кодировки файла
-        with open(file_path, "rb") as file:
-            raw_data = file.read()
-            result = chardet.detect(raw_data)
-            encoding = result["encoding"]
-            confidence = result["confidence"]
-            if confidence < 0.5 or encoding is None:
-                encoding = "utf-8"
-            return encoding
-
-    def open_file(self):
-        # Открыть существующий файл в новой вкладке с определением кодировки
-        file_path = filedialog.askopenfilename(
-            filetypes=[("Текстовые файлы", "*.txt"), ("Все файлы", "*.*")])
+        # Определение кодировки файла (BOM, строгий UTF-8, затем chardet) с кэшем
+        return self.encoding_detector.detect(file_path)
+
+    def open_file(self, file_path=None):
+        # Открыть существующий файл в новой вкладке с определением кодировки;
+        # возвращает сведения о новой вкладке или None
+        if file_path is None:
+            # Из диалога можно выбрать несколько файлов: они читаются параллельно в фоне
+            from tkinter import filedialog
+            file_paths = filedialog.askopenfilenames(
+                filetypes=[("Текстовые файлы", "*.txt"), ("Все файлы", "*.*")])
+            if file_paths:
+                self.open_files(self.root.tk.splitlist(file_paths))
+            return None
         if file_path:
             try:
-                encoding = self.detect_encoding(file_path)
-                try:
-                    with open(file_path, "r", encoding=encoding) as file:
-                        self.add_tab()
-                        tab_info = self.get_current_tab()
-                        tab_info["text"].delete("1.0", tk.END)
-                        tab_info["text"].insert("1.0", file.read())
-                        tab_info["file"] = file_path
-                        self.notebook.tab(
-                            self.notebook.select(), text=os.path.basename(file_path))
-                        self.queue_highlight()
-                except UnicodeDecodeError:
-                    with open(file_path, "r", encoding="windows-1251") as file:
-                        self.add_tab()
-                        tab_info = self.get_current_tab()
-                        tab_info["text"].delete("1.0", tk.END)
-                        tab_info["text"].insert("1.0", file.read())
-                        tab_info["file"] = file_path
-                        self.notebook.tab(
-                            self.notebook.select(), text=os.path.basename(file_path))
-                        self.queue_highlight()
+                size = os.path.getsize(file_path)
+                if size >= VIEWER_THRESHOLD:
+                    self.add_viewer_tab(file_path, self.detect_encoding(file_path))
+                    return self.get_current_tab()
+                if size >= LARGE_FILE_THRESHOLD:
+                    self.open_large_file(file_path, self.detect_encoding(file_path))
+                    return self.get_current_tab()
+                # Файл читается один раз: определение кодировки и декодирование за один проход
+                with recorder.span("io.open"):
+                    text, encoding, newline = self.encoding_detector.read_text(file_path)
+                    self.add_tab()
+                    tab_info = self.get_current_tab()
+                    self.set_language(tab_info, file_path, text.split("\n", 1)[0])
+                    tab_info.text.delete("1.0", tk.END)
+                    tab_info.text.insert("1.0", text)
+                tab_info.text.edit_modified(False)
+                # Открытие файла не отменяется
+                tab_info.history.reset()
+                self.highlight_worker.reset(tab_info.highlighter)
+                tab_info.file = file_path
+                tab_info.encoding = encoding
+                tab_info.newline = newline
+                tab_info.disk_stamp = file_stamp(file_path)
+                self.notebook.tab(
+                    self.notebook.select(), text=os.path.basename(file_path))
+                self.queue_highlight()
+                return tab_info
             except Exception as e:
                 messagebox.showerror("Ошибка", f"Не удалось открыть файл: {e}")
+        return None
+
+    def open_large_file(self, file_path, encoding):
+        # Потоковое открытие большого файла: текст вставляется порциями,
+        # окно остается отзывчивым, загрузку можно отменить
+        self.add_tab()
+        tab_info = self.get_current_tab()
+        self.notebook.tab(self.notebook.select(),
+                          text=os.path.basename(file_path))
+        self.start_loader(tab_info, file_path, encoding)
+
+    def start_loader(self, tab_info, file_path, encoding):
+        # Запуск порционной загрузки в уже созданную вкладку
+        self.set_language(tab_info, file_path)
+        # Порции загрузки в историю отмены не попадают
+        tab_info.history.pause()
+        loader = ChunkedFileLoader(
+            self.root, tab_info.text, file_path, encoding,
+            on_done=lambda completed: self.on_large_file_loaded(tab_info, file_path, completed))
+        tab_info.loader = loader
+        loader.start()
+        self.queue_highlight()
+
+    def set_language(self, tab_info, file_path, first_line=None):
+        # Грамматика вкладки по имени файла или строке #!; при смене язык разбирается заново
+        language = detect_language(file_path, first_line)
+        if language == tab_info.language or tab_info.viewer:
+            return
+        tab_info.language = language
+        # Результаты для прежнего кэша больше не накладываются
+        self.highlight_worker.discard(tab_info.text)
+        tab_info.highlighter = IncrementalHighlighter(get_tokenizer(language))
+        self.queue_highlight()
+
+    def on_large_file_loaded(self, tab_info, file_path, completed):
+        # Завершение потоковой загрузки
+        loader = tab_info.loader
+        tab_info.loader = None
+        if self.tabs.get(tab_info.key) is not tab_info:
+            return
+        tab_info.history.resume()
+        self.highlight_worker.reset(tab_info.highlighter)
+        # Кодировка могла смениться на windows-1251 при ошибке декодирования
+        tab_info.encoding = loader.encoding
+        tab_info.newline = loader.newline or "\n"
+        if completed:
+            tab_info.file = file_path
+            tab_info.disk_stamp = file_stamp(file_path)
+        else:
+            # Загружена только часть файла: сохранять поверх оригинала нельзя
+            self.notebook.tab(
+                tab_info.frame, text=os.path.basename(file_path) + " (частично)")
+        self.queue_highlight()
 
     def save_file(self):
         # Сохранить текущий файл
         tab_info = self.get_current_tab()
-        if not tab_info:
+        if not tab_info or tab_info.viewer:
+            # Вкладка просмотра содержит только видимые строки - сохранять нечего
             return
-        if tab_info["file"]:
-            try:
-                with open(tab_info["file"], "w", encoding="utf-8") as file:
-                    file.write(tab_info["text"].get("1.0", tk.END))
-                self.notebook.tab(self.notebook.select(),
-                                  text=os.path.basename(tab_info["file"]))
-            except Exception as e:
-                messagebox.showerror(
-                    "Ошибка", f"Не удалось сохранить файл: {e}")
+        if tab_info.follower:
+            # Запись поверх журнала обрезала бы его до строк, оставшихся во вкладке
+            messagebox.showinfo("Слежение", "Остановите слежение, чтобы сохранить файл")
+            return
+        if tab_info.file:
+            self.write_tab(tab_info, tab_info.file)
         else:
             self.save_as_file()
 
     def save_as_file(self):
         # Сохранить как новый файл
         tab_info = self.get_current_tab()
-        if not tab_info:
+        if not tab_info or tab_info.viewer:
             return
+        from tkinter import filedialog
         file_path = filedialog.asksaveasfilename(defaultextension=".txt",
                                                  filetypes=[("Текстовые файлы", "*.txt"), ("Все файлы", "*.*")])
         if file_path:
-            try:
-                with open(file_path, "w", encoding="utf-8") as file:
-                    file.write(tab_info["text"].get("1.0", tk.END))
-                tab_info["file"] = file_path
-                self.notebook.tab(self.notebook.select(),
-                                  text=os.path.basename(file_path))
-            except Exception as e:
+            self.write_tab(tab_info, file_path)
+
+    def write_tab(self, tab_info, file_path):
+        # Запись в фоновом потоке через временный файл и атомарную замену;
+        # текст кодируется порциями строк в кодировке, с которой файл был открыт
+        text_area = tab_info.text
+        same_file = tab_info.file is not None and \
+            os.path.abspath(tab_info.file) == os.path.abspath(file_path)
+        unchanged_on_disk = same_file and tab_info.disk_stamp is not None \
+            and file_stamp(file_path) == tab_info.disk_stamp
+        if unchanged_on_disk and not tab_info.dirty:
+            # Ни вкладка, ни файл не менялись с открытия или прошлой записи
+            return
+        encoding = tab_info.encoding or "utf-8"
+        try:
+            chunks, digest = encode_text(text_area, encoding, tab_info.newline)
+        except UnicodeEncodeError:
+            if not messagebox.askyesno(
+                    "Кодировка", f"Текст содержит символы, которых нет в кодировке {encoding}. "
+                                 "Сохранить файл в UTF-8?"):
+                return
+            encoding = "utf-8"
+            chunks, digest = encode_text(text_area, encoding, tab_info.newline)
+        # Правки, сделанные во время записи, снова пометят вкладку
+        tab_info.dirty = False
+        if unchanged_on_disk and digest == tab_info.saved_hash:
+            # Правки отменены и текст снова совпадает с файлом - запись не нужна
+            self.recovery.discard(tab_info.id)
+            return
+        first_line = text_area.get("1.0", "1.end")
+
+        def on_done(error):
+            if error is not None:
+                tab_info.dirty = True
                 messagebox.showerror(
-                    "Ошибка", f"Не удалось сохранить файл: {e}")
+                    "Ошибка", f"Не удалось сохранить файл: {error}")
+                return
+            tab_info.file = file_path
+            tab_info.encoding = encoding
+            tab_info.saved_hash = digest
+            tab_info.disk_stamp = file_stamp(file_path)
+            if self.tabs.get(tab_info.key) is tab_info:
+                self.notebook.tab(tab_info.frame, text=os.path.basename(file_path))
+                # "Сохранить как" могло сменить расширение
+                self.set_language(tab_info, file_path, first_line)
+            if not tab_info.dirty:
+                self.recovery.discard(tab_info.id)
+
+        self.file_writer.write(file_path, chunks, encoding, on_done)
+        if self.write_poll_id is None:
+            self.write_poll_id = self.root.after(50, self.process_write_results)
+
+    def save_and_wait(self, tab_info):
+        # Сохранение вкладки с ожиданием записи (закрытие вкладки, выход);
+        # False - запись не удалась (об ошибке уже сообщено) или файл не выбран
+        self.notebook.select(tab_info.frame)
+        self.get_current_tab()
+        self.save_file()
+        self.file_writer.wait()
+        self.process_write_results()
+        return not tab_info.dirty
+
+    def process_write_results(self):
+        # Результаты фоновой записи обрабатываются в главном потоке
+        self.write_poll_id = None
+        while True:
+            try:
+                on_done, error = self.file_writer.results.get_nowait()
+            except Empty:
+                break
+            on_done(error)
+        if not self.file_writer.idle():
+            self.write_poll_id = self.root.after(50, self.process_write_results)
+
+    def on_text_modified(self, tab_info):
+        # Вкладка изменена: отмечаем ее и планируем снимок в журнал восстановления
+        text_area = tab_info.text
+        if self.tabs.get(tab_info.key) is not tab_info or not text_area.edit_modified():
+            return
+        # Флаг сбрасывается, чтобы событие приходило на каждую правку
+        text_area.edit_modified(False)
+        if tab_info is self.tabs.get(self.notebook.select()):
+            self.queue_highlight()
+            # После правки совпадения пересчитываются только для измененных строк
+            self.find_bar.schedule()
+        if tab_info.loader or tab_info.follower:
+            return
+        tab_info.dirty = True
+        tab_info.journal_dirty = True
+        # Таймер перезапускается на каждую правку: при непрерывном наборе весь текст
+        # не читается из виджета каждые несколько секунд
+        if self.autosave_after_id is not None:
+            self.root.after_cancel(self.autosave_after_id)
+        self.autosave_after_id = self.root.after(AUTOSAVE_DELAY, self.autosave)
+
+    def autosave(self):
+        # Снимки только измененных вкладок пишутся в фоне в каталог восстановления
+        self.autosave_after_id = None
+        for tab_info in self.tabs.values():
+            if tab_info.journal_dirty:
+                tab_info.journal_dirty = False
+                text_area = tab_info.text
+                self.recovery.record(tab_info.id, text_area.get("1.0", "end-1c"),
+                                     tab_info.file, tab_info.encoding,
+                                     self.tab_title(text_area), tab_info.newline)
+
+    def offer_recovery(self):
+        # Восстановление вкладок, оставшихся несохраненными после сбоя
+        entries = self.recovery.entries()
+        if not entries:
+            return
+        if not messagebox.askyesno(
+                "Восстановление", f"Найдено несохраненных вкладок: {len(entries)}. Восстановить?"):
+            self.recovery.clear()
+            return
+        for tab_id, meta in entries:
+            try:
+                text = self.recovery.read(tab_id)
+            except (OSError, UnicodeDecodeError):
+                continue
+            self.add_tab()
+            tab_info = self.get_current_tab()
+            self.set_language(tab_info, meta.get("file"), text.split("\n", 1)[0])
+            tab_info.text.insert("1.0", text)
+            tab_info.text.edit_modified(False)
+            tab_info.history.reset()
+            tab_info.file = meta.get("file")
+            tab_info.encoding = meta.get("encoding")
+            tab_info.newline = meta.get("newline", "\n")
+            self.notebook.tab(self.notebook.select(),
+                              text=meta.get("title") or "Восстановлено")
+            # Восстановленный текст не сохранен: снимок переходит к новой вкладке
+            tab_info.dirty = True
+            tab_info.journal_dirty = True
+            self.recovery.discard(tab_id)
+        self.autosave()
+        self.queue_highlight()
+
+    def session_state(self):
+        # Открытые файлы в порядке вкладок, позиции курсора и прокрутки, активная вкладка
+        tabs = []
+        active = 0
+        current = self.notebook.select()
+        for frame in self.notebook.tabs():
+            tab_info = self.tabs.get(str(frame))
+            if tab_info is None:
+                continue
+            if tab_info.pending:
+                entry = dict(tab_info.pending)
+            elif not tab_info.file:
+                continue
+            elif tab_info.viewer:
+                entry = {"file": tab_info.file, "cursor": f"{tab_info.viewer.top + 1}.0",
+                         "yview": 0.0}
+            else:
+                text_area = tab_info.text
+                entry = {"file": tab_info.file, "cursor": text_area.index(tk.INSERT),
+                         "yview": text_area.yview()[0]}
+            if str(frame) == str(current):
+                active = len(tabs)
+            tabs.append(entry)
+        return {"tabs": tabs, "active": active}
+
+    def restore_session(self, session):
+        # Вкладки сессии создаются пустыми заглушками - время запуска не зависит от их числа
+        if not session or not session.get("tabs"):
+            return
+        initial = list(self.tabs.values())
+        frames = []
+        for entry in session["tabs"]:
+            if not entry.get("file"):
+                continue
+            self.add_tab()
+            tab_info = self.get_current_tab()
+            tab_info.pending = entry
+            self.notebook.tab(self.notebook.select(),
+                              text=os.path.basename(entry["file"]))
+            frames.append(self.notebook.select())
+        if not frames:
+            return
+        # Пустая стартовая вкладка больше не нужна
+        self.remove_blank_tabs(initial)
+        active = min(max(session.get("active", 0), 0), len(frames) - 1)
+        self.notebook.select(frames[active])
+
+    def remove_blank_tabs(self, candidates):
+        # Закрытие пустых безымянных вкладок (стартовой после открытия файлов)
+        for tab_info in candidates:
+            if (self.tabs.get(tab_info.key) is tab_info and not tab_info.file
+                    and not tab_info.pending and not tab_info.viewer
+                    and not tab_info.text.get("1.0", "end-1c")):
+                self.notebook.forget(tab_info.frame)
+                del self.tabs[tab_info.key]
+                tab_info.frame.destroy()
+
+    def open_files(self, file_paths):
+        # Открытие нескольких файлов: вкладки с пометкой загрузки появляются сразу,
+        # файлы читаются и декодируются параллельно в пуле, первым - файл активной вкладки.
+        # Возвращает число созданных вкладок
+        created = []
+        errors = []
+        for file_path in file_paths:
+            try:
+                size = os.path.getsize(file_path)
+            except OSError as e:
+                errors.append(f"{file_path}: {e}")
+                continue
+            self.add_tab()
+            tab_info = self.get_current_tab()
+            tab_info.pending = {"file": file_path}
+            title = os.path.basename(file_path)
+            if size < LARGE_FILE_THRESHOLD:
+                # До заполнения вкладка только для чтения; большие файлы загружаются
+                # порциями при выборе вкладки, как вкладки сессии
+                tab_info.text.config(state="disabled")
+                title += " (загрузка)"
+            self.notebook.tab(tab_info.frame, text=title)
+            created.append((tab_info, size))
+        if errors:
+            messagebox.showerror("Ошибка", "Не удалось открыть файлы:\n" + "\n".join(errors))
+        if not created:
+            return 0
+        # Задания уходят в пул по порядку: активная (первая) вкладка читается первой
+        for tab_info, size in created:
+            if size < LARGE_FILE_THRESHOLD:
+                self.read_in_background(tab_info)
+                self.wait_for_load(tab_info)
+        self.notebook.select(created[0][0].frame)
+        return len(created)
+
+    def read_in_background(self, tab_info):
+        # Чтение файла вкладки с определением кодировки в пуле потоков
+        if self.prefetch_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.prefetch_pool = ThreadPoolExecutor(max_workers=READ_WORKERS)
+        tab_info.prefetch = self.prefetch_pool.submit(
+            self.encoding_detector.read_text, tab_info.pending["file"])
+
+    def wait_for_load(self, tab_info):
+        # Вкладка заполнится при первой проверке после окончания чтения
+        if tab_info not in self.loading_tabs:
+            self.loading_tabs.append(tab_info)
+        if self.load_poll_id is None:
+            self.load_poll_id = self.root.after(LOAD_POLL_INTERVAL, self.poll_loading_tabs)
+
+    def poll_loading_tabs(self):
+        # Прочитанные файлы вставляются по одному за проход, текущая вкладка - первой,
+        # чтобы вставка нескольких файлов подряд не задерживала окно
+        self.load_poll_id = None
+        self.loading_tabs = [tab_info for tab_info in self.loading_tabs
+                             if self.tabs.get(tab_info.key) is tab_info and tab_info.pending]
+        current = self.get_current_tab()
+        ready = [tab_info for tab_info in self.loading_tabs if tab_info.prefetch.done()]
+        if ready:
+            tab_info = current if current in ready else ready[0]
+            self.loading_tabs.remove(tab_info)
+            self.load_pending_tab(tab_info)
+            if tab_info is current:
+                self.queue_highlight()
+                self.find_bar.schedule()
+        if self.loading_tabs:
+            self.load_poll_id = self.root.after(
+                1 if ready else LOAD_POLL_INTERVAL, self.poll_loading_tabs)
+
+    def load_pending_tab(self, tab_info):
+        # Чтение файла вкладки сессии при первом выборе или заполнение открытой вкладки
+        entry, tab_info.pending = tab_info.pending, None
+        prefetched, tab_info.prefetch = tab_info.prefetch, None
+        file_path = entry["file"]
+        text_area = tab_info.text
+        text_area.config(state="normal")
+        try:
+            size = os.path.getsize(file_path)
+            if size >= VIEWER_THRESHOLD:
+                # Заглушка заменяется вкладкой просмотра на том же месте
+                position = self.notebook.index(tab_info.frame)
+                self.notebook.forget(tab_info.frame)
+                del self.tabs[tab_info.key]
+                self.add_viewer_tab(file_path, self.detect_encoding(file_path))
+                self.notebook.insert(position, self.notebook.select())
+                self.get_current_tab().viewer.goto_line(
+                    int(entry.get("cursor", "1.0").split('.')[0]))
+                return
+            if size >= LARGE_FILE_THRESHOLD:
+                self.start_loader(tab_info, file_path, self.detect_encoding(file_path))
+                return
+            if prefetched is not None:
+                text, encoding, newline = prefetched.result()
+            else:
+                text, encoding, newline = self.encoding_detector.read_text(file_path)
+        except Exception as e:
+            self.notebook.tab(tab_info.frame,
+                              text=os.path.basename(file_path) + " (не найден)")
+            messagebox.showerror("Ошибка", f"Не удалось открыть файл: {e}")
+            return
+        self.set_language(tab_info, file_path, text.split("\n", 1)[0])
+        text_area.insert("1.0", text)
+        text_area.edit_modified(False)
+        tab_info.history.reset()
+        self.highlight_worker.reset(tab_info.highlighter)
+        self.notebook.tab(tab_info.frame, text=os.path.basename(file_path))
+        tab_info.file = file_path
+        tab_info.encoding = encoding
+        tab_info.newline = newline
+        tab_info.disk_stamp = file_stamp(file_path)
+        text_area.mark_set(tk.INSERT, entry.get("cursor", "1.0"))
+        text_area.yview_moveto(entry.get("yview", 0.0))
+
+    def prefetch_neighbors(self):
+        # Фоновое чтение соседних незагруженных вкладок, чтобы переключение было мгновенным
+        frames = self.notebook.tabs()
+        current = self.notebook.index(self.notebook.select())
+        for offset in range(-PREFETCH_NEIGHBORS, PREFETCH_NEIGHBORS + 1):
+            position = current + offset
+            if offset == 0 or not 0 <= position < len(frames):
+                continue
+            tab_info = self.tabs.get(str(frames[position]))
+            if not tab_info or not tab_info.pending or tab_info.prefetch:
+                continue
+            file_path = tab_info.pending["file"]
+            try:
+                if os.path.getsize(file_path) >= LARGE_FILE_THRESHOLD:
+                    continue
+            except OSError:
+                continue
+            self.read_in_background(tab_info)
+
+    def toggle_follow(self):
+        # Слежение за дописываемым файлом (журналы): включение и выключение для текущей вкладки
+        tab_info = self.get_current_tab()
+        if not tab_info:
+            return
+        if tab_info.follower:
+            self.stop_follow(tab_info)
+            return
+        if tab_info.viewer or tab_info.loader or tab_info.pending or not tab_info.file:
+            messagebox.showinfo(
+                "Слежение", "Слежение доступно для открытого и полностью загруженного файла")
+            return
+        try:
+            size = os.path.getsize(tab_info.file)
+        except OSError as e:
+            messagebox.showerror("Ошибка", f"Не удалось открыть файл: {e}")
+            return
+        offset = size
+        if not tab_info.dirty:
+            # Текст вкладки совпадает с началом файла - дочитывается все, что дописано после открытия
+            try:
+                loaded = len(tab_info.text.get("1.0", "end-1c").replace(
+                    "\n", tab_info.newline).encode(tab_info.encoding or "utf-8"))
+            except (UnicodeEncodeError, LookupError):
+                loaded = size
+            offset = min(loaded, size)
+        from follow import FileFollower
+        # Дописанный текст и удаление старых строк не отменяются
+        tab_info.history.pause()
+        tab_info.follower = FileFollower(
+            self.root, tab_info.text, tab_info.file, tab_info.encoding, offset,
+            on_trim=lambda count: self.on_follow_trim(tab_info, count),
+            on_stop=lambda: self.stop_follow(tab_info))
+        tab_info.follower.start()
+
+    def on_follow_key(self, event):
+        # Ctrl+T в текстовом поле: только слежение, без перестановки символов
+        self.toggle_follow()
+        return "break"
+
+    def stop_follow(self, tab_info):
+        # Остановка слежения: вкладка снова редактируется как обычный текст
+        if tab_info.follower:
+            tab_info.follower.stop()
+            tab_info.follower = None
+            tab_info.history.resume()
+
+    def on_follow_trim(self, tab_info, count):
+        # Начало текста удалено по лимиту строк: кэш подсветки сдвигается, а не строится заново
+        self.highlight_worker.discard(tab_info.text)
+        self.highlight_worker.drop_head(tab_info.highlighter, count)
+        self.queue_highlight()
+
+    def toggle_perf_overlay(self):
+        # Панель производительности: при показе включается запись замеров
+        recorder.enabled = self.perf_var.get()
+        if recorder.enabled:
+            if self.perf_label is None:
+                self.perf_label = tk.Label(self.root, anchor="w", font=("Courier", 9))
+            self.perf_label.pack(side=tk.BOTTOM, fill=tk.X, before=self.notebook)
+            self.update_perf_overlay()
+        else:
+            self.perf_label.pack_forget()
+            self.highlight_requested_at = None
+            if self.perf_after_id is not None:
+                self.root.after_cancel(self.perf_after_id)
+                self.perf_after_id = None
+
+    def update_perf_overlay(self):
+        # Последняя длительность и p95 основных участков, глубина очередей
+        stats = recorder.stats()
+        parts = []
+        for name in PERF_OVERLAY_SPANS:
+            if name in stats:
+                last, p95, _ = stats[name]
+                parts.append(f"{name} {last:.1f}/{p95:.1f}")
+        parts.append("очереди: подсветка %d, поиск %d, запись %d" % (
+            self.highlight_worker.jobs.qsize(), self.find_bar.worker.jobs.qsize(),
+            self.file_writer.jobs.unfinished_tasks))
+        tab_info = self.get_current_tab()
+        if tab_info and tab_info.history:
+            parts.append("отмена %d КБ" % (tab_info.history.size // 1024))
+        self.perf_label.config(text="мс посл./p95: " + " | ".join(parts))
+        self.perf_after_id = self.root.after(PERF_OVERLAY_INTERVAL, self.update_perf_overlay)
+
+    def dump_perf(self):
+        # Сохранение кольцевого буфера замеров в файл (JSON по строке на замер)
+        if not recorder.spans:
+            messagebox.showinfo("Замеры", "Буфер замеров пуст: включите панель производительности")
+            return
+        from tkinter import filedialog
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".jsonl", filetypes=[("JSON Lines", "*.jsonl"), ("Все файлы", "*.*")])
+        if file_path:
+            try:
+                recorder.dump(file_path)
+            except OSError as e:
+                messagebox.showerror("Ошибка", f"Не удалось сохранить замеры: {e}")
+
+    def profile_highlight(self):
+        # Один цикл подсветки видимой части под cProfile, синхронно в главном потоке
+        tab_info = self.get_current_tab()
+        if not tab_info:
+            return
+        if tab_info.viewer:
+            _, report = profile_call(tab_info.viewer.render)
+        else:
+            text_area = tab_info.text
+            highlighter = tab_info.highlighter
+            top_line = int(text_area.index("@0,0").split('.')[0])
+            bottom_line = int(text_area.index("@0,%d" %
+                              text_area.winfo_height()).split('.')[0])
+            # Поток разбора доделывает свои задания, и кэш вкладки на время замера
+            # переходит главному потоку: профилируется то же инкрементальное обновление
+            # после последней правки, что выполнил бы поток, а не разбор с нуля
+            self.highlight_worker.wait()
+            # Еще не наложенные результаты потока устаревают: их строки разберутся заново
+            self.highlight_worker.discard(text_area)
+            if tab_info.highlight_changes:
+                full, change = tab_info.highlight_changes.take()
+                if change and not full:
+                    highlighter.apply_edit(*change)
+            _, report = profile_call(highlight_range, text_area, highlighter,
+                                     top_line, bottom_line)
+        window = tk.Toplevel(self.root)
+        window.title("Профиль цикла подсветки")
+        report_text = tk.Text(window, wrap="none", font=("Courier", 10))
+        report_text.insert("1.0", report)
+        report_text.config(state="disabled")
+        report_text.pack(expand=True, fill="both")
 
     def exit_app(self):
         # Выход из приложения
+        session = self.session_state()
         for tab_info in self.tabs.values():
-            if tab_info["text"].get("1.0", tk.END).strip():
-                self.text_area = tab_info["text"]
+            if tab_info.follower:
+                self.stop_follow(tab_info)
+            elif tab_info.viewer:
+                tab_info.viewer.close()
+            elif tab_info.text.get("1.0", tk.END).strip():
                 if messagebox.askyesno("Сохранить?", "Хотите сохранить перед выходом?"):
-                    self.save_file()
+                    if not self.save_and_wait(tab_info):
+                        # Выход отменяется, журнал восстановления не удаляется
+                        return
         self.config_manager.save_config({
             "theme": self.current_theme,
             "font_size": self.font_size,
             "geometry": self.root.geometry(),
-            "opacity": self.opacity_scale.get()
+            "opacity": self.opacity_scale.get(),
+            "undo_memory_mb": self.undo_budget / (1024 * 1024),
+            "session": session
         })
+        # Штатный выход, все записи удались: журнал восстановления не нужен.
+        # Новых снимков больше не будет, а уже поставленные в очередь должны
+        # оказаться на диске до того, как clear() перечислит каталог
+        if self.autosave_after_id is not None:
+            self.root.after_cancel(self.autosave_after_id)
+            self.autosave_after_id = None
+        self.file_writer.wait()
+        self.recovery.clear()
+        self.file_writer.wait()
+        # Потоки разбора и поиска завершаются после уже поставленных заданий
+        self.highlight_worker.stop()
+        self.find_bar.worker.stop()
         self.root.quit()
 
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Note - текстовый редактор")
+    parser.add_argument("files", nargs="*", help="файлы для открытия")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="вывести в stderr время импорта модулей и этапов запуска")
+    args = parser.parse_args()
+    startup.enabled = args.profile_startup
     root = tk.Tk()
-    app = Notepad(root)
+    startup.mark("окно Tk")
+    app = Notepad(root, [os.path.abspath(path) for path in args.files])
     root.mainloop()
@@ -0,0 +1,128 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# Сколько последних замеров хранит кольцевой буфер
+RING_SIZE = 4096
+# Сколько строк отчета профилировщика показывается
+PROFILE_LINES = 40
+# Модули, импорт которых отложен до первого использования (проверяются в отчете о запуске)
+DEFERRED_MODULES = ["chardet", "concurrent.futures", "cProfile", "pstats", "tempfile",
+                    "tkinter.filedialog", "tkinter.simpledialog", "find_in_files", "bulk_edit",
+                    "follow", "ctypes"]
+
+
+class _NullSpan:
+    # Общий пустой замер: при выключенной записи не создается ни одного объекта
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("recorder", "name", "start")
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class PerfRecorder:
+    def __init__(self, size=RING_SIZE):
+        # Запись включается панелью производительности или переменной NOTE_PERF=1
+        self.enabled = bool(os.environ.get("NOTE_PERF"))
+        # deque с maxlen: добавление из любого потока, старые замеры вытесняются
+        self.spans = deque(maxlen=size)
+
+    def span(self, name):
+        """Контекстный менеджер замера участка кода"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, start, end):
+        self.spans.append((name, start, end, threading.current_thread().name))
+
+    def clear(self):
+        self.spans.clear()
+
+    def stats(self):
+        """По каждому имени: последняя длительность, p95 и число замеров (мс)"""
+        durations = {}
+        for name, start, end, _ in list(self.spans):
+            durations.setdefault(name, []).append((end - start) * 1000)
+        result = {}
+        for name, values in sorted(durations.items()):
+            ordered = sorted(values)
+            result[name] = (values[-1], ordered[int((len(ordered) - 1) * 0.95)], len(values))
+        return result
+
+    def dump(self, path):
+        """Запись буфера в файл: по одному JSON-объекту на строку"""
+        import json
+        with open(path, "w", encoding="utf-8") as f:
+            for name, start, end, thread in list(self.spans):
+                f.write(json.dumps({"name": name, "start": start,
+                                    "duration_ms": round((end - start) * 1000, 4),
+                                    "thread": thread}, ensure_ascii=False) + "\n")
+
+
+def profile_call(func, *args):
+    """Выполнение func под cProfile: (результат, текстовый отчет)"""
+    # Профилировщик нужен редко, а pstats тянет за собой много модулей
+    import cProfile
+    import io
+    import pstats
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func, *args)
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_LINES)
+    return result, report.getvalue()
+
+
+class StartupProfile:
+    """Отметки этапов запуска: импорт модулей, создание окна, интерфейс, сессия"""
+    def __init__(self):
+        # Отсчет идет от импорта этого модуля - note.py импортирует его первым
+        self.start = time.perf_counter()
+        self.marks = []
+        # Отчет печатается только с ключом --profile-startup
+        self.enabled = False
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter()))
+
+    def report(self):
+        """Текст отчета: длительность каждого этапа и время от начала запуска (мс)"""
+        lines = [f"{'этап':<32}{'мс':>9}{'всего':>10}"]
+        previous = self.start
+        for name, moment in self.marks:
+            lines.append(f"{name:<32}{(moment - previous) * 1000:9.1f}"
+                         f"{(moment - self.start) * 1000:10.1f}")
+            previous = moment
+        loaded = [name for name in DEFERRED_MODULES if name in sys.modules]
+        deferred = [name for name in DEFERRED_MODULES if name not in sys.modules]
+        lines.append("не загружены: " + (", ".join(deferred) or "-"))
+        lines.append("загружены: " + (", ".join(loaded) or "-"))
+        return "\n".join(lines)
+
+
+# Общий регистратор: замеры пишут и главный поток, и фоновые
+recorder = PerfRecorder()
+# Замеры запуска редактора
+startup = StartupProfile()
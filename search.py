@@ -0,0 +1,348 @@
+import re
+import threading
+import tkinter as tk
+from bisect import bisect_left, bisect_right
+from queue import Queue, Empty
+
+from perf import recorder
+
+# Задержка поиска при наборе (мс)
+SEARCH_DELAY = 150
+
+
+def compile_pattern(text, regex=False, case=False, word=False, multiline=False):
+    """Компиляция шаблона поиска с учетом опций; при ошибке в regex - re.error.
+
+    multiline - шаблон применяется ко всему тексту, а не к одной строке:
+    ^ и $ совпадают на границах каждой строки"""
+    pattern = text if regex else re.escape(text)
+    if word:
+        pattern = r"\b(?:" + pattern + r")\b"
+    flags = 0 if case else re.IGNORECASE
+    if multiline:
+        flags |= re.MULTILINE
+    return re.compile(pattern, flags)
+
+
+class SearchIndex:
+    def __init__(self):
+        self.pattern = None
+        self.lines = []
+        # Отсортированный список совпадений (строка с 1, начало, конец)
+        self.matches = []
+        # Главный поток: измененные строки текста (history.ChangeTracker) и шаблон,
+        # с которым отправлено последнее задание
+        self.changes = None
+        self.submitted = None
+
+    def update(self, pattern, lines):
+        """Пересчет совпадений: ищем заново только строки между общим началом и концом"""
+        matches = self.matches
+        if pattern != self.pattern:
+            # Другой шаблон: прежние совпадения не годятся, строки ищутся все заново
+            self.lines = []
+            self.pattern = pattern
+            matches = []
+        old = self.lines
+        prefix = 0
+        limit = min(len(old), len(lines))
+        while prefix < limit and old[prefix] == lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while (suffix < limit - prefix
+               and old[len(old) - 1 - suffix] == lines[len(lines) - 1 - suffix]):
+            suffix += 1
+        self._replace(pattern, matches, prefix + 1, len(old) - prefix - suffix,
+                      lines[prefix:len(lines) - suffix])
+
+    def splice(self, pattern, first_line, removed, lines):
+        """Известная правка: строки first_line..first_line+removed-1 заменены строками lines"""
+        if pattern != self.pattern:
+            # Индекс построен для другого шаблона - за правкой следует полный пересчет
+            return
+        self._replace(pattern, self.matches, first_line, removed, lines)
+
+    def _replace(self, pattern, matches, first_line, removed, lines):
+        first_line = min(first_line, len(self.lines) + 1)
+        removed = min(removed, len(self.lines) - first_line + 1)
+        delta = len(lines) - removed
+        head_end = bisect_left(matches, (first_line,))
+        tail_start = bisect_left(matches, (first_line + removed,))
+        middle = []
+        for offset, line in enumerate(lines):
+            for match in pattern.finditer(line):
+                if match.end() > match.start():
+                    middle.append((first_line + offset, match.start(), match.end()))
+        tail = [(line_no + delta, start, end)
+                for line_no, start, end in matches[tail_start:]]
+        # Список заменяется целиком, чтобы главный поток видел согласованное состояние
+        self.matches = matches[:head_end] + middle + tail
+        self.lines[first_line - 1:first_line - 1 + removed] = lines
+
+    def clear(self):
+        self.pattern = None
+        self.lines = []
+        self.matches = []
+        self.submitted = None
+
+    def position(self, line, col, backwards=False):
+        """Индекс ближайшего совпадения после (или до) позиции"""
+        matches = self.matches
+        if not matches:
+            return None
+        if backwards:
+            return (bisect_left(matches, (line, col)) - 1) % len(matches)
+        return bisect_right(matches, (line, col, col)) % len(matches)
+
+    def visible(self, first_line, last_line):
+        """Совпадения в диапазоне строк"""
+        matches = self.matches
+        return matches[bisect_left(matches, (first_line,)):bisect_left(matches, (last_line + 1,))]
+
+
+class SearchWorker:
+    def __init__(self):
+        # Поиск по снимку текста в фоновом потоке; с Tk поток не работает
+        self.jobs = Queue()
+        self.results = Queue()
+        self.generation = 0
+        self.latest = {}
+        # Последнее поколение полного снимка: более старые полные снимки можно пропустить,
+        # а правки применяются всегда, иначе индекс разойдется с текстом
+        self.latest_full = {}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, target, index, pattern, text):
+        """Полный снимок текста"""
+        self.generation += 1
+        self.latest[target] = self.generation
+        self.latest_full[target] = self.generation
+        self.jobs.put((target, index, self.generation, pattern, text))
+        return self.generation
+
+    def submit_change(self, target, index, pattern, first_line, removed, lines):
+        """Только измененные строки (first_line, removed - см. SearchIndex.splice)"""
+        self.generation += 1
+        self.latest[target] = self.generation
+        self.jobs.put((target, index, self.generation, pattern, (first_line, removed, lines)))
+        return self.generation
+
+    def is_current(self, target, generation):
+        return self.latest.get(target) == generation
+
+    def discard(self, target):
+        self.latest.pop(target, None)
+        self.latest_full.pop(target, None)
+
+    def stop(self):
+        self.jobs.put(None)
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            target, index, generation, pattern, text = job
+            if isinstance(text, tuple):
+                with recorder.span("search.update"):
+                    index.splice(pattern, *text)
+            elif self.latest_full.get(target) != generation:
+                continue
+            else:
+                with recorder.span("search.update"):
+                    index.update(pattern, text.split("\n"))
+            self.results.put((target, generation))
+
+
+class FindBar:
+    def __init__(self, app):
+        self.app = app
+        self.worker = SearchWorker()
+        self.visible = False
+        self._after_id = None
+        self._poll_id = None
+        self._tagged = {}
+        # Вкладки, для которых ждем результат поиска
+        self._pending = set()
+        # Виджеты панели создаются при первом показе
+        self.frame = None
+
+    def _build(self):
+        app = self.app
+        self.frame = tk.Frame(app.root)
+        tk.Label(self.frame, text="Найти:").pack(side=tk.LEFT, padx=5)
+        self.query = tk.StringVar()
+        self.entry = tk.Entry(self.frame, textvariable=self.query)
+        self.entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2, pady=2)
+        self.entry_bg = self.entry.cget("bg")
+        self.case_var = tk.BooleanVar()
+        self.word_var = tk.BooleanVar()
+        self.regex_var = tk.BooleanVar()
+        for text, var in (("Aa", self.case_var), ("Слово", self.word_var), (".*", self.regex_var)):
+            tk.Checkbutton(self.frame, text=text, variable=var,
+                           command=self.schedule).pack(side=tk.LEFT)
+        tk.Button(self.frame, text="▲", command=lambda: self.goto_match(backwards=True),
+                  bg="gray", fg="lightgray").pack(side=tk.LEFT, padx=2)
+        tk.Button(self.frame, text="▼", command=self.goto_match,
+                  bg="gray", fg="lightgray").pack(side=tk.LEFT, padx=2)
+        self.count_label = tk.Label(self.frame, width=14)
+        self.count_label.pack(side=tk.LEFT, padx=5)
+        tk.Button(self.frame, text="✕", command=self.hide,
+                  bg="gray", fg="lightgray").pack(side=tk.LEFT, padx=2)
+
+        self.query.trace_add("write", lambda *args: self.schedule())
+        self.entry.bind("<Return>", lambda event: self.goto_match())
+        self.entry.bind("<Shift-Return>", lambda event: self.goto_match(backwards=True))
+        self.entry.bind("<Escape>", lambda event: self.hide())
+
+    def show(self):
+        if self.frame is None:
+            self._build()
+        if not self.visible:
+            self.frame.pack(side=tk.BOTTOM, fill=tk.X, before=self.app.notebook)
+            self.visible = True
+        self.entry.focus_set()
+        self.entry.select_range(0, tk.END)
+        self.schedule()
+
+    def hide(self):
+        self.frame.pack_forget()
+        self.visible = False
+        for text_area in list(self._tagged):
+            if text_area.winfo_exists():
+                text_area.tag_remove("search", "1.0", tk.END)
+        self._tagged.clear()
+        tab_info = self.app.get_current_tab()
+        if tab_info:
+            tab_info.text.focus_set()
+
+    def schedule(self, event=None):
+        """Отложенный поиск: при наборе и после правок текста"""
+        if not self.visible:
+            return
+        if self._after_id is not None:
+            self.app.root.after_cancel(self._after_id)
+        self._after_id = self.app.root.after(SEARCH_DELAY, self.search)
+
+    def compile(self):
+        try:
+            pattern = compile_pattern(self.query.get(), self.regex_var.get(),
+                                      self.case_var.get(), self.word_var.get())
+        except re.error:
+            self.entry.config(bg="#FF8080")
+            return None
+        self.entry.config(bg=self.entry_bg)
+        return pattern
+
+    def search(self):
+        # Снимок текста уходит в фоновый поток, результат забирается опросом
+        self._after_id = None
+        tab_info = self.app.get_current_tab()
+        if not tab_info or tab_info.viewer:
+            return
+        if tab_info.search_index is None:
+            tab_info.search_index = SearchIndex()
+            if tab_info.history:
+                tab_info.search_index.changes = tab_info.history.track()
+        index = tab_info.search_index
+        text_area = tab_info.text
+        if not self.query.get():
+            index.clear()
+            self.worker.discard(text_area)
+            self._pending.discard(text_area)
+            self.tag_visible()
+            return
+        pattern = self.compile()
+        if pattern is None:
+            return
+        full, change = index.changes.take() if index.changes else (True, None)
+        if full or pattern != index.submitted:
+            self.worker.submit(text_area, index, pattern, text_area.get("1.0", "end-1c"))
+        elif change:
+            # После правки из виджета читаются только измененные строки
+            first_line, removed, added = change
+            lines = text_area.get(f"{first_line}.0",
+                                  f"{first_line + added - 1}.end").split("\n")
+            self.worker.submit_change(text_area, index, pattern, first_line, removed, lines)
+        else:
+            self.tag_visible()
+            return
+        index.submitted = pattern
+        self._pending.add(text_area)
+        if self._poll_id is None:
+            self._poll_id = self.app.root.after(10, self._poll_results)
+
+    def _poll_results(self):
+        self._poll_id = None
+        done = False
+        while True:
+            try:
+                text_area, generation = self.worker.results.get_nowait()
+            except Empty:
+                break
+            if self.worker.is_current(text_area, generation):
+                self._pending.discard(text_area)
+                done = True
+        if done:
+            self.tag_visible()
+        if self._pending:
+            self._poll_id = self.app.root.after(10, self._poll_results)
+
+    def tag_visible(self):
+        """Подсветка только видимых совпадений и обновление счетчика"""
+        tab_info = self.app.get_current_tab()
+        if not tab_info or tab_info.viewer or tab_info.search_index is None:
+            return
+        text_area = tab_info.text
+        index = tab_info.search_index
+        top_line = int(text_area.index("@0,0").split('.')[0])
+        bottom_line = int(text_area.index("@0,%d" % text_area.winfo_height()).split('.')[0])
+        previous = self._tagged.get(text_area)
+        if previous:
+            text_area.tag_remove("search", f"{previous[0]}.0", f"{previous[1]}.end")
+        text_area.tag_remove("search", f"{top_line}.0", f"{bottom_line}.end")
+        indices = []
+        for line_no, start, end in index.visible(top_line, bottom_line):
+            indices += (f"{line_no}.{start}", f"{line_no}.{end}")
+        if indices:
+            text_area.tk.call(text_area._w, "tag", "add", "search", *indices)
+        self._tagged[text_area] = (top_line, bottom_line)
+        self.update_count(index)
+
+    def update_count(self, index, current=None):
+        total = len(index.matches)
+        if not self.query.get():
+            self.count_label.config(text="")
+        elif current is None:
+            self.count_label.config(text=f"{total} совп.")
+        else:
+            self.count_label.config(text=f"{current + 1} из {total}")
+
+    def goto_match(self, backwards=False):
+        """Переход к следующему/предыдущему совпадению от курсора"""
+        tab_info = self.app.get_current_tab()
+        if not tab_info:
+            return "break"
+        if tab_info.viewer:
+            if self.query.get() and not tab_info.viewer.find(self.query.get()):
+                self.count_label.config(text="Не найдено")
+            return "break"
+        index = tab_info.search_index
+        if index is None or not index.matches:
+            return "break"
+        text_area = tab_info.text
+        line, col = map(int, text_area.index(tk.INSERT).split('.'))
+        if backwards and text_area.tag_ranges("sel"):
+            # Курсор стоит в конце выделенного совпадения - ищем до его начала
+            line, col = map(int, text_area.index("sel.first").split('.'))
+        position = index.position(line, col, backwards)
+        line_no, start, end = index.matches[position]
+        text_area.tag_remove("sel", "1.0", tk.END)
+        text_area.tag_add("sel", f"{line_no}.{start}", f"{line_no}.{end}")
+        text_area.mark_set(tk.INSERT, f"{line_no}.{end}")
+        text_area.see(tk.INSERT)
+        self.tag_visible()
+        self.update_count(index, position)
+        self.app.queue_highlight()
+        return "break"
@@ -0,0 +1,151 @@
+import os
+import random
+import re
+
+import pytest
+
+import bulk_edit
+from bulk_edit import (BulkJob, Cancelled, changed_span, filter_lines, join_lines, replace_all,
+                       sort_lines, split_lines, unique_lines)
+from search import compile_pattern
+
+
+def test_literal_replacement_is_inserted_unchanged():
+    pattern = compile_pattern("x")
+    assert replace_all("axb", pattern, r"C:\path") == (r"aC:\pathb", 1)
+    assert replace_all("axb", pattern, r"\n") == (r"a\nb", 1)
+
+
+def test_regex_replacement_expands_groups_and_escapes():
+    pattern = compile_pattern(r"(\d+)-(\d+)", regex=True)
+    assert replace_all("1-2 3-4", pattern, r"\2\n\1", regex=True) == ("2\n1 4\n3", 2)
+
+
+def test_line_anchors_match_every_line():
+    pattern = compile_pattern(r"^\s+|\s+$", regex=True, multiline=True)
+    assert replace_all("  a  \n b \nc", pattern, "", regex=True) == ("a\nb\nc", 4)
+    pattern = compile_pattern("^", regex=True, multiline=True)
+    assert replace_all("a\nb", pattern, "> ", regex=True) == ("> a\n> b", 2)
+
+
+def test_replace_all_matches_re_sub():
+    rng = random.Random(17)
+    for _ in range(2000):
+        text = "".join(rng.choice("ab\nc1 ") for _ in range(rng.randint(0, 40)))
+        pattern = re.compile(rng.choice(["a", "b+", "\n", "^", "$", "a|", r"(\d)", "x*"]), re.M)
+        template = r"<\1>" if pattern.groups else rng.choice(["", "Z", r"\t"])
+        assert replace_all(text, pattern, template, regex=True) == pattern.subn(template, text)
+
+
+def test_replace_all_checks_for_cancel(monkeypatch):
+    monkeypatch.setattr(bulk_edit, "BULK_STEP", 2)
+
+    def check(done, total):
+        raise Cancelled()
+
+    with pytest.raises(Cancelled):
+        replace_all("aaaa", compile_pattern("a"), "b", check=check)
+
+
+def test_split_and_join_keep_trailing_newline():
+    assert split_lines("b\na\n") == (["b", "a"], True)
+    assert split_lines("") == ([""], False)
+    assert join_lines(["a", "b"], True) == "a\nb\n"
+    assert join_lines([], True) == ""
+
+
+def test_sort_lines_options():
+    lines = ["b", "A", "10 x", "9 y", "a"]
+    assert sort_lines(lines) == ["10 x", "9 y", "A", "a", "b"]
+    assert sort_lines(lines, case=False) == ["10 x", "9 y", "A", "a", "b"]
+    assert sort_lines(lines, reverse=True) == ["b", "a", "A", "9 y", "10 x"]
+    assert sort_lines(lines, numeric=True) == ["9 y", "10 x", "A", "a", "b"]
+
+
+def test_unique_lines_is_exact_by_default():
+    lines = ["Error", "error", "b", "Error", "b"]
+    assert unique_lines(lines) == ["Error", "error", "b"]
+    assert unique_lines(lines, case=False) == ["Error", "b"]
+
+
+def test_filter_lines_keep_and_drop():
+    pattern = compile_pattern("warn")
+    lines = ["WARN a", "info", "warning b"]
+    assert filter_lines(lines, pattern) == ["WARN a", "warning b"]
+    assert filter_lines(lines, pattern, keep=False) == ["info"]
+
+
+def test_changed_span_is_minimal(monkeypatch):
+    # Маленький блок, чтобы проверить и сравнение блоками, и поиск внутри блока
+    monkeypatch.setattr(bulk_edit, "COMPARE_BLOCK", 7)
+    rng = random.Random(19)
+    for _ in range(2000):
+        old = "".join(rng.choice("ab") for _ in range(rng.randint(0, 60)))
+        chars = list(old)
+        for _ in range(rng.randint(0, 3)):
+            pos = rng.randint(0, len(chars))
+            chars[pos:pos + rng.randint(0, 3)] = rng.choice(["", "a", "bb"])
+        new = "".join(chars)
+        span = changed_span(old, new)
+        if span is None:
+            assert old == new
+            continue
+        start, old_end, new_end = span
+        assert old[:start] + new[start:new_end] + old[old_end:] == new
+        assert start == len(os.path.commonprefix([old, new]))
+        assert old[old_end:] == new[new_end:]
+
+
+def apply_edit(full, edit):
+    # Применение результата BulkJob (позиции Tk) к строке
+    def offset(index):
+        line, col = map(int, index.split("."))
+        return sum(len(text) + 1 for text in full.split("\n")[:line - 1]) + col
+
+    start, end, text = edit
+    return full[:offset(start)] + text + full[offset(end):]
+
+
+def test_job_edit_for_selection_in_the_middle_of_a_line():
+    full = "keep\nxx a-a\na-a yy\n"
+    # Выделение начинается в строке 2 со столбца 3
+    job = BulkJob("replace", "a-a\na-a", (2, 3), compile_pattern("-"), "+")
+    job.start()
+    job.thread.join()
+    assert job.count == 2
+    assert apply_edit(full, job.edit) == "keep\nxx a+a\na+a yy\n"
+
+
+def test_job_sorts_and_reports_removed_lines():
+    text = "c\na\nb\na\n"
+    job = BulkJob("unique", text, (1, 0))
+    job.start()
+    job.thread.join()
+    assert job.count == 1
+    assert apply_edit(text, job.edit) == "c\na\nb\n"
+    job = BulkJob("sort", text, (1, 0))
+    job.start()
+    job.thread.join()
+    assert apply_edit(text, job.edit) == "a\na\nb\nc\n"
+
+
+def test_job_without_changes_has_no_edit():
+    job = BulkJob("replace", "abc", (1, 0), compile_pattern("x"), "y")
+    job.start()
+    job.thread.join()
+    assert job.done and job.edit is None and job.count == 0
+
+
+def test_cancelled_job_has_no_edit():
+    job = BulkJob("sort", "b\na", (1, 0))
+    job.cancel()
+    job.start()
+    job.thread.join()
+    assert job.done and job.edit is None
+
+
+def test_bad_group_reference_is_reported():
+    job = BulkJob("replace", "abc", (1, 0), compile_pattern("b"), r"\1", regex=True)
+    job.start()
+    job.thread.join()
+    assert job.error and job.edit is None
@@ -0,0 +1,40 @@
+from autosave import encode_text
+from encoding_detector import EncodingDetector, detect_newline, translate_newlines
+
+
+class LinesText:
+    # Минимум текстового поля, нужный encode_text: index("end-1c") и get по строкам
+    def __init__(self, text):
+        self.lines = text.split("\n")
+
+    def index(self, index):
+        return "%d.%d" % (len(self.lines), len(self.lines[-1]))
+
+    def get(self, start, end):
+        first = int(start.split(".")[0])
+        last = len(self.lines) + 1 if end == "end-1c" else int(end.split(".")[0])
+        text = "\n".join(self.lines[first - 1:last - 1])
+        return text + "\n" if end != "end-1c" else text
+
+
+def test_detect_newline_uses_first_line_break():
+    assert detect_newline("a\r\nb\nc") == "\r\n"
+    assert detect_newline("a\nb\r\n") == "\n"
+    assert detect_newline("a\rb\n") == "\r"
+    assert detect_newline("abc") is None
+
+
+def test_translate_newlines_leaves_only_lf():
+    assert translate_newlines("a\r\nb\rc\n") == ("a\nb\nc\n", "\r\n")
+
+
+def test_read_text_normalizes_and_encode_text_restores(tmp_path):
+    for newline in ("\r\n", "\r", "\n"):
+        path = tmp_path / "file.txt"
+        original = newline.join(["первая", "вторая", "", "последняя"]).encode("utf-8")
+        path.write_bytes(original)
+        text, encoding, detected = EncodingDetector().read_text(str(path))
+        assert "\r" not in text
+        assert detected == newline
+        chunks, _ = encode_text(LinesText(text), encoding, detected, chunk_lines=2)
+        assert b"".join(chunks) == original
@@ -0,0 +1,36 @@
+from encoding_detector import EncodingDetector
+from find_in_files import FileSearchEngine, find_hits
+from search import compile_pattern
+
+
+def run_engine(pattern, snapshots, directory=None):
+    engine = FileSearchEngine(EncodingDetector(), pattern, snapshots, directory, literal=False)
+    engine.start()
+    engine.thread.join()
+    hits = []
+    while not engine.results.empty():
+        hits.extend(engine.results.get())
+    return hits
+
+
+def test_line_anchors_match_every_line():
+    pattern = compile_pattern(r"^\d+$", regex=True, multiline=True)
+    hits = find_hits("1\nx2\n34\n", pattern)
+    assert [(hit.line_no, hit.col, hit.line) for hit in hits] == [(1, 0, "1"), (3, 0, "34")]
+
+
+def test_crlf_files_match_like_open_tabs(tmp_path):
+    (tmp_path / "a.txt").write_bytes(b"first 1\r\nsecond 22\r\nthird\r\n")
+    pattern = compile_pattern(r"\d+$", regex=True, multiline=True)
+    hits = run_engine(pattern, [], str(tmp_path))
+    assert [(hit.line_no, hit.col, hit.line) for hit in hits] == [(1, 6, "first 1"),
+                                                                  (2, 7, "second 22")]
+
+
+def test_tab_without_text_is_searched_on_disk(tmp_path):
+    # Незагруженная вкладка сессии: текста в памяти нет, регулярное выражение ищется в файле
+    path = tmp_path / "session.txt"
+    path.write_text("alpha\nbeta 42\n", encoding="utf-8")
+    pattern = compile_pattern(r"\d+", regex=True, multiline=True)
+    hits = run_engine(pattern, [(None, str(path), None)])
+    assert [(hit.path, hit.line_no, hit.col) for hit in hits] == [(str(path), 2, 5)]
@@ -0,0 +1,209 @@
+import random
+
+from highlighter import NORMAL, HighlightWorker, IncrementalHighlighter, SyntaxTokenizer
+
+RULES = [("comment", r"#[^\n]*"), ("string", r'"[^"\n]*"'), ("keyword", r"\b(?:def|if)\b"),
+         ("number", r"\d+")]
+MULTILINE = [('"""', '"""', "string")]
+
+
+def tokenizer():
+    return SyntaxTokenizer(RULES, MULTILINE)
+
+
+def full_tokenize(tok, lines):
+    # Эталон: разбор всех строк подряд без кэша
+    state = NORMAL
+    result = []
+    for line in lines:
+        spans, state = tok.tokenize_line(line, state)
+        result.append(spans)
+    return result
+
+
+def test_tokenize_line_rules_in_priority_order():
+    spans, state = tokenizer().tokenize_line('def f(x): return "# no" # 42')
+    assert spans == [("keyword", 0, 3), ("string", 17, 23), ("comment", 24, 28)]
+    assert state is NORMAL
+
+
+def test_tokenize_line_multiline_string_carries_state():
+    tok = tokenizer()
+    spans, state = tok.tokenize_line('x = """start', NORMAL)
+    assert spans == [("string", 4, 12)]
+    assert state == 0
+    spans, state = tok.tokenize_line("inside 42", state)
+    assert spans == [("string", 0, 9)]
+    assert state == 0
+    spans, state = tok.tokenize_line('end""" 7', state)
+    assert spans == [("string", 0, 6), ("number", 7, 8)]
+    assert state is NORMAL
+
+
+def test_tokenizer_without_rules_returns_no_spans():
+    assert SyntaxTokenizer([]).tokenize_line("def 1") == ([], NORMAL)
+
+
+def test_update_reparses_only_changed_lines():
+    highlighter = IncrementalHighlighter(tokenizer())
+    lines = ["def a", "x = 1", "# c", "if 2"]
+    changed = highlighter.update(1, lines, len(lines))
+    assert [line_no for line_no, _, _ in changed] == [1, 2, 3, 4]
+    lines[1] = "x = 22"
+    changed = highlighter.update(1, lines, len(lines))
+    assert [(line_no, previous) for line_no, _, previous in changed] == [(2, None)]
+    assert highlighter.spans_for(2) == [("number", 4, 6)]
+    assert highlighter.update(1, lines, len(lines)) == []
+
+
+def test_update_opening_multiline_string_reparses_following_lines():
+    tok = tokenizer()
+    highlighter = IncrementalHighlighter(tok)
+    lines = ["a = 1", "b = 2", "c = 3"]
+    highlighter.update(1, lines, len(lines))
+    lines[0] = 'a = """'
+    highlighter.update(1, lines, len(lines))
+    assert [highlighter.spans_for(n) for n in (1, 2, 3)] == full_tokenize(tok, lines)
+
+
+def test_cache_matches_full_parse_after_random_edits():
+    tok = tokenizer()
+    rng = random.Random(7)
+    pieces = ["def", "x", "1", '"s"', "# c", '"""', "if", " "]
+    lines = [" ".join(rng.choice(pieces) for _ in range(3)) for _ in range(30)]
+    highlighter = IncrementalHighlighter(tok)
+    highlighter.update(1, lines, len(lines))
+    for _ in range(200):
+        line_no = rng.randrange(len(lines))
+        action = rng.random()
+        if action < 0.6:
+            lines[line_no] = " ".join(rng.choice(pieces) for _ in range(3))
+        elif action < 0.8:
+            lines.insert(line_no, rng.choice(pieces))
+        elif len(lines) > 1:
+            del lines[line_no]
+        # Как в редакторе: текст передается начиная с scan_start
+        first_line = highlighter.scan_start(1)
+        highlighter.update(first_line, lines[first_line - 1:], len(lines))
+        expected = full_tokenize(tok, lines)
+        assert [highlighter.spans_for(n + 1) for n in range(len(lines))] == expected
+
+
+def test_apply_edit_keeps_cache_exact_for_known_edits():
+    tok = tokenizer()
+    rng = random.Random(13)
+    pieces = ["def", "x", "2", '"s"', "# c", '"""', "if"]
+    lines = [rng.choice(pieces) for _ in range(40)]
+    highlighter = IncrementalHighlighter(tok)
+    highlighter.update(1, lines, len(lines))
+    for _ in range(300):
+        # Правка из истории: строки first..first+removed-1 заменены added строками
+        first = rng.randint(1, len(lines))
+        removed = rng.randint(1, min(3, len(lines) - first + 1))
+        added = [rng.choice(pieces) for _ in range(rng.randint(1, 3))]
+        lines[first - 1:first - 1 + removed] = added
+        highlighter.apply_edit(first, removed, len(added))
+        # Экран может быть выше или ниже правки
+        top = rng.randint(1, len(lines))
+        bottom = min(len(lines), top + 10)
+        first_line = highlighter.scan_start(top)
+        highlighter.update(first_line, lines[first_line - 1:bottom], len(lines))
+        expected = full_tokenize(tok, lines)
+        for line_no in range(1, bottom + 1):
+            assert highlighter.spans_for(line_no) == expected[line_no - 1]
+
+
+def test_scan_states_matches_tokenize_line():
+    tok = tokenizer()
+    rng = random.Random(23)
+    pieces = ['"""', "x", "# c", '"a"', "1", " ", ""]
+    for _ in range(300):
+        lines = ["".join(rng.choice(pieces) for _ in range(4))
+                 for _ in range(rng.randint(0, 30))]
+        state = rng.choice([NORMAL, 0])
+        expected = []
+        for line in lines:
+            state_out = tok.tokenize_line(line, state if not expected else expected[-1])[1]
+            expected.append(state_out)
+        assert tok.scan_states(lines, state) == expected
+
+
+def test_cold_cache_without_multiline_rules_starts_at_viewport():
+    tok = SyntaxTokenizer([("number", r"\d+")])
+    highlighter = IncrementalHighlighter(tok)
+    lines = [str(n) for n in range(1000)]
+    assert highlighter.scan_start(990) == 990
+    changed = highlighter.update(990, lines[989:], len(lines))
+    assert [line_no for line_no, _, _ in changed] == list(range(990, 1001))
+    # Прокрутка вверх: строки выше разбираются, когда становятся видимыми
+    changed = highlighter.update(10, lines[9:20], len(lines))
+    assert [line_no for line_no, _, _ in changed] == list(range(10, 21))
+    assert highlighter.spans_for(10) == [("number", 0, 1)]
+
+
+def test_lines_above_viewport_only_carry_state():
+    tok = tokenizer()
+    highlighter = IncrementalHighlighter(tok)
+    lines = ["x = 1"] * 500 + ['s = """', "inside 1", '"""', "y = 2"]
+    first_line = highlighter.scan_start(501)
+    assert first_line == 1
+    changed = highlighter.update(first_line, lines, len(lines), top_line=501)
+    assert [line_no for line_no, _, _ in changed] == [501, 502, 503, 504]
+    assert [spans for _, spans, _ in changed] == full_tokenize(tok, lines)[500:]
+    # Строки выше экрана не подсвечены: при прокрутке к ним они возвращаются
+    changed = highlighter.update(highlighter.scan_start(10), lines[9:20], len(lines))
+    assert [line_no for line_no, _, _ in changed] == list(range(10, 21))
+
+
+def test_visible_tags_match_full_parse_while_scrolling_and_editing():
+    for rules, multiline in ((RULES, MULTILINE), (RULES, ())):
+        tok = SyntaxTokenizer(rules, multiline)
+        rng = random.Random(29)
+        pieces = ["def", "x", "2", '"s"', "# c", '"""', "if"]
+        lines = [rng.choice(pieces) for _ in range(200)]
+        highlighter = IncrementalHighlighter(tok)
+        # Теги так, как их хранит Tk: по номерам строк; у измененных строк - мусор
+        tags = {}
+        for _ in range(400):
+            if rng.random() < 0.4:
+                first = rng.randint(1, len(lines))
+                removed = rng.randint(1, min(3, len(lines) - first + 1))
+                added = [rng.choice(pieces) for _ in range(rng.randint(1, 3))]
+                lines[first - 1:first - 1 + removed] = added
+                shifted = {}
+                for line_no, spans in tags.items():
+                    if line_no < first:
+                        shifted[line_no] = spans
+                    elif line_no >= first + removed:
+                        shifted[line_no + len(added) - removed] = spans
+                for line_no in range(first, first + len(added)):
+                    shifted[line_no] = "garbage"
+                tags = shifted
+                highlighter.apply_edit(first, removed, len(added))
+            top = rng.randint(1, len(lines))
+            bottom = min(len(lines), top + 15)
+            first_line = highlighter.scan_start(top)
+            if multiline:
+                first_line = min(first_line, top)
+            for line_no, spans, previous in highlighter.update(
+                    first_line, lines[first_line - 1:bottom], len(lines), top):
+                assert previous is None or tags.get(line_no) == previous
+                tags[line_no] = spans
+            expected = full_tokenize(tok, lines)
+            for line_no in range(top, bottom + 1):
+                assert tags.get(line_no) == expected[line_no - 1], (multiline, line_no)
+
+
+def test_worker_wait_hands_the_cache_to_the_caller():
+    worker = HighlightWorker()
+    highlighter = IncrementalHighlighter(tokenizer())
+    lines = ['x = "a"', '"""', "doc", '"""'] * 50
+    worker.submit("text", highlighter, 1, lines, len(lines))
+    worker.wait()
+    # Задание разобрано: кэш заполнен, результат ждет главный поток
+    assert highlighter.spans_for(len(lines)) == full_tokenize(tokenizer(), lines)[-1]
+    assert worker.results.get_nowait()[3]
+    worker.stop()
+    worker.wait()
+    worker.thread.join(timeout=1)
+    assert not worker.thread.is_alive()
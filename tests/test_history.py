@@ -0,0 +1,218 @@
+import random
+import re
+import tkinter
+
+from history import ChangeTracker, EditHistory
+
+
+class FakeText:
+    """Текстовое поле без дисплея: команда Tcl с индексами и правками как у Tk
+    (для EditHistory важны только insert, delete, get, index и cget -state)"""
+    _INDEX = re.compile(r"(end|\d+\.\d+)((?:[+-]\d+c)*)$")
+
+    def __init__(self, content=""):
+        self.tk = tkinter.Tcl()
+        self._w = ".t"
+        self.content = content
+        self.state = "normal"
+        self.idle = []
+        self.tk.createcommand(self._w, self._command)
+        self.tk.createcommand("bind", lambda *args: "")
+
+    def _register(self, func):
+        name = "callback%d" % id(func)
+        self.tk.createcommand(name, func)
+        return name
+
+    def after_idle(self, func):
+        self.idle.append(func)
+
+    def run_idle(self):
+        while self.idle:
+            self.idle.pop(0)()
+
+    def insert(self, index, text):
+        self.tk.call(self._w, "insert", index, text)
+
+    def delete(self, index1, index2=None):
+        args = (index1,) if index2 is None else (index1, index2)
+        self.tk.call(self._w, "delete", *args)
+
+    def get(self, index1, index2):
+        return self.tk.call(self._w, "get", index1, index2)
+
+    def mark_set(self, name, index):
+        pass
+
+    def see(self, index):
+        pass
+
+    def _offset(self, index):
+        full = self.content + "\n"
+        match = self._INDEX.match(str(index).replace(" ", ""))
+        base, shifts = match.groups()
+        if base == "end":
+            offset = len(full)
+        else:
+            line, col = map(int, base.split("."))
+            lines = full.split("\n")
+            if line > len(lines) - 1:
+                offset = len(full)
+            else:
+                offset = sum(len(text) + 1 for text in lines[:line - 1]) + min(
+                    col, len(lines[line - 1]))
+        for shift in re.findall(r"[+-]\d+", shifts):
+            offset += int(shift)
+        return max(0, min(offset, len(full)))
+
+    def _format(self, offset):
+        full = self.content + "\n"
+        return "%d.%d" % (full.count("\n", 0, offset) + 1,
+                          offset - full.rfind("\n", 0, offset) - 1)
+
+    def _command(self, operation, *args):
+        if operation == "cget":
+            return self.state
+        if operation == "index":
+            return self._format(self._offset(args[0]))
+        if operation == "get":
+            return (self.content + "\n")[self._offset(args[0]):self._offset(args[1])]
+        if self.state == "disabled":
+            return ""
+        if operation == "insert":
+            pos = min(self._offset(args[0]), len(self.content))
+            self.content = self.content[:pos] + args[1] + self.content[pos:]
+        elif operation == "delete":
+            start = self._offset(args[0])
+            end = self._offset(args[1]) if len(args) > 1 else start + 1
+            end = min(end, len(self.content))
+            if start < end:
+                self.content = self.content[:start] + self.content[end:]
+        return ""
+
+
+def type_text(text_area, index, text):
+    # Набор по одному символу, как с клавиатуры
+    line, col = map(int, index.split("."))
+    for char in text:
+        text_area.insert(f"{line}.{col}", char)
+        col += 1
+
+
+def test_typing_run_is_one_undo_step():
+    text_area = FakeText("x")
+    history = EditHistory(text_area)
+    type_text(text_area, "1.1", "abc")
+    assert text_area.content == "xabc"
+    assert history.undo()
+    assert text_area.content == "x"
+    assert history.redo()
+    assert text_area.content == "xabc"
+    assert not history.redo()
+
+
+def test_edits_in_one_event_are_one_group():
+    text_area = FakeText("hello world")
+    history = EditHistory(text_area)
+    text_area.delete("1.0", "1.5")
+    text_area.insert("1.0", "bye")
+    text_area.run_idle()
+    text_area.insert("1.0", ">> ")
+    history.undo()
+    assert text_area.content == "bye world"
+    history.undo()
+    assert text_area.content == "hello world"
+
+
+def test_backspace_run_restores_deleted_text():
+    text_area = FakeText("abcdef")
+    history = EditHistory(text_area)
+    for col in (6, 5, 4):
+        text_area.delete(f"1.{col - 1}", f"1.{col}")
+    assert text_area.content == "abc"
+    history.undo()
+    assert text_area.content == "abcdef"
+
+
+def test_zero_budget_keeps_no_history_and_typing_works():
+    text_area = FakeText()
+    history = EditHistory(text_area, budget=0)
+    type_text(text_area, "1.0", "abc")
+    text_area.delete("1.2", "1.3")
+    text_area.delete("1.1", "1.2")
+    assert text_area.content == "a"
+    assert not history.can_undo()
+    assert history.size == 0
+
+
+def test_trim_drops_oldest_groups_first():
+    text_area = FakeText()
+    history = EditHistory(text_area, budget=250)
+    for word in ("one", "two", "three"):
+        text_area.insert("end-1c", word + "\n")
+        text_area.run_idle()
+    assert len(history.undo_stack) == 2
+    history.undo()
+    history.undo()
+    assert text_area.content == "one\n"
+
+
+def test_tracker_reports_changed_lines():
+    text_area = FakeText("a\nb\nc")
+    history = EditHistory(text_area)
+    tracker = history.track()
+    assert tracker.take() == (True, None)
+    text_area.insert("2.1", "x\ny\nz")
+    assert tracker.take() == (False, (2, 1, 3))
+    text_area.delete("1.0", "3.0")
+    assert tracker.take() == (False, (1, 3, 1))
+    assert tracker.take() == (False, None)
+
+
+def test_paused_history_invalidates_trackers_on_every_edit():
+    text_area = FakeText("log")
+    history = EditHistory(text_area)
+    tracker = history.track()
+    history.pause()
+    assert tracker.take() == (True, None)
+    text_area.insert("end-1c", "\nline")
+    assert tracker.take() == (True, None)
+    text_area.delete("1.0", "2.0")
+    assert tracker.take() == (True, None)
+    assert not history.can_undo()
+    history.resume()
+    tracker.take()
+    text_area.insert("1.0", "x")
+    assert tracker.take() == (False, (1, 1, 1))
+
+
+def test_untracked_tracker_gets_no_changes():
+    text_area = FakeText("a")
+    history = EditHistory(text_area)
+    tracker = history.track()
+    tracker.take()
+    history.untrack(tracker)
+    text_area.insert("1.0", "b")
+    assert tracker.take() == (False, None)
+
+
+def test_change_tracker_merge_covers_all_edits():
+    rng = random.Random(5)
+    serial = iter(range(10 ** 6))
+    for _ in range(500):
+        old = [next(serial) for _ in range(rng.randint(1, 12))]
+        lines = list(old)
+        tracker = ChangeTracker()
+        tracker.take()
+        for _ in range(rng.randint(1, 5)):
+            # Правка как у Tk: строки first..first+removed-1 заменены added строками (>= 1)
+            first = rng.randint(1, len(lines))
+            removed = rng.randint(1, len(lines) - first + 1)
+            added = rng.randint(1, 4)
+            lines[first - 1:first - 1 + removed] = [next(serial) for _ in range(added)]
+            tracker.add(first, removed, added)
+        full, (first, removed, added) = tracker.take()
+        assert not full
+        assert len(old) - removed + added == len(lines)
+        assert old[:first - 1] == lines[:first - 1]
+        assert old[first - 1 + removed:] == lines[first - 1 + added:]
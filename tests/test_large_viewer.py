@@ -0,0 +1,36 @@
+from large_viewer import LineIndex
+
+# В UTF-16-LE "ੁ䄀" дает байты 41 0a 00 41: перевод строки на стыке символов
+LINES = ["первая", "xੁ䄀y", "", "найти здесь", "последняя"]
+
+
+def build_index(tmp_path, data, encoding):
+    path = tmp_path / "big.txt"
+    path.write_bytes(data)
+    index = LineIndex(str(path), encoding, stride=2)
+    index._build()
+    return index
+
+
+def test_lines_and_search_in_every_encoding(tmp_path):
+    for encoding in ("utf-8", "utf-8-sig", "utf-16", "utf-16-be", "utf-32"):
+        for newline in ("\n", "\r\n"):
+            if encoding == "utf-16-be":
+                # BOM в начале, порядок байтов big-endian
+                data = "\ufeff".encode("utf-16-be") + newline.join(LINES).encode("utf-16-be")
+                encoding_name = "utf-16"
+            else:
+                data = newline.join(LINES).encode(encoding)
+                encoding_name = encoding
+            index = build_index(tmp_path, data, encoding_name)
+            try:
+                assert index.line_count == len(LINES)
+                lines = [line.decode(index.codec) for line in index.get_lines(0, len(LINES))]
+                assert lines == LINES
+                assert [index.get_lines(n, 1)[0].decode(index.codec)
+                        for n in range(len(LINES))] == LINES
+                offset = index.find("здесь".encode(index.codec))
+                assert offset > 0
+                assert index.line_of_offset(offset) == 3
+            finally:
+                index.close()
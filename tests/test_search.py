@@ -0,0 +1,95 @@
+import random
+
+from search import SearchIndex, compile_pattern
+
+
+def all_matches(pattern, lines):
+    # Эталон: поиск по всем строкам заново
+    return [(line_no, match.start(), match.end())
+            for line_no, line in enumerate(lines, 1)
+            for match in pattern.finditer(line) if match.end() > match.start()]
+
+
+def test_compile_pattern_options():
+    assert compile_pattern("a.b").search("axb") is None
+    assert compile_pattern("a.b", regex=True).search("axb")
+    assert compile_pattern("Word").search("word")
+    assert compile_pattern("Word", case=True).search("word") is None
+    assert compile_pattern("or", word=True).search("word") is None
+
+
+def test_update_finds_all_matches():
+    pattern = compile_pattern("ab")
+    index = SearchIndex()
+    lines = ["ab ab", "x", "AB"]
+    index.update(pattern, lines)
+    assert index.matches == [(1, 0, 2), (1, 3, 5), (3, 0, 2)]
+
+
+def test_update_shifts_matches_after_inserted_lines():
+    pattern = compile_pattern("ab")
+    index = SearchIndex()
+    index.update(pattern, ["ab", "x", "ab"])
+    index.update(pattern, ["ab", "new", "ab", "x", "ab"])
+    assert index.matches == [(1, 0, 2), (3, 0, 2), (5, 0, 2)]
+
+
+def test_update_with_new_pattern_searches_everything():
+    index = SearchIndex()
+    lines = ["ab cd", "cd"]
+    index.update(compile_pattern("ab"), lines)
+    pattern = compile_pattern("cd")
+    index.update(pattern, lines)
+    assert index.matches == all_matches(pattern, lines)
+
+
+def test_update_matches_full_search_after_random_edits():
+    pattern = compile_pattern("a+", regex=True)
+    rng = random.Random(3)
+    lines = ["".join(rng.choice("ab ") for _ in range(6)) for _ in range(20)]
+    index = SearchIndex()
+    index.update(pattern, lines)
+    for _ in range(300):
+        lines = list(lines)
+        line_no = rng.randrange(len(lines))
+        action = rng.random()
+        if action < 0.5:
+            lines[line_no] = "".join(rng.choice("ab ") for _ in range(6))
+        elif action < 0.75:
+            lines.insert(line_no, rng.choice(["a", "b", ""]))
+        elif len(lines) > 1:
+            del lines[line_no]
+        index.update(pattern, lines)
+        assert index.matches == all_matches(pattern, lines)
+
+
+def test_position_wraps_around():
+    index = SearchIndex()
+    index.update(compile_pattern("a"), ["a a", "a"])
+    assert index.position(1, 1) == 1
+    assert index.position(2, 1) == 0
+    assert index.position(1, 0, backwards=True) == 2
+
+
+def test_splice_matches_full_search_after_random_edits():
+    pattern = compile_pattern("ab")
+    rng = random.Random(11)
+    lines = [rng.choice(["ab", "x", "ab ab", ""]) for _ in range(15)]
+    index = SearchIndex()
+    index.update(pattern, list(lines))
+    for _ in range(300):
+        first = rng.randint(1, len(lines))
+        removed = rng.randint(1, min(3, len(lines) - first + 1))
+        new = [rng.choice(["ab", "x", "xab", ""]) for _ in range(rng.randint(1, 3))]
+        lines[first - 1:first - 1 + removed] = new
+        index.splice(pattern, first, removed, new)
+        assert index.matches == all_matches(pattern, lines)
+        assert index.lines == lines
+
+
+def test_splice_with_other_pattern_is_ignored():
+    index = SearchIndex()
+    index.update(compile_pattern("ab"), ["ab"])
+    index.splice(compile_pattern("x"), 1, 1, ["x"])
+    assert index.lines == ["ab"]
+    assert index.matches == [(1, 0, 2)]